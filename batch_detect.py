@@ -0,0 +1,211 @@
+"""
+Chạy phát hiện vượt đèn đỏ ở chế độ headless (không GUI, không cửa sổ OpenCV).
+
+Dùng cùng logic đèn / tracker / vi phạm với DetectWorker, ghi vào kho vi phạm
+(violation_store: violations.db mặc định, hoặc report.csv / status.csv với --store csv)
+như bình thường, kèm bảng tổng kết thông lượng cho từng file.
+
+Kho vi phạm dùng chung cho mọi video và nhớ các track_id đã vi phạm, nên mỗi video
+bắt đầu đánh ID sau track_id lớn nhất đã lưu trong dải của batch (dải 0 của
+violation_store.TRACK_ID_STRIDE, các camera của supervisor dùng các dải sau).
+Với --streams N, dải batch được chia thành N dải con rời nhau: mỗi luồng giữ 1 dải con
+trong lúc chạy 1 video, nên các video chạy đồng thời không bao giờ trùng track_id.
+
+Ví dụ:
+    python batch_detect.py videos/                # cả thư mục
+    python batch_detect.py a.mp4 b.mp4 --model yolov8m.pt
+    python batch_detect.py videos/ --streams 8 --batch-size 8   # 8 video, YOLO theo lô
+"""
+import os
+import sys
+import csv
+import argparse
+import datetime
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from redlight_violation import DetectWorker, VIOLATION_DIR, compute_inference_roi, roi_imgsz
+from inference_service import BatchInferenceService
+from model_backend import load_model
+from violation_store import open_store, TRACK_ID_STRIDE
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv")
+SUMMARY_CSV = os.path.join(VIOLATION_DIR, "batch_summary.csv")
+
+# Dải track_id [lo, hi) của batch
+BATCH_TRACK_IDS = (1, TRACK_ID_STRIDE)
+
+
+def collect_videos(inputs):
+    """Gom danh sách file video từ các đường dẫn file / thư mục (thư mục: không đệ quy)."""
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and name.lower().endswith(VIDEO_EXTS):
+                    videos.append(full)
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"⚠ Bỏ qua (không tồn tại): {path}", file=sys.stderr)
+    return videos
+
+
+def stream_track_ranges(streams, track_ids=BATCH_TRACK_IDS):
+    """Chia dải track_id [lo, hi) thành `streams` dải con rời nhau (1 dải cho mỗi luồng)."""
+    lo, hi = track_ids
+    span = (hi - lo) // max(1, streams)
+    return [(lo + i * span, lo + (i + 1) * span) for i in range(max(1, streams))]
+
+
+def run_one(video_path, model_path, store, track_ids=BATCH_TRACK_IDS, verbose=False,
+            **worker_kwargs):
+    """
+    Chạy DetectWorker đồng bộ (trên luồng hiện tại) cho 1 video, trả về dict thống kê.
+    track_ids: dải [lo, hi) của video này; tracker bắt đầu sau track_id lớn nhất đã lưu
+    trong dải (ID mới không trùng vi phạm của các video trước -> không bị bỏ sót).
+    """
+    lo, hi = track_ids
+    worker = DetectWorker(source=video_path, model_path=model_path, headless=True,
+                          store=store, track_id_start=store.next_track_id(lo, hi),
+                          **worker_kwargs)
+    if verbose:
+        worker.status_signal.connect(lambda text: print(f"  {text}"))
+
+    violations = []
+    worker.new_violation_signal.connect(violations.append)
+
+    # Gọi run() trực tiếp, không start() -> không cần event loop Qt
+    worker.run()
+
+    fps = worker.frames_processed / worker.elapsed_sec if worker.elapsed_sec > 0 else 0.0
+    if verbose and worker.pipeline_stats:
+        print(f"  pipeline: {worker.pipeline_stats}")
+    if verbose and worker.writer_stats:
+        print(f"  violation writer: {worker.writer_stats}")
+    if verbose and worker.light_gate is not None:
+        print(f"  light gate: {worker.light_gate.summary()}")
+    return {
+        "video": video_path,
+        "frames": worker.frames_processed,
+        "seconds": round(worker.elapsed_sec, 3),
+        "fps": round(fps, 2),
+        "yolo_frames": worker.yolo_frames,
+        "violations": len(violations),
+    }
+
+
+def write_summary(rows, path=SUMMARY_CSV):
+    """Ghi thêm (append) tổng kết thông lượng vào CSV."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    new_file = not os.path.exists(path)
+    run_at = datetime.datetime.now().isoformat(timespec="seconds")
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["run_at", "video", "frames", "seconds", "fps", "violations"])
+        for r in rows:
+            writer.writerow([run_at, r["video"], r["frames"], r["seconds"], r["fps"], r["violations"]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Phát hiện vượt đèn đỏ hàng loạt (headless).")
+    parser.add_argument("inputs", nargs="+", help="File video hoặc thư mục chứa video")
+    parser.add_argument("--model", default="yolov8m.pt", help="Đường dẫn model YOLO")
+    parser.add_argument("--summary", default=SUMMARY_CSV, help="File CSV tổng kết thông lượng")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Chạy decode / YOLO / tracker / ghi đĩa song song")
+    parser.add_argument("--queue-size", type=int, default=4, help="Kích thước hàng đợi giữa các stage")
+    parser.add_argument("--tracker", choices=("simple", "hungarian", "kalman"), default="simple",
+                        help="Thuật toán gán ID xe")
+    parser.add_argument("--detect-every", type=int, default=1,
+                        help="Chỉ chạy YOLO mỗi N frame (các frame giữa dùng dự đoán Kalman)")
+    parser.add_argument("--adaptive-skip", action="store_true",
+                        help="Chạy YOLO mọi frame khi xe gần vạch lúc đèn đỏ / di chuyển nhanh")
+    parser.add_argument("--roi", action="store_true",
+                        help="Chỉ chạy YOLO trên vùng quanh vạch dừng")
+    parser.add_argument("--violation-only", action="store_true",
+                        help="Tạm dừng nhận diện xe khi đèn phải xanh")
+    parser.add_argument("--warmup-frames", type=int, default=30,
+                        help="Chạy lại nhận diện N frame trước khi pha xanh dự kiến kết thúc")
+    parser.add_argument("--green-stride", type=int, default=0,
+                        help="Khi đèn xanh vẫn chạy 1/N frame (0 = dừng hẳn)")
+    parser.add_argument("--streams", type=int, default=1,
+                        help="Số video xử lý đồng thời (dùng chung 1 model)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Số frame tối đa mỗi lần gọi YOLO (>1: bật suy luận theo lô)")
+    parser.add_argument("--max-wait-ms", type=float, default=20,
+                        help="Thời gian chờ tối đa để gom đủ 1 lô")
+    parser.add_argument("--dedup-window", type=float, default=5.0,
+                        help="Số giây coi 2 vi phạm cùng vị trí là trùng (khử trùng)")
+    parser.add_argument("--decode-backend", choices=("auto", "pyav", "opencv"), default="auto",
+                        help="Backend giải mã video (auto: PyAV nếu đã cài)")
+    parser.add_argument("--frame-stride", type=int, default=1,
+                        help="Chỉ xử lý 1/N frame (frame bỏ qua vẫn giải mã, không chuyển màu)")
+    parser.add_argument("--store", choices=("sqlite", "csv"), default=None,
+                        help="Kho lưu vi phạm (mặc định sqlite: violations/violations.db)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="In thông báo của worker")
+    args = parser.parse_args(argv)
+
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print("❌ Không có video nào để xử lý.")
+        return 1
+
+    service = None
+    if args.streams > 1 or args.batch_size > 1:
+        predict_kwargs = {"imgsz": roi_imgsz(compute_inference_roi())} if args.roi else {}
+        service = BatchInferenceService(
+            load_model(args.model), batch_size=args.batch_size, max_wait_ms=args.max_wait_ms,
+            **predict_kwargs
+        ).start()
+
+    store = open_store(args.store, VIOLATION_DIR)
+    # Dải track_id rảnh: mỗi video lấy 1 dải lúc bắt đầu, trả lại khi xong
+    free_ranges = queue.Queue()
+    for track_ids in stream_track_ranges(args.streams):
+        free_ranges.put(track_ids)
+
+    def process(video_path):
+        print(f"▶ {video_path}")
+        track_ids = free_ranges.get()
+        try:
+            stats = run_one(video_path, args.model, store, track_ids, verbose=args.verbose,
+                            pipelined=args.pipelined, queue_size=args.queue_size,
+                            inference_service=service, tracker_backend=args.tracker,
+                            detect_every=args.detect_every, adaptive_skip=args.adaptive_skip,
+                            roi_inference=args.roi, violation_only=args.violation_only,
+                            gate_warmup_frames=args.warmup_frames,
+                            gate_green_stride=args.green_stride,
+                            dedup_window_sec=args.dedup_window,
+                            decode_backend=args.decode_backend, frame_stride=args.frame_stride)
+        finally:
+            free_ranges.put(track_ids)
+        print(f"  {video_path}: {stats['frames']} frame / {stats['seconds']} s = "
+              f"{stats['fps']} fps, YOLO {stats['yolo_frames']} frame, "
+              f"{stats['violations']} vi phạm")
+        return stats
+
+    t_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.streams)) as pool:
+            rows = list(pool.map(process, videos))
+    finally:
+        if service is not None:
+            service.stop()
+            print(f"  batch inference: {service.summary()}")
+    wall_sec = time.perf_counter() - t_start
+
+    write_summary(rows, args.summary)
+
+    total_frames = sum(r["frames"] for r in rows)
+    total_fps = total_frames / wall_sec if wall_sec > 0 else 0.0
+    print(f"✅ Tổng: {len(rows)} video, {total_frames} frame, {total_fps:.2f} fps "
+          f"(tổng kết: {args.summary})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,8 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QFont, QImage, QPixmap
-from ultralytics import YOLO
+from model_registry import registry, yolo_key
+from video_source import open_video_source
 
 
 # =============================
@@ -17,10 +18,12 @@ class VideoThread(QThread):
         super().__init__()
         self.source = source
         self.running = True
-        self.model = YOLO("yolov8n.pt")  # Model nhẹ, nhận diện COCO (xe, người, ô tô...)
+        # Model nhẹ, nhận diện COCO (xe, người, ô tô...), dùng chung qua kho model
+        self.model = registry.acquire(yolo_key("yolov8n.pt"))
 
     def run(self):
-        cap = cv2.VideoCapture(self.source)
+        # Giải mã thẳng về khung hiển thị 640x360 (YOLO mặc định cũng thu về 640)
+        cap = open_video_source(self.source, size=(640, 360), keep_aspect=True, prefetch=2)
         while self.running and cap.isOpened():
             ret, frame = cap.read()
             if not ret:
@@ -39,6 +42,8 @@ class VideoThread(QThread):
             self.change_pixmap_signal.emit(scaled)
 
         cap.release()
+        # Trả model về kho (vẫn giữ trong bộ nhớ cho lần mở sau)
+        registry.release(yolo_key("yolov8n.pt"))
 
     def stop(self):
         self.running = False
@@ -0,0 +1,181 @@
+"""
+Pipeline nhiều luồng cho xử lý video: source -> các stage -> sink.
+
+Mỗi stage chạy trên 1 luồng riêng, nối với nhau bằng hàng đợi có giới hạn
+(backpressure), nên FPS tổng xấp xỉ FPS của stage chậm nhất thay vì tổng
+thời gian của mọi stage. Thứ tự frame được giữ nguyên (mỗi stage 1 luồng).
+"""
+import queue
+import threading
+import time
+
+# Chính sách khi hàng đợi đầu vào (sau source) bị đầy
+DROP_BLOCK = "block"          # chờ (video file: không mất frame)
+DROP_OLDEST = "drop_oldest"   # bỏ frame cũ nhất (camera live: luôn xử lý frame mới)
+DROP_NEWEST = "drop_newest"   # bỏ frame vừa đọc
+DROP_POLICIES = (DROP_BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+_END = object()  # đánh dấu hết dữ liệu
+
+
+class _StageStats:
+    def __init__(self):
+        self.items = 0
+        self.busy_sec = 0.0
+
+    def as_dict(self):
+        avg_ms = self.busy_sec * 1000.0 / self.items if self.items else 0.0
+        return {"items": self.items, "avg_ms": round(avg_ms, 2)}
+
+
+class FramePipeline:
+    """
+    source: callable() -> item, trả về None khi hết dữ liệu.
+    stages: list[(name, fn)], fn(item) -> item; trả về None để bỏ item.
+    sink: callable(item) -> bool, chạy trên luồng gọi run(); trả về False để dừng.
+    """
+    def __init__(self, source, stages, sink, queue_size=4,
+                 drop_policy=DROP_BLOCK, on_error=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy không hợp lệ: {drop_policy}")
+        self.source = source
+        self.stages = list(stages)
+        self.sink = sink
+        self.queue_size = max(1, int(queue_size))
+        self.drop_policy = drop_policy
+        self.on_error = on_error
+
+        self._stop = threading.Event()
+        self._threads = []
+        self.dropped = 0
+        self.stats = {"source": _StageStats()}
+        for name, _ in self.stages:
+            self.stats[name] = _StageStats()
+        self.stats["sink"] = _StageStats()
+
+    # ---------- Hàng đợi ----------
+    def _put_blocking(self, q, item):
+        """Đưa item vào hàng đợi, chờ nếu đầy (backpressure). False nếu pipeline đã dừng."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _put_source(self, q, item):
+        """Đưa frame từ source vào hàng đợi đầu tiên theo drop_policy."""
+        if self.drop_policy == DROP_BLOCK:
+            return self._put_blocking(q, item)
+        try:
+            q.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        self.dropped += 1
+        if self.drop_policy == DROP_NEWEST:
+            return True
+        # DROP_OLDEST: bỏ frame cũ nhất rồi đưa frame mới vào
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        return self._put_blocking(q, item)
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _END
+
+    def _report(self, name, exc):
+        if self.on_error is not None:
+            self.on_error(name, exc)
+
+    # ---------- Các luồng ----------
+    def _source_loop(self, out_q):
+        st = self.stats["source"]
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    item = self.source()
+                except Exception as e:
+                    self._report("source", e)
+                    item = None
+                if item is None:
+                    break
+                st.busy_sec += time.perf_counter() - t0
+                st.items += 1
+                if not self._put_source(out_q, item):
+                    break
+        finally:
+            self._put_blocking(out_q, _END)
+
+    def _stage_loop(self, name, fn, in_q, out_q):
+        st = self.stats[name]
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _END:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    result = fn(item)
+                except Exception as e:
+                    self._report(name, e)
+                    result = None
+                st.busy_sec += time.perf_counter() - t0
+                st.items += 1
+                if result is not None and not self._put_blocking(out_q, result):
+                    break
+        finally:
+            self._put_blocking(out_q, _END)
+
+    # ---------- Điều khiển ----------
+    def run(self):
+        """Chạy pipeline đến khi hết dữ liệu hoặc sink/stop() yêu cầu dừng."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        self._threads = [threading.Thread(
+            target=self._source_loop, args=(queues[0],),
+            name="pipeline-source", daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            self._threads.append(threading.Thread(
+                target=self._stage_loop, args=(name, fn, queues[i], queues[i + 1]),
+                name=f"pipeline-{name}", daemon=True))
+        for t in self._threads:
+            t.start()
+
+        st = self.stats["sink"]
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    keep_going = self.sink(item)
+                except Exception as e:
+                    self._report("sink", e)
+                    keep_going = True
+                st.busy_sec += time.perf_counter() - t0
+                st.items += 1
+                if keep_going is False:
+                    break
+        finally:
+            self.stop()
+            for t in self._threads:
+                t.join(timeout=2.0)
+
+    def stop(self):
+        self._stop.set()
+
+    def summary(self):
+        """Thống kê: số item và thời gian trung bình (ms) của từng stage + số frame bị bỏ."""
+        data = {name: st.as_dict() for name, st in self.stats.items()}
+        data["dropped"] = self.dropped
+        return data
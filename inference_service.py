@@ -0,0 +1,136 @@
+"""
+Dịch vụ suy luận YOLO theo lô (batch) dùng chung cho nhiều luồng / nhiều camera.
+
+Mỗi luồng gửi frame bằng submit() và nhận lại Future. Luồng dịch vụ gom các
+frame thành lô tối đa batch_size (hoặc đến khi hết max_wait_ms kể từ frame
+đầu tiên của lô), gọi model 1 lần cho cả lô rồi trả kết quả về đúng Future
+của từng frame -> mỗi luồng tự đưa vào tracker của mình.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchInferenceService:
+    def __init__(self, model, batch_size=8, max_wait_ms=20, **predict_kwargs):
+        """
+        model: đối tượng gọi được như ultralytics.YOLO (nhận list ảnh, trả list kết quả)
+        predict_kwargs: tham số thêm cho mỗi lần gọi model (mặc định verbose=False)
+        """
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.predict_kwargs = {"verbose": False, **predict_kwargs}
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = threading.Event()
+        # submit() và stop() cùng giữ khóa: không có frame nào vào hàng đợi sau khi đã dừng
+        self._lock = threading.Lock()
+
+        # Thống kê
+        self.batches = 0
+        self.frames = 0
+        self.infer_sec = 0.0
+
+    # ---------- Vòng đời ----------
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._loop, name="batch-inference", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5.0)
+        # Huỷ các yêu cầu còn lại để không luồng nào bị treo
+        while True:
+            try:
+                _, _, fut = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if not fut.done():
+                fut.set_exception(RuntimeError("BatchInferenceService đã dừng"))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- API ----------
+    def submit(self, frame, stream_id=None):
+        """Gửi 1 frame, trả về Future chứa kết quả (1 phần tử của results)."""
+        fut = Future()
+        with self._lock:
+            if self._stop.is_set() or self._thread is None:
+                fut.set_exception(RuntimeError("BatchInferenceService chưa chạy hoặc đã dừng"))
+                return fut
+            self._queue.put((stream_id, frame, fut))
+        return fut
+
+    def infer(self, frame, stream_id=None, timeout=None):
+        """Gửi 1 frame và chờ kết quả."""
+        return self.submit(frame, stream_id).result(timeout=timeout)
+
+    def summary(self):
+        avg_batch = self.frames / self.batches if self.batches else 0.0
+        avg_ms = self.infer_sec * 1000.0 / self.batches if self.batches else 0.0
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch": round(avg_batch, 2),
+            "avg_batch_ms": round(avg_ms, 2),
+        }
+
+    # ---------- Luồng gom lô ----------
+    def _collect_batch(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            frames = [frame for _, frame, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                results = self.model(frames, **self.predict_kwargs)
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            if len(results) != len(batch):
+                err = RuntimeError(f"Model trả về {len(results)} kết quả cho lô {len(batch)} frame")
+                for _, _, fut in batch:
+                    fut.set_exception(err)
+                continue
+            self.infer_sec += time.perf_counter() - t0
+            self.batches += 1
+            self.frames += len(batch)
+
+            for (_, _, fut), result in zip(batch, results):
+                fut.set_result(result)
@@ -1,15 +1,333 @@
 import sys
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QLabel, QPushButton, QFileDialog, QMessageBox,
     QApplication, QHBoxLayout, QTextEdit
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QPixmap, QImage, QFont
-from ultralytics import YOLO
-import easyocr
+from model_registry import registry, yolo_key, ocr_key
+from video_source import open_video_source
+from tracker import HungarianTracker
+from plate_cache import PlateTrackCache
+
+
+PLATE_MODEL = "license_plate_detector.pt"
+OCR_LANGS = ("en",)
+IMAGE_EXTS = (".jpg", ".png")
+
+# Số luồng OCR chạy song song và số crop tối đa được chờ OCR
+# (hàng chờ đầy -> frame mới chỉ hiển thị, không gửi thêm OCR)
+OCR_WORKERS = 2
+OCR_MAX_PENDING = 16
+
+# OCR theo lô: số crop tối đa mỗi lô, chiều cao chung của mỗi dòng chữ
+# (= chiều cao đầu vào bộ nhận dạng của EasyOCR, không phải resize lần 2)
+OCR_BATCH_MAX = 16
+OCR_LINE_HEIGHT = 64
+# Biển vuông 2 dòng (rộng / cao nhỏ hơn ngưỡng) -> tách thành 2 dòng để nhận dạng
+TWO_LINE_ASPECT = 2.0
+_CANVAS_GAP = 8
+
+# Theo dõi biển số giữa các frame (ghép theo IoU), số frame mất dấu trước khi bỏ track
+PLATE_TRACK_IOU = 0.1
+PLATE_TRACK_MAX_LOST = 15
+
+DISPLAY_SIZE = (550, 420)
+
+
+def ocr_plate(reader, image):
+    """OCR 1 vùng biển số, trả về chuỗi hoặc None."""
+    if image is None or image.size == 0:
+        return None
+    results = reader.readtext(image)
+    if results:
+        return " ".join([res[1] for res in results])
+    return None
+
+
+def _plate_lines(gray):
+    h, w = gray.shape[:2]
+    if w < h * TWO_LINE_ASPECT:
+        mid = h // 2
+        return [gray[:mid], gray[mid:]]
+    return [gray]
+
+
+def ocr_plates_batch(reader, crops):
+    """
+    OCR nhiều vùng biển số trong 1 lần gọi, trả về list chuỗi (hoặc None) theo thứ tự crops.
+    YOLO đã khoanh đúng vùng chữ nên bỏ qua bước dò chữ của EasyOCR: mọi dòng chữ được
+    đưa về cùng chiều cao, xếp chồng lên 1 ảnh và chỉ chạy bộ nhận dạng (reader.recognize)
+    1 lần cho cả lô. Reader không có recognize / lỗi -> OCR từng crop như cũ.
+    """
+    texts = [None] * len(crops)
+    lines = []  # [(chỉ số crop, dòng chữ xám đã resize)]
+    for i, crop in enumerate(crops):
+        if crop is None or crop.size == 0:
+            continue
+        gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        for line in _plate_lines(gray):
+            h, w = line.shape[:2]
+            if h == 0 or w == 0:
+                continue
+            new_w = max(1, int(round(w * OCR_LINE_HEIGHT / h)))
+            lines.append((i, cv2.resize(line, (new_w, OCR_LINE_HEIGHT))))
+    if not lines:
+        return texts
+    if not hasattr(reader, "recognize"):
+        return [ocr_plate(reader, crop) for crop in crops]
+
+    # Ghép các dòng lên 1 ảnh, mỗi dòng 1 vùng [x_min, x_max, y_min, y_max]
+    step = OCR_LINE_HEIGHT + _CANVAS_GAP
+    canvas_w = max(line.shape[1] for _, line in lines) + 2 * _CANVAS_GAP
+    canvas = np.zeros((len(lines) * step + _CANVAS_GAP, canvas_w), dtype=np.uint8)
+    regions = []
+    for k, (_, line) in enumerate(lines):
+        y = _CANVAS_GAP + k * step
+        canvas[y:y + OCR_LINE_HEIGHT, _CANVAS_GAP:_CANVAS_GAP + line.shape[1]] = line
+        regions.append([_CANVAS_GAP, _CANVAS_GAP + line.shape[1], y, y + OCR_LINE_HEIGHT])
+
+    try:
+        results = reader.recognize(canvas, horizontal_list=regions, free_list=[],
+                                   batch_size=len(regions))
+    except Exception:
+        return [ocr_plate(reader, crop) for crop in crops]
+
+    # Kết quả có thể không theo thứ tự vùng -> xác định dòng theo tọa độ y
+    line_texts = [None] * len(lines)
+    for box, text, _conf in results:
+        k = int(box[0][1] - _CANVAS_GAP) // step
+        if 0 <= k < len(lines) and text:
+            line_texts[k] = text
+    for (i, _), text in zip(lines, line_texts):
+        if text:
+            texts[i] = f"{texts[i]} {text}" if texts[i] else text
+    return texts
+
+
+def draw_plate(img, box, text):
+    x1, y1, x2, y2 = box
+    cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 3)
+    if text:
+        cv2.putText(img, text, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 3, cv2.LINE_AA)
+
+
+def to_qimage(cv_img, size):
+    """Ảnh BGR -> QImage đã thu về vừa khung size (w, h)."""
+    rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb_image.shape
+    bytes_per_line = ch * w
+    qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+    return qt_image.scaled(size[0], size[1], Qt.AspectRatioMode.KeepAspectRatio)
+
+
+# ================== Luồng nhận diện biển số ==================
+class PlateWorker(QThread):
+    """
+    Pipeline biển số chạy ngoài luồng GUI:
+    - luồng này: đọc ảnh/video + YOLO phát hiện biển số, vẽ khung và phát frame lên giao diện;
+    - pool OCR (ocr_workers luồng): gom các crop đang chờ (của 1 hoặc nhiều frame) thành lô
+      và OCR theo lô (ocr_plates_batch), kết quả gửi về qua plate_signal.
+    Video: mỗi biển số được gắn 1 track; PlateTrackCache chọn crop nét + lớn nhất và chỉ OCR
+    vài lần mỗi track, chữ của track là kết quả bỏ phiếu các lần đọc. OCR chạy theo tốc độ
+    của nó, hiển thị không phải chờ OCR. Ảnh: OCR cả lô ngay trên luồng này rồi mới phát ảnh.
+    """
+    frame_signal = pyqtSignal(QImage)
+    plate_signal = pyqtSignal(int, str)   # (track id, chữ biển số sau bỏ phiếu)
+    status_signal = pyqtSignal(str)
+    finished_signal = pyqtSignal()
+
+    def __init__(self, source, display_size=DISPLAY_SIZE, ocr_workers=OCR_WORKERS,
+                 max_pending=OCR_MAX_PENDING):
+        super().__init__()
+        self.source = source
+        self.display_size = display_size
+        self.ocr_workers = max(1, int(ocr_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.model = None
+        self.reader = None
+        self._running = False
+        self._pool = None
+        self._lock = threading.Lock()
+        self._queue = []       # [(crop, track id)] chờ OCR
+        self._in_flight = 0    # số crop đang được OCR
+        self._drains = 0       # số tác vụ OCR đang chạy / đã xếp trên pool
+        self.tracker = HungarianTracker(metric="iou", iou_thresh=PLATE_TRACK_IOU,
+                                        max_lost=PLATE_TRACK_MAX_LOST)
+        self.plate_cache = PlateTrackCache()
+        self.frames_processed = 0
+        self.plates_detected = 0  # số lượt phát hiện biển số (cộng dồn mọi frame)
+        self.ocr_crops = 0        # số crop đã OCR
+        self.ocr_calls = 0        # số lần gọi OCR (mỗi lô tính 1 lần)
+
+    def stop(self):
+        self._running = False
+
+    @property
+    def is_image(self):
+        return os.path.splitext(self.source)[-1].lower() in IMAGE_EXTS
+
+    # ---------- Phát hiện ----------
+    def _detect(self, img):
+        results = self.model(img, verbose=False)
+        h, w = img.shape[:2]
+        boxes = []
+        for r in results:
+            for box in r.boxes.xyxy:
+                x1, y1, x2, y2 = map(int, box)
+                x1, y1 = max(0, x1), max(0, y1)
+                x2, y2 = min(w, x2), min(h, y2)
+                if x2 > x1 and y2 > y1:
+                    boxes.append((x1, y1, x2, y2))
+        return boxes
+
+    # ---------- OCR (chạy trên pool) ----------
+    def _drain_ocr(self):
+        """
+        Lấy hết crop đang chờ (tối đa OCR_BATCH_MAX mỗi lô) và OCR theo lô tới khi hàng chờ rỗng.
+        Chỉ dừng sớm khi bị stop(); hết video thì vẫn OCR nốt hàng chờ.
+        """
+        while True:
+            with self._lock:
+                if not self._queue or not self._running:
+                    self._drains -= 1
+                    return
+                batch = self._queue[:OCR_BATCH_MAX]
+                del self._queue[:OCR_BATCH_MAX]
+                self._in_flight += len(batch)
+            try:
+                texts = ocr_plates_batch(self.reader, [crop for crop, _ in batch])
+            except Exception as e:
+                self.status_signal.emit(f"Lỗi OCR: {e}")
+                texts = [None] * len(batch)
+            with self._lock:
+                self._in_flight -= len(batch)
+                self.ocr_calls += 1
+                self.ocr_crops += len(batch)
+            for (_, track_id), text in zip(batch, texts):
+                plate = self.plate_cache.add_reading(track_id, text)
+                if plate:
+                    self.plate_signal.emit(track_id, plate)
+
+    def _submit_ocr(self, img, tracks, frame_idx):
+        """Ghi nhận crop của từng track; track cần OCR thì đưa crop tốt nhất vào hàng chờ."""
+        for det in tracks:
+            x1, y1, x2, y2 = det["bbox"]
+            with self._lock:
+                room = len(self._queue) + self._in_flight < self.max_pending
+            # observe() tự copy crop được giữ lại (frame gốc sẽ bị vẽ đè)
+            crop = self.plate_cache.observe(det["id"], img[y1:y2, x1:x2], frame_idx, allow_ocr=room)
+            if crop is not None:
+                with self._lock:
+                    self._queue.append((crop, det["id"]))
+        with self._lock:
+            schedule = bool(self._queue) and self._drains < self.ocr_workers
+            if schedule:
+                self._drains += 1
+        if schedule:
+            self._pool.submit(self._drain_ocr)
+
+    # ---------- Chạy ----------
+    def run(self):
+        self._running = True
+        try:
+            self.status_signal.emit("Đang tải model YOLO + OCR...")
+            self.model = registry.acquire(yolo_key(PLATE_MODEL))
+            self.reader = registry.acquire(ocr_key(OCR_LANGS))
+        except Exception as e:
+            self.status_signal.emit(f"Lỗi tải model: {e}")
+            self._release_models()
+            self.finished_signal.emit()
+            return
+
+        self._pool = ThreadPoolExecutor(max_workers=self.ocr_workers, thread_name_prefix="plate-ocr")
+        try:
+            if self.is_image:
+                self._run_image()
+            else:
+                self._run_video()
+        except Exception as e:
+            self.status_signal.emit(f"Lỗi xử lý: {e}")
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            self._running = False
+            self._release_models()
+            self.finished_signal.emit()
+
+    def _run_image(self):
+        img = cv2.imread(self.source)
+        if img is None:
+            self.status_signal.emit("Không thể đọc ảnh.")
+            return
+        boxes = self._detect(img)
+        texts = ocr_plates_batch(self.reader, [img[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes])
+        self.plates_detected = self.ocr_crops = len(boxes)
+        self.ocr_calls += 1 if boxes else 0
+        for i, (box, text) in enumerate(zip(boxes, texts)):
+            if text:
+                self.plate_signal.emit(i, text)
+                draw_plate(img, box, text)
+        self.frames_processed = 1
+        self.frame_signal.emit(to_qimage(img, self.display_size))
+
+    def _run_video(self):
+        # Giữ nguyên độ phân giải (OCR biển số cần chi tiết), chỉ tăng tốc giải mã
+        cap = open_video_source(self.source, prefetch=2)
+        if not cap.isOpened():
+            self.status_signal.emit("Không thể mở video.")
+            return
+        # Không phát nhanh hơn tốc độ gốc của video
+        frame_interval = 1.0 / cap.fps if getattr(cap, "fps", 0) else 0.0
+        next_show = time.perf_counter()
+        frame_idx = 0
+        try:
+            while self._running:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                boxes = self._detect(frame)
+                tracks = self.tracker.update([
+                    {"cx": (x1 + x2) // 2, "bottom_y": y2, "bbox": (x1, y1, x2, y2)}
+                    for x1, y1, x2, y2 in boxes
+                ])
+                self.plates_detected += len(tracks)
+                # OCR trên frame gốc trước khi vẽ khung
+                self._submit_ocr(frame, tracks, frame_idx)
+                self.plate_cache.forget(self.tracker.objects.keys())
+                for det in tracks:
+                    draw_plate(frame, det["bbox"], self.plate_cache.text(det["id"]))
+                qt_image = to_qimage(frame, self.display_size)
+
+                delay = next_show - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_show = max(next_show + frame_interval, time.perf_counter())
+                self.frame_signal.emit(qt_image)
+                frame_idx += 1
+                self.frames_processed = frame_idx
+        finally:
+            cap.release()
+        # Hết video: chờ OCR nốt các crop trong hàng chờ rồi mới tổng kết;
+        # bị stop() thì bỏ các lô chưa chạy (số liệu chỉ tính phần đã OCR)
+        self._pool.shutdown(wait=True, cancel_futures=not self._running)
+        self.status_signal.emit(
+            f"Đã OCR {self.ocr_crops}/{self.plates_detected} lượt biển số ({self.ocr_calls} lô)")
+
+    def _release_models(self):
+        if self.model is not None:
+            registry.release(yolo_key(PLATE_MODEL))
+            self.model = None
+        if self.reader is not None:
+            registry.release(ocr_key(OCR_LANGS))
+            self.reader = None
 
 
 class PlateDialog(QDialog):
@@ -63,16 +381,9 @@ class PlateDialog(QDialog):
 
         self.setLayout(main_layout)
 
-        # --- Khởi tạo YOLO & OCR ---
-        # Bạn có thể thay bằng model chuyên biển số (nếu có): "yolov8n-license.pt"
-        self.model = YOLO("license_plate_detector.pt")
-        self.reader = easyocr.Reader(['en'])
-
-        # Video
-        self.cap = None
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
-        self.detected_plates = set()
+        # Luồng nhận diện (tự nạp YOLO + OCR từ kho model khi chạy)
+        self.worker = None
+        self.detected_plates = {}  # track id -> chữ biển số
 
     # --- Mở file ---
     def open_file(self):
@@ -82,95 +393,57 @@ class PlateDialog(QDialog):
         if not file_path:
             return
 
-        ext = os.path.splitext(file_path)[-1].lower()
+        self.stop_worker()
         self.detected_plates.clear()
         self.text_result.clear()
 
-        if ext in [".jpg", ".png"]:
-            self.process_image(file_path)
-        else:
-            self.play_video(file_path)
-
-    # --- Xử lý ảnh ---
-    def process_image(self, file_path):
-        img = cv2.imread(file_path)
-        results = self.model(img)
-        plates = []
+        self.worker = PlateWorker(file_path, display_size=(
+            self.label_original.width(), self.label_original.height()))
+        self.worker.frame_signal.connect(self.update_frame)
+        self.worker.plate_signal.connect(self.add_plate)
+        self.worker.status_signal.connect(self.show_status)
+        self.worker.finished_signal.connect(self.on_finished)
+        self.worker.start()
 
-        for r in results:
-            for box in r.boxes.xyxy:
-                x1, y1, x2, y2 = map(int, box)
-                crop = img[y1:y2, x1:x2]
-                text = self.ocr_plate(crop)
-                if text:
-                    plates.append(text)
-                    # vẽ khung và text
-                    cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 3)
-                    cv2.putText(img, text, (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 3, cv2.LINE_AA)
-
-        self.display_cv_image(img, self.label_original)
-
-        if plates:
-            self.text_result.setPlainText("\n".join(plates))
-        else:
-            self.text_result.setPlainText("Không phát hiện được biển số nào.")
+    def stop_worker(self):
+        if self.worker is not None:
+            # Bỏ kết nối trước: kết quả còn xếp hàng của video cũ không hiện lẫn vào video mới
+            self.worker.disconnect()
+            self.worker.stop()
+            self.worker.wait()
+            self.worker = None
 
-    #  Xử lý video 
-    def play_video(self, video_path):
-        self.cap = cv2.VideoCapture(video_path)
-        if not self.cap.isOpened():
-            QMessageBox.warning(self, "Lỗi", "Không thể mở video.")
-            return
-        self.timer.start(30)
-
-    def update_frame(self):
-        if self.cap is None:
-            return
+    # --- Slot nhận kết quả từ worker ---
+    def update_frame(self, qt_image):
+        self.label_original.setPixmap(QPixmap.fromImage(qt_image))
 
-        ret, frame = self.cap.read()
-        if not ret:
-            self.timer.stop()
-            self.cap.release()
+    def add_plate(self, track_id, text):
+        if self.detected_plates.get(track_id) == text:
             return
+        # Chữ của 1 track có thể đổi khi có thêm phiếu -> thay chữ cũ của track đó
+        self.detected_plates[track_id] = text
+        self.text_result.setPlainText("\n".join(sorted(set(self.detected_plates.values()))))
 
-        results = self.model(frame)
-        new_plates = set()
+    def show_status(self, text):
+        if text.startswith("Không thể"):
+            QMessageBox.warning(self, "Lỗi", text)
+        elif not self.detected_plates:
+            self.text_result.setPlaceholderText(text)
 
-        for r in results:
-            for box in r.boxes.xyxy:
-                x1, y1, x2, y2 = map(int, box)
-                crop = frame[y1:y2, x1:x2]
-                text = self.ocr_plate(crop)
-                if text:
-                    new_plates.add(text)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-                    cv2.putText(frame, text, (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 3, cv2.LINE_AA)
-
-        self.detected_plates |= new_plates
-        self.text_result.setPlainText("\n".join(sorted(self.detected_plates)))
+    def on_finished(self):
+        worker = self.sender()
+        if worker is not None and worker.is_image and not self.detected_plates:
+            self.text_result.setPlainText("Không phát hiện được biển số nào.")
+        self.text_result.setPlaceholderText("Kết quả biển số sẽ hiển thị ở đây...")
 
-        self.display_cv_image(frame, self.label_original)
+    def done(self, result):
+        """Đóng dialog: dừng worker (worker tự trả model + OCR về kho dùng chung)."""
+        self.stop_worker()
+        super().done(result)
 
     # --- Hiển thị ảnh ---
     def display_cv_image(self, cv_img, label):
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(qt_image)
-        pixmap = pixmap.scaled(label.size(), Qt.AspectRatioMode.KeepAspectRatio)
-        label.setPixmap(pixmap)
-
-    # --- OCR ---
-    def ocr_plate(self, image):
-        if image is None or image.size == 0:
-            return None
-        results = self.reader.readtext(image)
-        if results:
-            return " ".join([res[1] for res in results])
-        return None
+        label.setPixmap(QPixmap.fromImage(to_qimage(cv_img, (label.width(), label.height()))))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+"""
+Bật/tắt nhận diện xe theo trạng thái đèn (chế độ "chỉ bắt vi phạm").
+
+Vi phạm chỉ được ghi khi đèn phải là RED, nên trong pha xanh dài có thể
+tạm dừng (hoặc chạy thưa) YOLO + tracker. Trạng thái đèn lấy từ
+detect_light_color (HSV, rất rẻ) nên vẫn chạy mọi frame.
+
+Khởi động lại nhận diện:
+- ngay khi đèn không còn GREEN (YELLOW / RED / UNKNOWN - UNKNOWN coi như không an toàn);
+- hoặc warmup_frames frame trước khi pha xanh dự kiến kết thúc
+  (độ dài pha xanh lấy từ chu kỳ trước), để tracker kịp có ID ổn định
+  trước khi đèn chuyển đỏ.
+"""
+
+
+class LightGate:
+    def __init__(self, warmup_frames=30, green_stride=0, debounce=3):
+        """
+        warmup_frames: số frame chạy lại trước khi pha xanh dự kiến kết thúc
+        green_stride: 0 = dừng hẳn khi xanh; k > 0 = vẫn chạy 1/k frame khi xanh
+        debounce: số frame liên tiếp cần thấy trạng thái mới để coi là đổi pha
+        """
+        self.warmup_frames = max(0, int(warmup_frames))
+        self.green_stride = max(0, int(green_stride))
+        self.debounce = max(1, int(debounce))
+
+        self.phase = "UNKNOWN"       # pha đèn đã ổn định (sau debounce)
+        self.phase_frames = 0        # số frame trong pha hiện tại
+        self.last_green_frames = None
+        self._candidate = None
+        self._candidate_frames = 0
+
+        # Thống kê
+        self.frames = 0
+        self.active_frames = 0
+
+    def _update_phase(self, state):
+        self.phase_frames += 1
+        if state == self.phase:
+            self._candidate = None
+            self._candidate_frames = 0
+            return
+        if state != self._candidate:
+            self._candidate = state
+            self._candidate_frames = 0
+        self._candidate_frames += 1
+        if self._candidate_frames >= self.debounce:
+            if self.phase == "GREEN":
+                # Pha xanh vừa kết thúc -> nhớ độ dài để dự đoán lần sau
+                self.last_green_frames = self.phase_frames - self._candidate_frames
+            self.phase = state
+            self.phase_frames = self._candidate_frames
+            self._candidate = None
+            self._candidate_frames = 0
+
+    def _active(self, state):
+        if state != "GREEN" or self.phase != "GREEN":
+            return True
+        if (self.last_green_frames is not None
+                and self.phase_frames >= self.last_green_frames - self.warmup_frames):
+            return True
+        return self.green_stride > 0 and self.phase_frames % self.green_stride == 0
+
+    def observe(self, state):
+        """Ghi nhận trạng thái đèn của frame, trả về True nếu frame này cần chạy nhận diện xe."""
+        self._update_phase(state)
+        active = self._active(state)
+        self.frames += 1
+        if active:
+            self.active_frames += 1
+        return active
+
+    def summary(self):
+        skipped = self.frames - self.active_frames
+        ratio = skipped / self.frames if self.frames else 0.0
+        return {
+            "frames": self.frames,
+            "active_frames": self.active_frames,
+            "skipped_ratio": round(ratio, 3),
+            "last_green_frames": self.last_green_frames,
+        }
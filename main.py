@@ -1,5 +1,13 @@
 import sys
 
+import time
+
+_T_START = time.perf_counter()
+
+import importlib
+
+import threading
+
 from PyQt6.QtWidgets import (
 
     QApplication,
@@ -18,24 +26,49 @@ from PyQt6.QtWidgets import (
 
 from PyQt6.QtGui import QFont
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
+
+from model_registry import registry, yolo_key, ocr_key  # Kho model dùng chung (không import ultralytics)
 
 
 
 # ======================
 
-# Import các module con
+# Các module con: chỉ import khi bấm nút tương ứng
+
+# (ultralytics / torch / easyocr rất nặng, không để chậm lúc mở cửa sổ chính)
 
 # ======================
 
-from detect import DetectDialog         # Nhận diện phương tiện
+DIALOG_MODULES = [
+
+    "detect",              # Nhận diện phương tiện
+
+    "redlight",            # Nhận diện đèn báo + vượt đèn đỏ
+
+    "license_plate",       # Nhận diện biển số xe
+
+    "redlight_violation",  # Vượt đèn đỏ
+
+    "report",              # Báo cáo & lưu trữ kết quả
+
+]
+
+
 
-from redlight import RedLightDialog     # Nhận diện đèn báo + vượt đèn đỏ
+# Model nạp trước ở luồng nền khi chạy: python main.py --preload
 
-from license_plate import PlateDialog   # Nhận diện biển số xe (bạn đặt tên file là license_plate.py)
+PRELOAD_MODELS = [
 
-from report import ReportDialog         # Báo cáo & lưu trữ kết quả
-from redlight_violation import RedLight_violationDialog #  vượt đèn đỏ
+    yolo_key("yolov8n.pt"),                 # nhận diện phương tiện + đèn báo
+
+    yolo_key("yolov8m.pt"),                 # vượt đèn đỏ
+
+    yolo_key("license_plate_detector.pt"),  # biển số
+
+    ocr_key(("en",)),                       # EasyOCR
+
+]
 
 
 
@@ -200,6 +233,8 @@ class MainWindow(QMainWindow):
 
         """Mở chức năng nhận diện phương tiện."""
 
+        from detect import DetectDialog
+
         dialog = DetectDialog()
 
         dialog.exec()
@@ -210,6 +245,8 @@ class MainWindow(QMainWindow):
 
         """Mở chức năng nhận diện đèn báo giao thông."""
 
+        from redlight import RedLightDialog
+
         dialog = RedLightDialog()
 
         dialog.exec()
@@ -220,6 +257,8 @@ class MainWindow(QMainWindow):
 
         """Mở chức năng nhận diện biển số xe."""
 
+        from license_plate import PlateDialog
+
         dialog = PlateDialog()
 
         dialog.exec()
@@ -230,6 +269,8 @@ class MainWindow(QMainWindow):
 
         """Mở chức năng phát hiện vi phạm giao thông."""
 
+        from redlight_violation import RedLight_violationDialog
+
         dialog = RedLight_violationDialog()  # Có thể dùng cùng dialog với redlight hoặc tách riêng file redlight_violation.py
 
         dialog.exec()
@@ -240,6 +281,8 @@ class MainWindow(QMainWindow):
 
         """Mở chức năng lưu trữ & báo cáo kết quả."""
 
+        from report import ReportDialog
+
         dialog = ReportDialog()
 
         dialog.exec()
@@ -248,6 +291,38 @@ class MainWindow(QMainWindow):
 
 
 
+# ======================
+
+# Làm nóng ở luồng nền
+
+# ======================
+
+def warm_up(modules=DIALOG_MODULES):
+
+    """Import trước các module con ở luồng nền (sau khi cửa sổ chính đã hiện)."""
+
+    def work():
+
+        for name in modules:
+
+            try:
+
+                importlib.import_module(name)
+
+            except Exception as e:
+
+                print(f"⚠ Không import trước được {name}: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=work, name="warm-up", daemon=True)
+
+    thread.start()
+
+    return thread
+
+
+
+
+
 # ======================
 
 # Chạy chương trình
@@ -262,4 +337,26 @@ if __name__ == "__main__":
 
     window.show()
 
+    # --warmup: import trước các module con; --preload: nạp trước cả model (ngầm có --warmup)
+
+    if "--warmup" in sys.argv or "--preload" in sys.argv:
+
+        warm_up()
+
+    if "--preload" in sys.argv:
+
+        registry.preload(PRELOAD_MODELS)
+
+    # --startup-time: in thời gian tới khi cửa sổ chính hiện rồi thoát (dùng cho startup_benchmark.py)
+
+    if "--startup-time" in sys.argv:
+
+        def report_startup():
+
+            print(f"startup_sec={time.perf_counter() - _T_START:.4f}", flush=True)
+
+            app.quit()
+
+        QTimer.singleShot(0, report_startup)
+
     sys.exit(app.exec())
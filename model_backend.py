@@ -0,0 +1,180 @@
+"""
+Chọn backend chạy model YOLO: PyTorch (.pt), ONNX Runtime (.onnx) hoặc OpenVINO.
+
+Xuất model trước (1 lần) bằng lệnh export, sau đó load_model("yolov8m.pt") tự dùng
+bản đã xuất nằm cạnh file .pt nếu có và runtime tương ứng đã được cài:
+    yolov8m_openvino_model/  (OpenVINO, ưu tiên trên CPU Intel)
+    yolov8m.onnx             (ONNX)
+    yolov8m.pt               (PyTorch, mặc định)
+Bản INT8 (yolov8m_int8_openvino_model/, yolov8m_int8.onnx) có thể lệch kết quả so với bản
+gốc nên chỉ được dùng khi chọn rõ: load_model(..., int8=True) hoặc biến môi trường YOLO_INT8=1.
+Model trả về vẫn là ultralytics.YOLO (AutoBackend chạy ONNX Runtime / OpenVINO),
+nên code dùng results[0].boxes không phải sửa.
+
+Xuất model:
+    python model_backend.py export yolov8m.pt                      # ONNX
+    python model_backend.py export yolov8m.pt --int8               # ONNX + bản INT8
+    python model_backend.py export yolov8m.pt --format openvino --int8
+    python model_backend.py which yolov8m.pt                       # xem bản sẽ được dùng
+    python model_backend.py which yolov8m.pt --int8
+"""
+import os
+import argparse
+import importlib.util
+
+BACKEND_AUTO = "auto"
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_OPENVINO = "openvino"
+
+# Backend mặc định (có thể đổi bằng biến môi trường YOLO_BACKEND)
+MODEL_BACKEND = os.environ.get("YOLO_BACKEND", BACKEND_AUTO)
+# Dùng bản INT8 đã xuất (biến môi trường YOLO_INT8=1); mặc định chỉ dùng bản FP32
+MODEL_INT8 = os.environ.get("YOLO_INT8", "") not in ("", "0")
+
+# Thứ tự ưu tiên khi chọn "auto"
+AUTO_ORDER = (BACKEND_OPENVINO, BACKEND_ONNX, BACKEND_TORCH)
+
+# Gói runtime cần có cho từng backend
+_RUNTIME_PACKAGE = {
+    BACKEND_ONNX: "onnxruntime",
+    BACKEND_OPENVINO: "openvino",
+}
+
+
+def _has_package(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def artifact_candidates(weights, backend, int8=False):
+    """Đường dẫn model đã xuất của 1 file .pt cho backend (bản INT8 nếu int8=True)."""
+    stem, _ = os.path.splitext(weights)
+    if backend == BACKEND_OPENVINO:
+        return [f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"]
+    if backend == BACKEND_ONNX:
+        return [f"{stem}_int8.onnx" if int8 else f"{stem}.onnx"]
+    return [weights]
+
+
+def resolve_model_path(weights, backend=None, int8=None):
+    """
+    Chọn file model sẽ nạp. Trả về (đường dẫn, backend).
+    backend=None dùng MODEL_BACKEND; "auto" lấy bản đã xuất đầu tiên có sẵn
+    (và runtime đã cài), không có thì dùng chính file .pt.
+    int8=None dùng MODEL_INT8; chỉ khi int8=True mới chọn bản INT8, và khi đó không lấy
+    bản FP32 đã xuất thay thế (auto không có bản INT8 nào thì dùng file .pt).
+    """
+    backend = backend or MODEL_BACKEND
+    int8 = MODEL_INT8 if int8 is None else int8
+    if not weights.endswith(".pt"):
+        # Đã chỉ định thẳng file .onnx / thư mục openvino
+        return weights, None
+
+    order = AUTO_ORDER if backend == BACKEND_AUTO else (backend,)
+    for name in order:
+        if name == BACKEND_TORCH:
+            return weights, BACKEND_TORCH
+        package = _RUNTIME_PACKAGE.get(name)
+        if package and not _has_package(package):
+            continue
+        for path in artifact_candidates(weights, name, int8=int8):
+            if os.path.exists(path):
+                return path, name
+    if backend != BACKEND_AUTO:
+        raise FileNotFoundError(
+            f"Chưa có model {backend}{' INT8' if int8 else ''} cho {weights} (chạy: python "
+            f"model_backend.py export {weights} --format {backend}{' --int8' if int8 else ''}) "
+            f"hoặc chưa cài {_RUNTIME_PACKAGE.get(backend)}"
+        )
+    return weights, BACKEND_TORCH
+
+
+def load_model(weights, backend=None, task="detect", int8=None):
+    """Nạp model YOLO theo backend đã chọn (xem resolve_model_path)."""
+    from ultralytics import YOLO
+
+    path, _ = resolve_model_path(weights, backend, int8=int8)
+    # Model đã xuất không lưu task -> chỉ định rõ để AutoBackend không phải đoán
+    return YOLO(path, task=task)
+
+
+# ================== Xuất model ==================
+def _quantize_onnx(onnx_path):
+    """Lượng tử hóa động INT8 (trọng số) cho file ONNX, trả về đường dẫn *_int8.onnx."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    stem, _ = os.path.splitext(onnx_path)
+    out_path = f"{stem}_int8.onnx"
+    quantize_dynamic(onnx_path, out_path, weight_type=QuantType.QUInt8)
+    return out_path
+
+
+def export_model(weights, fmt=BACKEND_ONNX, int8=False, imgsz=640, dynamic=True, data=None):
+    """
+    Xuất model .pt sang ONNX / OpenVINO, trả về list đường dẫn đã tạo.
+    dynamic=True: cho phép kích thước ảnh / số ảnh mỗi lô thay đổi (ROI suy luận, suy luận theo lô).
+    int8: ONNX -> lượng tử hóa động bằng onnxruntime; OpenVINO -> lượng tử hóa của
+          ultralytics (cần tập ảnh hiệu chỉnh, data=file yaml dataset).
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    outputs = []
+    if fmt == BACKEND_ONNX:
+        path = model.export(format="onnx", imgsz=imgsz, dynamic=dynamic)
+        outputs.append(str(path))
+        if int8:
+            outputs.append(_quantize_onnx(str(path)))
+    elif fmt == BACKEND_OPENVINO:
+        kwargs = {"format": "openvino", "imgsz": imgsz, "dynamic": dynamic}
+        path = model.export(**kwargs)
+        outputs.append(str(path))
+        if int8:
+            if data:
+                kwargs["data"] = data
+            path = model.export(int8=True, **kwargs)
+            # ultralytics đặt tên <stem>_int8_openvino_model
+            outputs.append(str(path))
+    else:
+        raise ValueError(f"Định dạng xuất không hỗ trợ: {fmt}")
+    return outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xuất / kiểm tra backend model YOLO.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_export = sub.add_parser("export", help="Xuất file .pt sang ONNX / OpenVINO")
+    p_export.add_argument("weights", nargs="+", help="File .pt (vd: yolov8m.pt yolov8n.pt)")
+    p_export.add_argument("--format", choices=(BACKEND_ONNX, BACKEND_OPENVINO), default=BACKEND_ONNX)
+    p_export.add_argument("--int8", action="store_true", help="Xuất thêm bản lượng tử hóa INT8")
+    p_export.add_argument("--imgsz", type=int, default=640)
+    p_export.add_argument("--static", action="store_true",
+                          help="Cố định kích thước đầu vào (nhanh hơn chút, không dùng được --roi / lô)")
+    p_export.add_argument("--data", default=None, help="Dataset yaml để hiệu chỉnh INT8 (OpenVINO)")
+
+    p_which = sub.add_parser("which", help="Xem file model sẽ được nạp")
+    p_which.add_argument("weights", nargs="+")
+    p_which.add_argument("--backend", default=None,
+                         choices=(BACKEND_AUTO, BACKEND_TORCH, BACKEND_ONNX, BACKEND_OPENVINO))
+    p_which.add_argument("--int8", action="store_true", default=None, help="Chọn bản INT8")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        for weights in args.weights:
+            outputs = export_model(weights, fmt=args.format, int8=args.int8, imgsz=args.imgsz,
+                                   dynamic=not args.static, data=args.data)
+            for path in outputs:
+                print(f"✅ {weights} -> {path}")
+    elif args.cmd == "which":
+        for weights in args.weights:
+            try:
+                path, name = resolve_model_path(weights, args.backend, int8=args.int8)
+                print(f"{weights}: {path} ({name or 'đã chỉ định'})")
+            except FileNotFoundError as e:
+                print(f"{weights}: ❌ {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
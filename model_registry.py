@@ -0,0 +1,141 @@
+"""
+Kho model dùng chung cho cả ứng dụng (YOLO, EasyOCR).
+
+- Nạp lười: model chỉ được nạp ở lần acquire() đầu tiên, các lần sau dùng lại
+  (mở lại 1 chức năng không phải nạp model từ đĩa).
+- Đếm tham chiếu: acquire() / release(); model không còn ai dùng vẫn được giữ
+  trong bộ nhớ (mở lại tức thì) cho tới khi gọi trim().
+- preload(): nạp trước ở luồng nền khi mở ứng dụng.
+- Cùng 1 khóa chỉ có 1 bản (vd. yolov8n.pt dùng chung cho detect.py và redlight.py).
+
+Khóa model: "yolo:<đường dẫn .pt>" hoặc "easyocr:<ngôn ngữ,...>".
+"""
+import threading
+
+from model_backend import load_model
+
+
+def yolo_key(weights):
+    return f"yolo:{weights}"
+
+
+def ocr_key(langs=("en",)):
+    return "easyocr:" + ",".join(langs)
+
+
+def _load_yolo(spec):
+    return load_model(spec)
+
+
+def _load_easyocr(spec):
+    import easyocr  # nặng (torch) -> chỉ import khi thật sự cần
+    return easyocr.Reader(spec.split(","))
+
+
+_LOADERS = {
+    "yolo": _load_yolo,
+    "easyocr": _load_easyocr,
+}
+
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        self.error = None
+        self.refs = 0
+        self.loaded = threading.Event()
+        self.loading = False
+
+
+class ModelRegistry:
+    def __init__(self, loaders=None):
+        self.loaders = dict(loaders or _LOADERS)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    # ---------- Nạp ----------
+    def _load(self, key, entry):
+        kind, _, spec = key.partition(":")
+        loader = self.loaders.get(kind)
+        try:
+            if loader is None:
+                raise KeyError(f"Không có loader cho model '{kind}'")
+            entry.model = loader(spec)
+            entry.error = None
+        except Exception as e:
+            entry.error = e
+        finally:
+            with self._lock:
+                entry.loading = False
+            entry.loaded.set()
+
+    def _ensure(self, key):
+        """Nạp model nếu chưa có (chỉ 1 luồng nạp, các luồng khác chờ). Trả về entry."""
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            must_load = not entry.loaded.is_set() and not entry.loading
+            if must_load:
+                entry.loading = True
+        if must_load:
+            self._load(key, entry)
+        entry.loaded.wait()
+        return entry
+
+    # ---------- API ----------
+    def acquire(self, key):
+        """Lấy model theo khóa (nạp nếu cần) và tăng số tham chiếu. Lỗi nạp -> ném lại exception."""
+        entry = self._ensure(key)
+        with self._lock:
+            if entry.error is not None:
+                # Cho phép thử nạp lại ở lần acquire sau
+                self._entries.pop(key, None)
+                raise entry.error
+            entry.refs += 1
+            return entry.model
+
+    def release(self, key):
+        """Giảm số tham chiếu (model vẫn được giữ lại cho lần dùng sau)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+
+    def preload(self, keys, background=True):
+        """Nạp trước các model (mặc định ở luồng nền), trả về luồng nạp hoặc None."""
+        keys = list(keys)
+
+        def work():
+            for key in keys:
+                self._ensure(key)
+
+        if not background:
+            work()
+            return None
+        thread = threading.Thread(target=work, name="model-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.loaded.is_set() and entry.error is None
+
+    def trim(self):
+        """Bỏ các model đã nạp nhưng không còn ai dùng, trả về list khóa đã bỏ."""
+        with self._lock:
+            dropped = [k for k, e in self._entries.items()
+                       if e.loaded.is_set() and e.refs == 0]
+            for k in dropped:
+                del self._entries[k]
+        return dropped
+
+    def summary(self):
+        with self._lock:
+            return {
+                k: {"loaded": e.loaded.is_set() and e.error is None, "refs": e.refs}
+                for k, e in self._entries.items()
+            }
+
+
+# Kho dùng chung cho cả tiến trình
+registry = ModelRegistry()
@@ -0,0 +1,136 @@
+"""
+Bộ nhớ đệm OCR biển số theo track (mỗi biển số trên video được gắn 1 ID bởi tracker).
+
+Thay vì OCR mọi biển số ở mọi frame:
+- mỗi frame chỉ đo độ nét (phương sai Laplacian) x diện tích của crop và giữ lại crop tốt nhất;
+- 1 track chỉ được OCR tối đa max_ocr lần: lần đầu sau min_frames frame (lấy crop tốt nhất
+  tới lúc đó), các lần sau chỉ khi có crop tốt hơn hẳn (improve_ratio) crop đã OCR;
+- các lần đọc được bỏ phiếu, chữ nhiều phiếu nhất là kết quả của track; đủ confirm_votes
+  phiếu giống nhau thì không OCR track đó nữa.
+"""
+import re
+import threading
+from collections import Counter
+
+import cv2
+
+_PLATE_CHARS = re.compile(r"[^0-9A-Z.\- ]")
+
+
+def normalize_plate(text):
+    """Chuẩn hóa chữ OCR để bỏ phiếu: chữ hoa, bỏ ký tự lạ, gộp khoảng trắng."""
+    if not text:
+        return ""
+    return " ".join(_PLATE_CHARS.sub("", text.upper()).split())
+
+
+def plate_quality(crop):
+    """Điểm chất lượng crop: độ nét (phương sai Laplacian) x diện tích."""
+    if crop is None or crop.size == 0:
+        return 0.0
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(sharpness) * gray.shape[0] * gray.shape[1]
+
+
+class _PlateTrack:
+    __slots__ = ("frames", "best_q", "best_crop", "ocr_q", "ocr_count", "last_ocr",
+                 "pending", "votes", "best_reading", "confirmed")
+
+    def __init__(self):
+        self.frames = 0
+        self.best_q = 0.0
+        self.best_crop = None
+        self.ocr_q = 0.0           # chất lượng crop của lần OCR gần nhất
+        self.ocr_count = 0
+        self.last_ocr = None       # frame_idx của lần OCR gần nhất
+        self.pending = False       # đang chờ kết quả OCR
+        self.votes = Counter()
+        self.best_reading = None   # (chất lượng, chữ) của crop tốt nhất đã đọc được
+        self.confirmed = False
+
+
+class PlateTrackCache:
+    def __init__(self, max_ocr=3, min_frames=3, improve_ratio=1.5, min_gap=5, confirm_votes=2):
+        self.max_ocr = max_ocr
+        self.min_frames = min_frames
+        self.improve_ratio = improve_ratio
+        self.min_gap = min_gap
+        self.confirm_votes = confirm_votes
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def observe(self, track_id, crop, frame_idx, allow_ocr=True):
+        """
+        Ghi nhận crop biển số của track ở frame_idx.
+        Trả về crop cần OCR (crop tốt nhất của track) hoặc None nếu chưa / không cần OCR.
+        allow_ocr=False: chỉ cập nhật crop tốt nhất (vd. hàng chờ OCR đang đầy).
+        """
+        q = plate_quality(crop)
+        with self._lock:
+            t = self._tracks.setdefault(track_id, _PlateTrack())
+            t.frames += 1
+            if t.confirmed or t.ocr_count >= self.max_ocr:
+                return None
+            if (t.best_crop is None and t.ocr_count == 0) or q > t.best_q:
+                t.best_q = q
+                t.best_crop = crop.copy()
+            if not allow_ocr or t.pending or t.best_crop is None:
+                return None
+
+            if t.ocr_count == 0:
+                if t.frames < self.min_frames:
+                    return None
+            elif (t.best_q < t.ocr_q * self.improve_ratio
+                  or frame_idx - t.last_ocr < self.min_gap):
+                return None
+
+            crop, t.best_crop = t.best_crop, None
+            t.pending = True
+            t.ocr_q = t.best_q
+            t.last_ocr = frame_idx
+            return crop
+
+    def add_reading(self, track_id, text):
+        """Ghi kết quả OCR của track, trả về chữ hiện tại sau bỏ phiếu (hoặc None)."""
+        with self._lock:
+            t = self._tracks.get(track_id)
+            if t is None:
+                return None
+            t.pending = False
+            t.ocr_count += 1
+            plate = normalize_plate(text)
+            if plate:
+                t.votes[plate] += 1
+                if t.best_reading is None or t.ocr_q > t.best_reading[0]:
+                    t.best_reading = (t.ocr_q, plate)
+                if t.votes[plate] >= self.confirm_votes:
+                    t.confirmed = True
+            return self._voted(t)
+
+    def text(self, track_id):
+        with self._lock:
+            t = self._tracks.get(track_id)
+            return self._voted(t) if t is not None else None
+
+    @staticmethod
+    def _voted(t):
+        if not t.votes:
+            return None
+        top = max(t.votes.values())
+        winners = [plate for plate, n in t.votes.items() if n == top]
+        # Hòa phiếu -> lấy chữ đọc từ crop tốt nhất
+        if len(winners) > 1 and t.best_reading is not None and t.best_reading[1] in winners:
+            return t.best_reading[1]
+        return winners[0]
+
+    def forget(self, active_ids):
+        """Bỏ các track không còn trong tracker."""
+        active_ids = set(active_ids)
+        with self._lock:
+            for track_id in [k for k in self._tracks if k not in active_ids]:
+                del self._tracks[track_id]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tracks)
@@ -1,10 +1,13 @@
 import sys
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QPushButton, QLabel, QFileDialog
-from ultralytics import YOLO
+import time
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QPushButton, QLabel, QFileDialog, QCheckBox
+from PyQt6.QtCore import QThread, pyqtSignal
+from model_registry import registry, yolo_key
 import cv2
 import os
 import tkinter as tk
 import numpy as np
+from video_source import open_video_source
 
 # ==============================================================================
 # THÔNG SỐ CỐ ĐỊNH VÀ ROI ĐÈN ĐÃ CẬP NHẬT
@@ -21,6 +24,12 @@ ROI_LIGHT_RIGHT = (1261 - 15, 98 - 35, 1261 + 15, 98 + 35) # (1246, 63, 1276, 13
 # Cần đảm bảo x2 không vượt quá 1280
 ROI_LIGHT_RIGHT = (1246, 63, 1279, 133) 
 
+# Model nhận diện xe (chỉ dùng khi bật "Nhận diện xe")
+VEHICLE_MODEL = "yolov8n.pt"
+VEHICLE_CLASSES = [2, 3, 5, 7]  # car, motorcycle, bus, truck
+
+COLOR_MAP = {"RED": (0, 0, 255), "GREEN": (0, 255, 0), "YELLOW": (0, 255, 255), "UNKNOWN": (100, 100, 100)}
+
 
 def get_screen_size():
     """Lấy kích thước màn hình chính"""
@@ -29,35 +38,206 @@ def get_screen_size():
     return root.winfo_screenwidth(), root.winfo_screenheight()
 
 
+def get_light_color_from_roi(roi):
+    """Xác định màu của vùng ROI đèn giao thông dựa trên giá trị BGR trung bình"""
+    if roi is None or roi.size == 0:
+        return "UNKNOWN"
+    
+    b, g, r = roi.mean(axis=(0, 1))
+    
+    if r > g * 1.5 and r > 80:
+        return "RED"
+    elif g > r * 1.5 and g > 80:
+        return "GREEN"
+    elif r > 100 and g > 100 and abs(r - g) < 60:
+        return "YELLOW"
+    else:
+        return "UNKNOWN"
+
+
+# ================== WORKER ĐÈN GIAO THÔNG ==================
+class LightWorker(QThread):
+    """
+    Đọc video + nhận diện màu đèn trên luồng riêng (GUI không bị treo, nút Dừng luôn bấm được).
+    detect_vehicles=False: chỉ phân tích màu ROI đèn (không chạy YOLO, rất nhanh);
+    detect_vehicles=True: chạy thêm YOLO, vẽ khung và đếm số xe trong khung hình.
+    """
+    light_signal = pyqtSignal(str, str)      # (đèn trái, đèn phải), chỉ phát khi đổi trạng thái
+    stats_signal = pyqtSignal(float, int)    # (fps, số xe ở frame gần nhất), ~1 lần/giây
+    status_signal = pyqtSignal(str)
+    finished_signal = pyqtSignal()
+
+    def __init__(self, source=0, detect_vehicles=False, show_window=True, screen_size=None):
+        super().__init__()
+        self.source = source
+        self.detect_vehicles = detect_vehicles
+        self.show_window = show_window
+        # Kích thước màn hình lấy sẵn ở luồng GUI (tkinter không dùng được từ luồng phụ)
+        self.screen_size = screen_size or (TARGET_W, TARGET_H)
+        self.model = None
+        self._running = False
+        self.frames_processed = 0
+
+    def stop(self):
+        self._running = False
+
+    def _open_capture(self):
+        if isinstance(self.source, str):
+            return open_video_source(self.source, size=(TARGET_W, TARGET_H), prefetch=2)
+        return open_video_source(self.source, size=(TARGET_W, TARGET_H))
+
+    def _read_lights(self, frame):
+        x1_l, y1_l, x2_l, y2_l = ROI_LIGHT_LEFT
+        x1_r, y1_r, x2_r, y2_r = ROI_LIGHT_RIGHT
+        light_left = get_light_color_from_roi(frame[y1_l:y2_l, x1_l:x2_l])
+        light_right = get_light_color_from_roi(frame[y1_r:y2_r, x1_r:x2_r])
+        return light_left, light_right
+
+    def _draw_lights(self, frame, light_left, light_right):
+        """Vẽ khung ROI và Label lên khung hình (dùng màu cho dễ debug)"""
+        x1_l, y1_l, x2_l, y2_l = ROI_LIGHT_LEFT
+        color_l = COLOR_MAP.get(light_left)
+        cv2.rectangle(frame, (x1_l, y1_l), (x2_l, y2_l), color_l, 2)
+        cv2.putText(frame, f"LEFT: {light_left}", (x1_l, y1_l - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_l, 2)
+
+        x1_r, y1_r, x2_r, y2_r = ROI_LIGHT_RIGHT
+        color_r = COLOR_MAP.get(light_right)
+        cv2.rectangle(frame, (x1_r, y1_r), (x2_r, y2_r), color_r, 2)
+        cv2.putText(frame, f"RIGHT: {light_right}", (x1_r - 50, y1_r - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_r, 2)
+
+    def _detect_vehicles(self, frame):
+        """Chạy YOLO, vẽ khung các xe, trả về số xe."""
+        results = self.model(frame, verbose=False)
+        count = 0
+        for box in results[0].boxes:
+            try:
+                cls = int(box.cls)
+            except Exception:
+                continue
+            if cls not in VEHICLE_CLASSES:
+                continue
+            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 200, 0), 2)
+            count += 1
+        cv2.putText(frame, f"Vehicles: {count}", (20, TARGET_H - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 200, 0), 2)
+        return count
+
+    def _show_frame(self, frame, screen_w, screen_h):
+        """Hiển thị frame bằng OpenCV. Trả về False nếu người dùng nhấn 'q'."""
+        cv2.imshow("Traffic Light Detection", frame)
+
+        # Điều chỉnh cửa sổ theo kích thước màn hình
+        win_h, win_w = frame.shape[:2]
+        if win_w > screen_w or win_h > screen_h:
+            scale = min(screen_w / win_w, screen_h / win_h) * 0.7
+            win_w, win_h = int(win_w * scale), int(win_h * scale)
+        cv2.resizeWindow("Traffic Light Detection", win_w, win_h)
+
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+    def run(self):
+        if self.detect_vehicles:
+            try:
+                self.status_signal.emit("Đang tải model YOLO...")
+                self.model = registry.acquire(yolo_key(VEHICLE_MODEL))
+            except Exception as e:
+                self.status_signal.emit(f"Lỗi tải model: {e}")
+                self.finished_signal.emit()
+                return
+
+        cap = self._open_capture()
+        if not cap.isOpened():
+            self.status_signal.emit("❌ Lỗi: Không thể mở video/camera")
+            self._release_model()
+            self.finished_signal.emit()
+            return
+
+        screen_w, screen_h = self.screen_size
+        self._running = True
+        self.frames_processed = 0
+        last_lights = None
+        vehicles = 0
+        t_report = time.perf_counter()
+        frames_since_report = 0
+        try:
+            while self._running:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                lights = self._read_lights(frame)
+                if lights != last_lights:
+                    last_lights = lights
+                    self.light_signal.emit(*lights)
+
+                if self.detect_vehicles:
+                    vehicles = self._detect_vehicles(frame)
+
+                self.frames_processed += 1
+                frames_since_report += 1
+                now = time.perf_counter()
+                if now - t_report >= 1.0:
+                    self.stats_signal.emit(frames_since_report / (now - t_report), vehicles)
+                    t_report = now
+                    frames_since_report = 0
+
+                if self.show_window:
+                    self._draw_lights(frame, *lights)
+                    if not self._show_frame(frame, screen_w, screen_h):
+                        break
+        except Exception as e:
+            self.status_signal.emit(f"Lỗi xử lý video: {e}")
+        finally:
+            self._running = False
+            cap.release()
+            if self.show_window:
+                cv2.destroyAllWindows()
+            self._release_model()
+            self.finished_signal.emit()
+
+    def _release_model(self):
+        if self.model is not None:
+            registry.release(yolo_key(VEHICLE_MODEL))
+            self.model = None
+
+
 class RedLightDialog(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("🚦 Nhận Diện Đèn Giao Thông")
         self.setFixedSize(600, 300)
 
-        screen_w, screen_h = get_screen_size()
+        self.screen_size = get_screen_size()
+        screen_w, screen_h = self.screen_size
         self.move((screen_w - self.width()) // 2, (screen_h - self.height()) // 2)
 
         layout = QVBoxLayout()
         self.label = QLabel("Chức năng chỉ nhận diện và hiển thị trạng thái đèn.")
+        self.chk_vehicles = QCheckBox("Nhận diện xe (YOLO, chậm hơn)")
         self.btn_start = QPushButton("▶ Bắt đầu (Camera)")
         self.btn_video = QPushButton("📂 Chọn video")
         self.btn_stop = QPushButton("⏹ Dừng")
         
         layout.addWidget(self.label)
+        layout.addWidget(self.chk_vehicles)
         layout.addWidget(self.btn_start)
         layout.addWidget(self.btn_video)
         layout.addWidget(self.btn_stop)
         
         self.setLayout(layout)
 
-        # Load YOLO model
-        self.model = YOLO("yolov8n.pt")
+        # Worker đọc video + nhận diện (model YOLO chỉ nạp khi bật "Nhận diện xe")
+        self.worker = None
 
         # Trạng thái
-        self.running = False
         self.light_state_left = "UNKNOWN"
         self.light_state_right = "UNKNOWN"
+        self.fps = 0.0
+        self.vehicle_count = None
+        self.message = "Chọn nguồn để bắt đầu nhận diện."
         
         self.btn_start.clicked.connect(self.start_detect_camera)
         self.btn_video.clicked.connect(self.start_detect_video)
@@ -65,104 +245,68 @@ class RedLightDialog(QDialog):
         
         self.update_status_label()
 
-    def get_light_color_from_roi(self, roi):
-        """Xác định màu của vùng ROI đèn giao thông dựa trên giá trị BGR trung bình"""
-        if roi is None or roi.size == 0:
-            return "UNKNOWN"
-        
-        b, g, r = roi.mean(axis=(0, 1))
-        
-        if r > g * 1.5 and r > 80:
-            return "RED"
-        elif g > r * 1.5 and g > 80:
-            return "GREEN"
-        elif r > 100 and g > 100 and abs(r - g) < 60:
-            return "YELLOW"
-        else:
-            return "UNKNOWN"
+    @property
+    def running(self):
+        return self.worker is not None and self.worker.isRunning()
 
     def update_status_label(self):
         """Cập nhật trạng thái đèn trên cửa sổ PyQt"""
         text = (f"Trạng thái Đèn Trái: **{self.light_state_left}**\n"
-                f"Trạng thái Đèn Phải: **{self.light_state_right}**\n\n"
-                f"Chọn nguồn để bắt đầu nhận diện.")
+                f"Trạng thái Đèn Phải: **{self.light_state_right}**\n")
+        if self.running:
+            text += f"FPS: {self.fps:.1f}"
+            if self.vehicle_count is not None:
+                text += f" | Số xe: {self.vehicle_count}"
+            text += "\n"
+        text += f"\n{self.message}"
         self.label.setText(text)
 
-    def detect(self, cap):
-        if not cap.isOpened():
-            self.label.setText("❌ Lỗi: Không thể mở video/camera")
-            return
+    # ---------- Slot nhận signal từ worker ----------
+    def on_lights(self, light_left, light_right):
+        self.light_state_left = light_left
+        self.light_state_right = light_right
+        self.update_status_label()
 
-        screen_w, screen_h = get_screen_size()
-        self.running = True
-
-        while self.running:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # 1. Chuẩn hóa kích thước khung hình
-            frame = cv2.resize(frame, (TARGET_W, TARGET_H))
-            frame_h, frame_w = frame.shape[:2]
-
-            # 2. Lấy ROI và Xác định màu đèn (CHỈ SỬ DỤNG CÁC ROI CỐ ĐỊNH)
-            
-            # Đèn Trái
-            x1_l, y1_l, x2_l, y2_l = ROI_LIGHT_LEFT
-            roi_l = frame[y1_l:y2_l, x1_l:x2_l]
-            self.light_state_left = self.get_light_color_from_roi(roi_l)
-            
-            # Đèn Phải
-            x1_r, y1_r, x2_r, y2_r = ROI_LIGHT_RIGHT
-            roi_r = frame[y1_r:y2_r, x1_r:x2_r]
-            self.light_state_right = self.get_light_color_from_roi(roi_r)
-
-            # 3. Vẽ khung ROI và Label lên khung hình (dùng màu cho dễ debug)
-            color_map = {"RED": (0, 0, 255), "GREEN": (0, 255, 0), "YELLOW": (0, 255, 255), "UNKNOWN": (100, 100, 100)}
-            
-            # Vẽ đèn Trái
-            color_l = color_map.get(self.light_state_left)
-            cv2.rectangle(frame, (x1_l, y1_l), (x2_l, y2_l), color_l, 2)
-            cv2.putText(frame, f"LEFT: {self.light_state_left}", (x1_l, y1_l - 5), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_l, 2)
-
-            # Vẽ đèn Phải
-            color_r = color_map.get(self.light_state_right)
-            cv2.rectangle(frame, (x1_r, y1_r), (x2_r, y2_r), color_r, 2)
-            cv2.putText(frame, f"RIGHT: {self.light_state_right}", (x1_r - 50, y1_r - 5), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_r, 2)
-
-
-            # 4. Nhận diện các đối tượng khác bằng YOLO (nhưng không xử lý vi phạm)
-            results = self.model(frame, verbose=False)
-            
-            # 5. Cập nhật trạng thái trên dialog
-            self.update_status_label()
-
-            # 6. Hiển thị video
-            cv2.imshow("Traffic Light Detection", frame)
-
-            # Điều chỉnh cửa sổ theo kích thước màn hình
-            win_w, win_h = frame_w, frame_h
-            if win_w > screen_w or win_h > screen_h:
-                 scale = min(screen_w / win_w, screen_h / win_h) * 0.7 
-                 win_w, win_h = int(win_w * scale), int(win_h * scale)
-            cv2.resizeWindow("Traffic Light Detection", win_w, win_h)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-
-        cap.release()
-        cv2.destroyAllWindows()
-        self.running = False
+    def on_stats(self, fps, vehicles):
+        self.fps = fps
+        if self.worker is not None and self.worker.detect_vehicles:
+            self.vehicle_count = vehicles
+        self.update_status_label()
+
+    def on_status(self, text):
+        self.message = text
+        self.update_status_label()
+
+    def on_finished(self):
         self.light_state_left = "Stopped"
         self.light_state_right = "Stopped"
+        self.vehicle_count = None
+        self.message = "Đã dừng. Chọn nguồn để bắt đầu nhận diện."
+        self.btn_start.setEnabled(True)
+        self.btn_video.setEnabled(True)
+        self.chk_vehicles.setEnabled(True)
+        self.update_status_label()
+
+    def detect(self, source):
+        """Chạy nhận diện trên luồng worker."""
+        self.worker = LightWorker(source=source, detect_vehicles=self.chk_vehicles.isChecked(),
+                                  screen_size=self.screen_size)
+        self.worker.light_signal.connect(self.on_lights)
+        self.worker.stats_signal.connect(self.on_stats)
+        self.worker.status_signal.connect(self.on_status)
+        self.worker.finished_signal.connect(self.on_finished)
+
+        self.btn_start.setEnabled(False)
+        self.btn_video.setEnabled(False)
+        self.chk_vehicles.setEnabled(False)
+        self.fps = 0.0
+        self.message = "Đang nhận diện... (nhấn Dừng hoặc 'q' trên cửa sổ video)"
+        self.worker.start()
         self.update_status_label()
 
     def start_detect_camera(self):
         if not self.running:
-            cap = cv2.VideoCapture(0)
-            self.detect(cap)
+            self.detect(0)
 
     def start_detect_video(self):
         if not self.running:
@@ -170,11 +314,15 @@ class RedLightDialog(QDialog):
                 self, "Chọn video", "", "Video Files (*.mp4 *.avi *.mov)"
             )
             if file_path and os.path.exists(file_path):
-                cap = cv2.VideoCapture(file_path)
-                self.detect(cap)
+                self.detect(file_path)
 
     def stop_detect(self):
-        self.running = False
-        self.light_state_left = "Stopped"
-        self.light_state_right = "Stopped"
-        self.update_status_label()
\ No newline at end of file
+        if self.worker is not None:
+            self.worker.stop()
+
+    def done(self, result):
+        """Đóng dialog: dừng worker (worker tự trả model về kho dùng chung)."""
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker.wait()
+        super().done(result)
@@ -3,13 +3,22 @@ import os
 import cv2
 import csv
 import datetime
+import time
+import threading
 import tkinter as tk
 from PyQt6.QtCore import QThread, pyqtSignal
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QPushButton, QLabel,
     QFileDialog, QApplication
 )
-from ultralytics import YOLO
+from model_registry import registry, yolo_key
+from frame_pipeline import FramePipeline, DROP_BLOCK, DROP_OLDEST
+from tracker import HungarianTracker, KalmanTracker
+from light_gate import LightGate
+from violation_writer import AsyncViolationWriter
+from violation_store import ViolatedTrackIds, open_store, TRACK_ID_STRIDE
+from violation_dedup import RecentViolationIndex
+from video_source import open_video_source
 #by Truong Viet Tran , do not reup ,sdt:0877973723
 # ================== CẤU HÌNH CHUNG ==================
 TARGET_W, TARGET_H = 1280, 720
@@ -46,6 +55,21 @@ COLOR_MAP = {
     "UNKNOWN": (255, 255, 255)
 }
 
+# Vùng chạy YOLO (ROI suy luận) = vùng kiểm tra vi phạm + lề.
+# Lề trên lớn hơn để bbox xe (kéo dài lên trên so với bottom_y) không bị cắt.
+INFER_ROI_MARGIN = 80
+INFER_ROI_MARGIN_TOP = 200
+# imgsz mặc định của YOLO cho cả frame TARGET_W (giữ nguyên mật độ pixel khi cắt ROI)
+YOLO_IMGSZ = 640
+
+# Bỏ qua YOLO thích ứng: khi đèn đỏ, xe ở trong vùng [LINE_S5_Y, LINE_Y + margin]
+# thì chạy YOLO mọi frame
+ADAPTIVE_ZONE_MARGIN = 60
+
+# Khử trùng vi phạm: 2 vi phạm cách nhau < DEDUP_POS_THRESHOLD px (và IoU đủ lớn)
+# trong cửa sổ thời gian coi là cùng 1 xe
+DEDUP_POS_THRESHOLD = 80
+
 # Lớp xe trong COCO
 VEHICLE_CLASSES = [2, 3, 5, 7]  # car, motorcycle, bus, truck
 
@@ -97,6 +121,26 @@ def clamp_roi(x1, y1, x2, y2, w, h):
     return x1c, y1c, x2c, y2c
 
 
+def compute_inference_roi(margin=INFER_ROI_MARGIN, margin_top=INFER_ROI_MARGIN_TOP,
+                          w=TARGET_W, h=TARGET_H):
+    """
+    ROI (x1, y1, x2, y2) để chạy YOLO, suy ra từ hình học vạch dừng:
+    lane 2 (STOP_LINE_X2..STOP_LINE_X3) và dải LINE_S5_Y..LINE_Y, cộng thêm lề.
+    """
+    return clamp_roi(
+        STOP_LINE_X2 - margin, LINE_S5_Y - margin_top,
+        STOP_LINE_X3 + margin, LINE_Y + margin,
+        w, h
+    )
+
+
+def roi_imgsz(roi, full_w=TARGET_W, full_imgsz=YOLO_IMGSZ):
+    """imgsz (bội số 32) cho ROI sao cho mật độ pixel bằng khi chạy cả frame."""
+    x1, y1, x2, y2 = roi
+    side = max(x2 - x1, y2 - y1) * full_imgsz / full_w
+    return max(32, int(-(-side // 32)) * 32)
+
+
 def detect_light_color(roi_bgr):
     """
     Nhận diện màu đèn từ ROI bằng HSV.
@@ -242,123 +286,149 @@ class DetectWorker(QThread):
     finished_signal = pyqtSignal()
     new_violation_signal = pyqtSignal(dict)
 
-    def __init__(self, source=0, model_path="yolov8m.pt"):
+    def __init__(self, source=0, model_path="yolov8m.pt", headless=False,
+                 pipelined=False, queue_size=4, drop_policy=None,
+                 inference_service=None, tracker_backend="simple",
+                 detect_every=1, adaptive_skip=False, roi_inference=False,
+                 violation_only=False, gate_warmup_frames=30, gate_green_stride=0,
+                 async_writes=True, store=None, storage_backend=None,
+                 dedup_window_sec=5.0, track_id_start=None,
+                 decode_backend="auto", frame_stride=1):
         super().__init__()
         self.source = source
         self.model_path = model_path
+        # headless=True: không vẽ overlay, không mở cửa sổ OpenCV (chạy batch trên server)
+        self.headless = headless
+
+        # pipelined=True: decode -> YOLO -> tracker -> hiển thị/ghi đĩa chạy song song
+        # drop_policy=None: camera bỏ frame cũ (drop_oldest), video file thì chờ (block)
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.pipeline_stats = None
+
+        # Giải mã video: decode_backend "auto" / "pyav" / "opencv" (xem video_source.py),
+        # frame_stride=N: chỉ xử lý 1/N frame, các frame còn lại vẫn giải mã nhưng bỏ qua
+        # chuyển màu / đổi kích thước / YOLO / tracker
+        self.decode_backend = decode_backend
+        self.frame_stride = max(1, int(frame_stride))
+
+        # inference_service: BatchInferenceService dùng chung (nhiều camera / nhiều frame 1 lô).
+        # Khi có service thì worker không tự tải model.
+        self.inference_service = inference_service
+
+        # roi_inference=True: chỉ đưa vùng quanh vạch dừng vào YOLO (ít pixel hơn -> nhanh hơn)
+        self.infer_roi = compute_inference_roi() if roi_inference else None
+        self.infer_imgsz = roi_imgsz(self.infer_roi) if self.infer_roi else None
+
+        # violation_only=True: tạm dừng (hoặc chạy thưa) nhận diện xe khi đèn phải đang xanh
+        self.light_gate = (
+            LightGate(warmup_frames=gate_warmup_frames, green_stride=gate_green_stride)
+            if violation_only else None
+        )
+
+        # async_writes=True: ghi ảnh + CSV ở luồng nền (tạo khi run(), đóng khi kết thúc)
+        self.async_writes = async_writes
+        self.writer = None
+        self.writer_stats = None
         self._running = False
         self.model = None
 
-        # id riêng cho mỗi lần lưu vào report.csv
+        # Kho vi phạm (SQLite mặc định, hoặc report.csv/status.csv) dùng chung với màn hình báo cáo
+        self.store = store if store is not None else open_store(storage_backend, VIOLATION_DIR)
+
+        # id riêng cho mỗi lần lưu vào report
         self.violation_counter = 0
+        self._init_violation_counter()
 
-        ensure_violation_dir()
-        self._init_violation_counter_from_csv()
+        # detect_every=N: chỉ chạy YOLO mỗi N frame, các frame giữa dùng vị trí dự đoán (Kalman)
+        # adaptive_skip=True: chạy YOLO dày hơn khi xe gần vạch lúc đèn đỏ hoặc di chuyển nhanh
+        self.detect_every = max(1, int(detect_every))
+        self.adaptive_skip = adaptive_skip
+        self._frames_since_detect = 0
+        # Gợi ý "cần chạy YOLO dày": stage tracker ghi, stage YOLO đọc (khác luồng khi pipelined)
+        self._dense_needed = threading.Event()
+        self.yolo_frames = 0
 
         # Tracker & danh sách track_id đã vi phạm
-        self.tracker = SimpleTracker(dist_thresh=80, max_lost=10)
-        self.violated_track_ids = set()
-
-        # 🔥 ĐỌC TOÀN BỘ track_id ĐÃ CÓ TRONG status.csv, LOẠI TRÙNG THEO LỊCH SỬ
-        self._load_violated_track_ids_from_csv()
+        # tracker_backend: "simple" (tham lam theo khoảng cách), "hungarian" (ghép tối ưu, NumPy)
+        # hoặc "kalman" (hungarian + dự đoán chuyển động, bắt buộc khi bỏ qua frame)
+        if self.detect_every > 1 or adaptive_skip:
+            tracker_backend = "kalman"
+        if tracker_backend == "kalman":
+            # lost tính theo frame (cả frame chỉ dự đoán): giữ track qua 10 lần chạy YOLO như cũ
+            self.tracker = KalmanTracker(dist_thresh=80, max_lost=10 * self.detect_every,
+                                         metric="combined")
+        elif tracker_backend == "hungarian":
+            self.tracker = HungarianTracker(dist_thresh=80, max_lost=10, metric="combined")
+        else:
+            self.tracker = SimpleTracker(dist_thresh=80, max_lost=10)
+        # track_id_start: ID đầu tiên tracker cấp (supervisor chia dải ID riêng cho mỗi camera);
+        # mặc định tiếp sau track_id lớn nhất đã lưu trong dải đầu tiên
+        if track_id_start is None:
+            track_id_start = self.store.next_track_id(1, TRACK_ID_STRIDE)
+        self.tracker.next_id = int(track_id_start)
+
+        # 🔥 track_id ĐÃ CÓ TRONG KHO VI PHẠM, LOẠI TRÙNG THEO LỊCH SỬ
+        # ID từ track_id_start trở đi là của lần chạy này -> chỉ tra trong bộ nhớ,
+        # vòng lặp frame không đọc lịch sử trong kho
+        self.violated_track_ids = ViolatedTrackIds(self.store, on_error=self.status_signal.emit,
+                                                   new_from=self.tracker.next_id)
 
         # Lưu các vi phạm gần đây (khử trùng theo không gian + thời gian)
-        # mỗi phần tử: {"track_id", "cx", "bottom_y", "bbox", "time"}
-        self.recent_violations = []
+        # lưới băm theo (cx, bottom_y), hết hạn sau dedup_window_sec giây
+        self.recent_violations = RecentViolationIndex(
+            window_sec=dedup_window_sec, cell_size=DEDUP_POS_THRESHOLD
+        )
+
+        # Thống kê thông lượng của lần chạy gần nhất
+        self.frames_processed = 0
+        self.elapsed_sec = 0.0
+        # Độ trễ mỗi frame: từ lúc decode xong đến lúc xử lý xong (ms)
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.last_error = None
+        self._t_start = None
 
     # ---------- Khởi tạo id ban đầu ----------
-    def _init_violation_counter_from_csv(self):
-        """Lấy id cuối cùng trong report.csv để tiếp tục đếm, tránh trùng id."""
+    def _init_violation_counter(self):
+        """Lấy id cuối cùng trong kho vi phạm để tiếp tục đếm, tránh trùng id."""
         try:
-            if os.path.exists(REPORT_CSV):
-                with open(REPORT_CSV, newline='', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    rows = list(reader)
-                    if len(rows) > 1:
-                        last = rows[-1][0]
-                        try:
-                            self.violation_counter = int(last)
-                        except Exception:
-                            self.violation_counter = 0
+            self.violation_counter = self.store.last_violation_id()
         except Exception:
             self.violation_counter = 0
-
-    def _load_violated_track_ids_from_csv(self):
-        """
-        Đọc status.csv và lấy toàn bộ track_id đã vi phạm trước đây.
-        Dùng để loại toàn bộ track_id đã được lưu, tránh lưu trùng khi chạy lại chương trình.
-        """
-        try:
-            if os.path.exists(STATUS_CSV):
-                with open(STATUS_CSV, newline='', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    # Bỏ header
-                    next(reader, None)
-                    for row in reader:
-                        if not row:
-                            continue
-                        try:
-                            tid = int(row[0])
-                            self.violated_track_ids.add(tid)
-                        except Exception:
-                            continue
-        except Exception as e:
-            # Không dừng chương trình, chỉ báo lỗi
-            self.status_signal.emit(f"Lỗi đọc status.csv: {e}")
+        # Khối id đã xin từ kho: [_id_next, _id_end)
+        self._id_next = self._id_end = 0
+
+    def _next_violation_id(self):
+        """Cấp id cho vi phạm mới (xin theo khối để nhiều worker dùng chung kho không trùng id)."""
+        if self._id_next >= self._id_end:
+            n = self.store.id_block_size
+            self._id_next = self.store.allocate_violation_ids(n)
+            self._id_end = self._id_next + n
+        vid = self._id_next
+        self._id_next += 1
+        self.violation_counter = vid
+        return vid
 
     def stop(self):
         self._running = False
 
     # ---------- Khử trùng vi phạm ----------
-    def _cleanup_recent_violations(self, max_age_sec=5.0):
-        """Xóa các entry vi phạm quá cũ (mặc định > 5 giây)."""
-        now = datetime.datetime.now()
-        self.recent_violations = [
-            v for v in self.recent_violations
-            if (now - v["time"]).total_seconds() < max_age_sec
-        ]
-
-    @staticmethod
-    def _bbox_iou(b1, b2):
-        """Tính IoU giữa 2 bbox (x1,y1,x2,y2)."""
-        x1 = max(b1[0], b2[0])
-        y1 = max(b1[1], b2[1])
-        x2 = min(b1[2], b2[2])
-        y2 = min(b1[3], b2[3])
-
-        inter_w = max(0, x2 - x1)
-        inter_h = max(0, y2 - y1)
-        inter = inter_w * inter_h
-        if inter == 0:
-            return 0.0
-
-        area1 = (b1[2] - b1[0]) * (b1[3] - b1[1])
-        area2 = (b2[2] - b2[0]) * (b2[3] - b2[1])
-        union = max(1e-6, area1 + area2 - inter)
-        return inter / union
-
     def _recently_captured(self, cx, bottom_y, bbox,
-                           pos_threshold=80, iou_threshold=0.3):
+                           pos_threshold=DEDUP_POS_THRESHOLD, iou_threshold=0.3):
         """
         Kiểm tra xem vi phạm này có trùng với 1 vi phạm đã lưu gần đây không.
         - Gần về tâm (cx, bottom_y)
         - IoU bbox đủ lớn
+        (vi phạm quá cũ tự hết hạn trong lúc tra, không cần dọn mỗi frame)
         """
-        for v in self.recent_violations:
-            if abs(cx - v["cx"]) < pos_threshold and abs(bottom_y - v["bottom_y"]) < pos_threshold:
-                iou = self._bbox_iou(bbox, v["bbox"])
-                if iou > iou_threshold:
-                    return True
-        return False
+        return self.recent_violations.near(
+            cx, bottom_y, bbox, pos_threshold=pos_threshold, iou_threshold=iou_threshold
+        )
 
     def _add_recent_violation(self, track_id, cx, bottom_y, bbox):
-        self.recent_violations.append({
-            "track_id": track_id,
-            "cx": cx,
-            "bottom_y": bottom_y,
-            "bbox": bbox,
-            "time": datetime.datetime.now(),
-        })
+        self.recent_violations.add(track_id, cx, bottom_y, bbox)
 
     # ---------- Lưu vi phạm ----------
     def save_violation(self, crop_img, bbox, cx, bottom_y,
@@ -372,51 +442,48 @@ class DetectWorker(QThread):
         if track_id in self.violated_track_ids:
             return
 
-        self.violation_counter += 1
-        vid = self.violation_counter
+        self._write_violation(crop_img, bbox, cx, bottom_y,
+                              lane, light_right, light_left, track_id)
+
+    def _write_violation(self, crop_img, bbox, cx, bottom_y,
+                         lane, light_right, light_left, track_id):
+        """Ghi ảnh + 2 file CSV cho 1 vi phạm (không kiểm tra trùng track_id)."""
+        vid = self._next_violation_id()
         now = datetime.datetime.now()
         timestamp_str = now.strftime("%Y%m%d_%H%M%S")
         filename = f"violation_{timestamp_str}_{vid}.jpg"
         path = os.path.join(VIOLATION_DIR, filename)
 
-        # Lưu ảnh
-        try:
-            if crop_img is None or crop_img.size == 0:
-                img_path = ""
-            else:
-                cv2.imwrite(path, crop_img)
-                img_path = path
-        except Exception:
-            img_path = ""
+        img_path = "" if crop_img is None or crop_img.size == 0 else path
+        report_row = [
+            vid,
+            now.isoformat(),
+            img_path,
+            bbox[0], bbox[1], bbox[2], bbox[3],
+            cx, bottom_y,
+            lane, light_right, light_left,
+            track_id
+        ]
+        # Bảng tóm tắt status (CỘT ĐẦU = TRACK_ID)
+        status_row = [track_id, now.strftime("%d/%m/%Y"), "Vượt đèn đỏ", "Chờ xử lý"]
 
-        # Ghi chi tiết vào REPORT_CSV (kèm track_id)
-        try:
-            with open(REPORT_CSV, mode="a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    vid,
-                    now.isoformat(),
-                    img_path,
-                    bbox[0], bbox[1], bbox[2], bbox[3],
-                    cx, bottom_y,
-                    lane, light_right, light_left,
-                    track_id
-                ])
-        except Exception as e:
-            self.status_signal.emit(f"Lỗi ghi báo cáo: {e}")
+        if self.writer is not None:
+            # Ghi nền: luồng xử lý frame không chờ đĩa
+            self.writer.submit(crop_img, img_path, report_row, status_row)
+        else:
+            # Lưu ảnh
+            try:
+                if img_path:
+                    cv2.imwrite(path, crop_img)
+            except Exception:
+                img_path = ""
+                report_row[2] = ""
 
-        # Ghi bảng tóm tắt vào STATUS_CSV (CỘT ĐẦU = TRACK_ID)
-        try:
-            ngay_vi_pham = now.strftime("%d/%m/%Y")
-            loai_vi_pham = "Vượt đèn đỏ"
-            tinh_trang = "Chờ xử lý"
-            with open(STATUS_CSV, mode="a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    track_id, ngay_vi_pham, loai_vi_pham, tinh_trang
-                ])
-        except Exception as e:
-            self.status_signal.emit(f"Lỗi ghi status: {e}")
+            # Ghi chi tiết (kèm track_id) + bảng tóm tắt vào kho vi phạm
+            try:
+                self.store.add_violations([report_row], [status_row])
+            except Exception as e:
+                self.status_signal.emit(f"Lỗi ghi báo cáo: {e}")
 
         # Sau khi lưu thì chắc chắn track_id này đã vi phạm -> thêm vào set
         self.violated_track_ids.add(track_id)
@@ -436,276 +503,559 @@ class DetectWorker(QThread):
         }
         self.new_violation_signal.emit(violation_info)
 
-    # ---------- Luồng chính ----------
-    def run(self):
-        # Tải model YOLO
+    # ---------- Các bước xử lý 1 frame ----------
+    def _load_model(self):
+        """Tải model YOLO, trả về False nếu lỗi."""
+        if self.inference_service is not None:
+            return True
         try:
             self.status_signal.emit("Đang tải model YOLO...")
-            self.model = YOLO(self.model_path)
+            # Lấy từ kho model dùng chung: mở lại chức năng không phải nạp lại từ đĩa
+            self.model = registry.acquire(yolo_key(self.model_path))
             self.status_signal.emit("Model YOLO sẵn sàng.")
+            return True
         except Exception as e:
             self.status_signal.emit(f"Lỗi tải model: {e}")
-            self.finished_signal.emit()
-            return
+            return False
 
-        # Mở nguồn video/camera
+    def _open_capture(self):
+        """
+        Mở nguồn video/camera (frame trả về đã ở TARGET_W x TARGET_H), trả về None nếu không mở được.
+        Chế độ tuần tự: giải mã trước trên luồng nền; chế độ pipeline đã có stage decode riêng.
+        """
         if isinstance(self.source, str) and os.path.exists(self.source):
-            cap = cv2.VideoCapture(self.source)
+            src = self.source
         else:
             try:
-                idx = int(self.source)
+                src = int(self.source)
             except Exception:
-                idx = 0
-            cap = cv2.VideoCapture(idx)
+                src = 0
+        cap = open_video_source(
+            src, size=(TARGET_W, TARGET_H), backend=self.decode_backend,
+            frame_stride=self.frame_stride, prefetch=0 if self.pipelined else 2,
+        )
 
         if not cap.isOpened():
             self.status_signal.emit("❌ Không thể mở nguồn video/camera.")
-            self.finished_signal.emit()
-            return
+            return None
+        return cap
+
+    def _read_lights(self, frame):
+        """Lấy ROI đèn và nhận diện màu đèn trái/phải."""
+        fh, fw = frame.shape[:2]
+        roi_l_coords = clamp_roi(*ROI_LIGHT_LEFT, fw, fh)
+        roi_r_coords = clamp_roi(*ROI_LIGHT_RIGHT, fw, fh)
+        roi_l = frame[roi_l_coords[1]:roi_l_coords[3], roi_l_coords[0]:roi_l_coords[2]] if roi_l_coords else None
+        roi_r = frame[roi_r_coords[1]:roi_r_coords[3], roi_r_coords[0]:roi_r_coords[2]] if roi_r_coords else None
+
+        light_left = detect_left_light(roi_l)
+        light_right = detect_light_color(roi_r)
+        return light_left, light_right, roi_l_coords, roi_r_coords
+
+    def _draw_scene(self, frame, light_left, light_right, roi_l_coords, roi_r_coords):
+        """Vẽ ROI đèn và các vạch lên frame (chỉ dùng khi có cửa sổ hiển thị)."""
+        # Vẽ ROI & text đèn trái
+        if roi_l_coords:
+            x1_l, y1_l, x2_l, y2_l = roi_l_coords
+            cv2.rectangle(
+                frame, (x1_l, y1_l), (x2_l, y2_l),
+                COLOR_MAP.get(light_left, (255, 255, 255)), 2
+            )
+            cv2.putText(
+                frame, f"LEFT: {light_left}",
+                (x1_l, y1_l - 8),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                COLOR_MAP.get(light_left), 2
+            )
 
-        self._running = True
-        screen_w, screen_h = get_screen_size()
+        # Vẽ ROI & text đèn phải
+        if roi_r_coords:
+            x1_r, y1_r, x2_r, y2_r = roi_r_coords
+            cv2.rectangle(
+                frame, (x1_r, y1_r), (x2_r, y2_r),
+                COLOR_MAP.get(light_right, (255, 255, 255)), 2
+            )
+            cv2.putText(
+                frame, f"RIGHT: {light_right}",
+                (max(0, x1_r - 50), y1_r - 8),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                COLOR_MAP.get(light_right), 2
+            )
 
-        try:
-            while self._running:
-                ret, frame = cap.read()
-                if not ret:
-                    break
+        # Vẽ vạch dừng theo trạng thái đèn phải
+        color_vach = COLOR_MAP.get(light_right, COLOR_MAP["UNKNOWN"])
+        cv2.line(
+            frame, (STOP_LINE_X1, LINE_Y), (STOP_LINE_X2, LINE_Y),
+            color_vach, LINE_THICKNESS
+        )
+        cv2.line(
+            frame, (STOP_LINE_X2 + 1, LINE_Y), (STOP_LINE_X3, LINE_Y),
+            color_vach, LINE_THICKNESS
+        )
 
-                frame = cv2.resize(frame, (TARGET_W, TARGET_H))
-                fh, fw = frame.shape[:2]
+        # Vạch 3 (trái)
+        color_v3 = COLOR_MAP.get(light_left, COLOR_MAP["UNKNOWN"])
+        cv2.line(
+            frame, (LINE3_X1, LINE3_Y1), (LINE3_X2, LINE3_Y2),
+            color_v3, 3
+        )
+        cv2.putText(
+            frame, "Vach 3",
+            (LINE3_X1 + 5, LINE3_Y1 - 5),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_v3, 2
+        )
 
-                # Dọn vi phạm cũ trong bộ nhớ (khử trùng theo thời gian)
-                self._cleanup_recent_violations()
+        # Vạch S4 (phải)
+        color_s4 = COLOR_MAP.get(light_right, COLOR_MAP["UNKNOWN"])
+        cv2.line(
+            frame, (LINE_S4_X1, LINE_S4_Y1), (LINE_S4_X2, LINE_S4_Y2),
+            color_s4, 3
+        )
+        cv2.putText(
+            frame, "Vach S4",
+            (LINE_S4_X1 - 80, LINE_S4_Y1 + 15),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_s4, 2
+        )
 
-                # Lấy ROI đèn
-                roi_l_coords = clamp_roi(*ROI_LIGHT_LEFT, fw, fh)
-                roi_r_coords = clamp_roi(*ROI_LIGHT_RIGHT, fw, fh)
-                roi_l = frame[roi_l_coords[1]:roi_l_coords[3], roi_l_coords[0]:roi_l_coords[2]] if roi_l_coords else None
-                roi_r = frame[roi_r_coords[1]:roi_r_coords[3], roi_r_coords[0]:roi_r_coords[2]] if roi_r_coords else None
+        # Vạch S5 (màu vàng, ngang từ (195,235) đến (1021,235))
+        cv2.line(
+            frame, (LINE_S5_X1, LINE_S5_Y), (LINE_S5_X2, LINE_S5_Y),
+            (0, 255, 255), 3  # Yellow
+        )
+        cv2.putText(
+            frame, "Vach S5",
+            (LINE_S5_X1, LINE_S5_Y - 10),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2
+        )
 
-                # Nhận diện màu đèn
-                light_left = detect_left_light(roi_l)          
-                light_right = detect_light_color(roi_r)        
+    def _model_input(self, frame):
+        """Ảnh đưa vào YOLO (cắt theo ROI suy luận nếu bật) và độ lệch (ox, oy) so với frame."""
+        if self.infer_roi is None:
+            return frame, (0, 0)
+        x1, y1, x2, y2 = self.infer_roi
+        return frame[y1:y2, x1:x2], (x1, y1)
 
-                # Vẽ ROI & text đèn trái
-                if roi_l_coords:
-                    x1_l, y1_l, x2_l, y2_l = roi_l_coords
-                    cv2.rectangle(
-                        frame, (x1_l, y1_l), (x2_l, y2_l),
-                        COLOR_MAP.get(light_left, (255, 255, 255)), 2
-                    )
-                    cv2.putText(
-                        frame, f"LEFT: {light_left}",
-                        (x1_l, y1_l - 8),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                        COLOR_MAP.get(light_left), 2
-                    )
+    def _submit_inference(self, frame):
+        """Gửi frame cho BatchInferenceService, trả về Future (không chờ)."""
+        img, _ = self._model_input(frame)
+        return self.inference_service.submit(img, stream_id=id(self))
 
-                # Vẽ ROI & text đèn phải
-                if roi_r_coords:
-                    x1_r, y1_r, x2_r, y2_r = roi_r_coords
-                    cv2.rectangle(
-                        frame, (x1_r, y1_r), (x2_r, y2_r),
-                        COLOR_MAP.get(light_right, (255, 255, 255)), 2
-                    )
-                    cv2.putText(
-                        frame, f"RIGHT: {light_right}",
-                        (max(0, x1_r - 50), y1_r - 8),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                        COLOR_MAP.get(light_right), 2
-                    )
+    def _detect_vehicles(self, frame, future=None):
+        """
+        Chạy YOLO và trả về list detection {'bbox', 'cx', 'bottom_y'} cho tracker.
+        future: kết quả đã gửi trước cho BatchInferenceService (nếu có).
+        """
+        img, offset = self._model_input(frame)
+        try:
+            if future is None and self.inference_service is not None:
+                future = self._submit_inference(frame)
+            if future is not None:
+                results = [future.result()]
+            elif self.infer_imgsz is not None:
+                results = self.model(img, verbose=False, imgsz=self.infer_imgsz)
+            else:
+                results = self.model(img, verbose=False)
+        except Exception as e:
+            self.status_signal.emit(f"Lỗi model trên frame: {e}")
+            results = None
 
-                # Vẽ vạch dừng theo trạng thái đèn phải
-                color_vach = COLOR_MAP.get(light_right, COLOR_MAP["UNKNOWN"])
-                cv2.line(
-                    frame, (STOP_LINE_X1, LINE_Y), (STOP_LINE_X2, LINE_Y),
-                    color_vach, LINE_THICKNESS
-                )
-                cv2.line(
-                    frame, (STOP_LINE_X2 + 1, LINE_Y), (STOP_LINE_X3, LINE_Y),
-                    color_vach, LINE_THICKNESS
-                )
+        return self._boxes_to_detections(results, offset)
 
-                # Vạch 3 (trái)
-                color_v3 = COLOR_MAP.get(light_left, COLOR_MAP["UNKNOWN"])
-                cv2.line(
-                    frame, (LINE3_X1, LINE3_Y1), (LINE3_X2, LINE3_Y2),
-                    color_v3, 3
-                )
-                cv2.putText(
-                    frame, "Vach 3",
-                    (LINE3_X1 + 5, LINE3_Y1 - 5),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_v3, 2
-                )
+    def _boxes_to_detections(self, results, offset=(0, 0)):
+        """
+        Lọc các box là xe trong results[0].boxes và chuyển sang dạng detection.
+        offset: (ox, oy) cộng vào tọa độ box khi YOLO chạy trên ROI cắt từ frame.
+        """
+        ox, oy = offset
+        detections = []
+        if results is not None:
+            for box in results[0].boxes:
+                try:
+                    cls = int(box.cls)
+                except Exception:
+                    continue
+                if cls not in VEHICLE_CLASSES:
+                    continue
+
+                x1_obj, y1_obj, x2_obj, y2_obj = map(int, box.xyxy[0].tolist())
+                x1_obj, x2_obj = x1_obj + ox, x2_obj + ox
+                y1_obj, y2_obj = y1_obj + oy, y2_obj + oy
+                bottom_y = y2_obj
+                cx = (x1_obj + x2_obj) // 2
+
+                detections.append({
+                    "bbox": (x1_obj, y1_obj, x2_obj, y2_obj),
+                    "cx": cx,
+                    "bottom_y": bottom_y,
+                })
+        return detections
 
-                # Vạch S4 (phải)
-                color_s4 = COLOR_MAP.get(light_right, COLOR_MAP["UNKNOWN"])
-                cv2.line(
-                    frame, (LINE_S4_X1, LINE_S4_Y1), (LINE_S4_X2, LINE_S4_Y2),
-                    color_s4, 3
+    def _handle_tracks(self, frame, tracks, light_left, light_right, pending=None):
+        """
+        Kiểm tra điều kiện vi phạm cho từng track, vẽ bbox (nếu có hiển thị) và lưu vi phạm.
+        pending: nếu là list thì không ghi đĩa ngay mà đưa tham số lưu vào list
+        (chế độ pipeline: stage sink sẽ ghi).
+        """
+        fh, fw = frame.shape[:2]
+        for tr in tracks:
+            track_id = tr["id"]
+            x1_obj, y1_obj, x2_obj, y2_obj = tr["bbox"]
+            cx = tr["cx"]
+            bottom_y = tr["bottom_y"]
+            bbox = (x1_obj, y1_obj, x2_obj, y2_obj)
+
+            # Nếu xe này đã từng vi phạm (theo file hoặc trong phiên) -> bỏ qua
+            if track_id in self.violated_track_ids:
+                continue
+
+            is_violating = False
+            label_text = f"ID {track_id}"
+            color_box = (0, 255, 0)
+            lane = "unknown"
+
+            # Điều kiện vi phạm:
+            # - Đèn phải bên phải RED
+            # - Xe thuộc lane 2 (giữa STOP_LINE_X2 và STOP_LINE_X3)
+            # - y đáy bbox > y S5 và < LINE_Y (vạch dừng)
+            if (
+                light_right == "RED"
+                and (STOP_LINE_X2 < cx <= STOP_LINE_X3)
+                and (LINE_S5_Y < bottom_y < LINE_Y)
+            ):
+                # Kiểm tra có trùng với vi phạm gần đây không
+                if self._recently_captured(cx, bottom_y, bbox):
+                    # Đưa track_id vào set, coi như đã xử lý
+                    self.violated_track_ids.add(track_id)
+                    continue
+                else:
+                    is_violating = True
+                    lane = "lane_2"
+                    label_text = f"VI PHAM ID {track_id}"
+                    color_box = (0, 0, 255)
+
+            # Vẽ bbox + label
+            if not self.headless:
+                cv2.rectangle(
+                    frame, (x1_obj, y1_obj), (x2_obj, y2_obj),
+                    color_box, 2
                 )
                 cv2.putText(
-                    frame, "Vach S4",
-                    (LINE_S4_X1 - 80, LINE_S4_Y1 + 15),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color_s4, 2
+                    frame, label_text,
+                    (x1_obj, max(0, y1_obj - 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color_box, 2
                 )
 
-                # Vạch S5 (màu vàng, ngang từ (195,235) đến (1021,235))
-                cv2.line(
-                    frame, (LINE_S5_X1, LINE_S5_Y), (LINE_S5_X2, LINE_S5_Y),
-                    (0, 255, 255), 3  # Yellow
-                )
-                cv2.putText(
-                    frame, "Vach S5",
-                    (LINE_S5_X1, LINE_S5_Y - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2
-                )
+            # Nếu vi phạm mới -> lưu
+            if is_violating:
+                self._add_recent_violation(track_id, cx, bottom_y, bbox)
+
+                pad_x = int((x2_obj - x1_obj) * 0.1)
+                pad_y = int((y2_obj - y1_obj) * 0.1)
+                cx1 = max(0, x1_obj - pad_x)
+                cy1 = max(0, y1_obj - pad_y)
+                cx2 = min(fw, x2_obj + pad_x)
+                cy2 = min(fh, y2_obj + pad_y)
+                if cy2 > cy1 and cx2 > cx1:
+                    crop = frame[cy1:cy2, cx1:cx2].copy()
+                else:
+                    crop = frame[y1_obj:y2_obj, x1_obj:x2_obj].copy()
+
+                if pending is not None:
+                    # Đánh dấu ngay để frame sau không lưu trùng khi sink chưa kịp ghi
+                    self.violated_track_ids.add(track_id)
+                    pending.append({
+                        "crop_img": crop,
+                        "bbox": bbox,
+                        "cx": cx,
+                        "bottom_y": bottom_y,
+                        "lane": lane,
+                        "light_right": light_right,
+                        "light_left": light_left,
+                        "track_id": track_id,
+                    })
+                    continue
 
-                # Chạy YOLO
                 try:
-                    results = self.model(frame, verbose=False)
-                except Exception as e:
-                    self.status_signal.emit(f"Lỗi model trên frame: {e}")
-                    results = None
-
-                # Thu thập detection cho tracker
-                detections = []
-                if results is not None:
-                    for box in results[0].boxes:
-                        try:
-                            cls = int(box.cls)
-                        except Exception:
-                            continue
-                        if cls not in VEHICLE_CLASSES:
-                            continue
-
-                        x1_obj, y1_obj, x2_obj, y2_obj = map(int, box.xyxy[0].tolist())
-                        bottom_y = y2_obj
-                        cx = (x1_obj + x2_obj) // 2
-
-                        detections.append({
-                            "bbox": (x1_obj, y1_obj, x2_obj, y2_obj),
-                            "cx": cx,
-                            "bottom_y": bottom_y,
-                        })
-
-                # Tracking: gán ID cho mỗi xe
-                tracks = self.tracker.update(detections)
-
-                # Xử lý từng track
-                for tr in tracks:
-                    track_id = tr["id"]
-                    x1_obj, y1_obj, x2_obj, y2_obj = tr["bbox"]
-                    cx = tr["cx"]
-                    bottom_y = tr["bottom_y"]
-                    bbox = (x1_obj, y1_obj, x2_obj, y2_obj)
-
-                    # Nếu xe này đã từng vi phạm (theo file hoặc trong phiên) -> bỏ qua
-                    if track_id in self.violated_track_ids:
-                        continue
-
-                    is_violating = False
-                    label_text = f"ID {track_id}"
-                    color_box = (0, 255, 0)
-                    lane = "unknown"
-
-                    # Điều kiện vi phạm:
-                    # - Đèn phải bên phải RED
-                    # - Xe thuộc lane 2 (giữa STOP_LINE_X2 và STOP_LINE_X3)
-                    # - y đáy bbox > y S5 và < LINE_Y (vạch dừng)
-                    if (
-                        light_right == "RED"
-                        and (STOP_LINE_X2 < cx <= STOP_LINE_X3)
-                        and (LINE_S5_Y < bottom_y < LINE_Y)
-                    ):
-                        # Kiểm tra có trùng với vi phạm gần đây không
-                        if self._recently_captured(cx, bottom_y, bbox):
-                            # Đưa track_id vào set, coi như đã xử lý
-                            self.violated_track_ids.add(track_id)
-                            continue
-                        else:
-                            is_violating = True
-                            lane = "lane_2"
-                            label_text = f"VI PHAM ID {track_id}"
-                            color_box = (0, 0, 255)
-
-                    # Vẽ bbox + label
-                    cv2.rectangle(
-                        frame, (x1_obj, y1_obj), (x2_obj, y2_obj),
-                        color_box, 2
+                    self.save_violation(
+                        crop_img=crop,
+                        bbox=bbox,
+                        cx=cx,
+                        bottom_y=bottom_y,
+                        lane=lane,
+                        light_right=light_right,
+                        light_left=light_left,
+                        track_id=track_id
                     )
-                    cv2.putText(
-                        frame, label_text,
-                        (x1_obj, max(0, y1_obj - 12)),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color_box, 2
+                    self.status_signal.emit(
+                        f"Phát hiện vi phạm mới: violation_id {self.violation_counter} (track_id {track_id})"
                     )
+                except Exception as e:
+                    self.status_signal.emit(f"Lỗi lưu vi phạm: {e}")
 
-                    # Nếu vi phạm mới -> lưu
-                    if is_violating:
-                        self._add_recent_violation(track_id, cx, bottom_y, bbox)
-
-                        pad_x = int((x2_obj - x1_obj) * 0.1)
-                        pad_y = int((y2_obj - y1_obj) * 0.1)
-                        cx1 = max(0, x1_obj - pad_x)
-                        cy1 = max(0, y1_obj - pad_y)
-                        cx2 = min(fw, x2_obj + pad_x)
-                        cy2 = min(fh, y2_obj + pad_y)
-                        if cy2 > cy1 and cx2 > cx1:
-                            crop = frame[cy1:cy2, cx1:cx2].copy()
-                        else:
-                            crop = frame[y1_obj:y2_obj, x1_obj:x2_obj].copy()
-
-                        try:
-                            self.save_violation(
-                                crop_img=crop,
-                                bbox=bbox,
-                                cx=cx,
-                                bottom_y=bottom_y,
-                                lane=lane,
-                                light_right=light_right,
-                                light_left=light_left,
-                                track_id=track_id
-                            )
-                            self.status_signal.emit(
-                                f"Phát hiện vi phạm mới: violation_id {self.violation_counter} (track_id {track_id})"
-                            )
-                        except Exception as e:
-                            self.status_signal.emit(f"Lỗi lưu vi phạm: {e}")
-
-                # Cập nhật status
-                status_text = (
-                    f"Đèn Trái: {light_left} | Đèn Phải: {light_right} | "
-                    f"Số lần lưu vi phạm: {self.violation_counter}"
-                )
-                self.status_signal.emit(status_text)
-
-                # Hiển thị khung OpenCV
-                cv2.imshow("Red Light Detection", frame)
-                win_w, win_h = frame.shape[1], frame.shape[0]
-                if win_w > screen_w or win_h > screen_h:
-                    scale = min(screen_w / win_w, screen_h / win_h) * 0.7
-                    try:
-                        cv2.resizeWindow(
-                            "Red Light Detection",
-                            int(win_w * scale), int(win_h * scale)
-                        )
-                    except Exception:
-                        pass
-
-                # Nhấn 'q' để dừng
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    self._running = False
+    def process_frame(self, frame):
+        """
+        Xử lý 1 frame đã resize về TARGET_W x TARGET_H:
+        đèn -> YOLO -> tracker -> kiểm tra vi phạm.
+        Ở chế độ headless không vẽ gì lên frame.
+        return: (light_left, light_right)
+        """
+        light_left, light_right, roi_l_coords, roi_r_coords = self._read_lights(frame)
+        if not self.headless:
+            self._draw_scene(frame, light_left, light_right, roi_l_coords, roi_r_coords)
+
+        # Tracking: gán ID cho mỗi xe (frame bỏ qua YOLO -> dùng vị trí dự đoán)
+        if not self._gate_allows(light_right):
+            # Đèn xanh: không chạy YOLO, chỉ làm "già" các track để chúng hết hạn dần
+            tracks = self.tracker.update([])
+        elif self._should_detect():
+            tracks = self.tracker.update(self._detect_vehicles(frame))
+        else:
+            tracks = self.tracker.predict()
+        self._update_motion_hint(tracks, light_right)
+        self._handle_tracks(frame, tracks, light_left, light_right)
+        return light_left, light_right
+
+    # ---------- Bỏ qua YOLO theo chu kỳ / chuyển động / đèn ----------
+    def _gate_allows(self, light_right):
+        """violation_only: frame này có cần nhận diện xe không (theo đèn phải)."""
+        if self.light_gate is None:
+            return True
+        return self.light_gate.observe(light_right)
+
+    def _should_detect(self):
+        """Frame hiện tại có cần chạy YOLO không (detect_every + gợi ý chuyển động)."""
+        if (self.detect_every <= 1 or self._dense_needed.is_set()
+                or self._frames_since_detect + 1 >= self.detect_every):
+            self._frames_since_detect = 0
+            self.yolo_frames += 1
+            return True
+        self._frames_since_detect += 1
+        return False
+
+    def _update_motion_hint(self, tracks, light_right):
+        """
+        adaptive_skip: cần chạy YOLO mọi frame nếu
+        - đèn đỏ và có xe trong/gần vùng kiểm tra vượt vạch, hoặc
+        - xe di chuyển nhanh tới mức dự đoán qua detect_every frame dễ ghép sai.
+        """
+        if not self.adaptive_skip:
+            return
+        dense = False
+        if light_right == "RED":
+            for tr in tracks:
+                if (STOP_LINE_X2 < tr["cx"] <= STOP_LINE_X3
+                        and LINE_S5_Y < tr["bottom_y"] < LINE_Y + ADAPTIVE_ZONE_MARGIN):
+                    dense = True
                     break
+        if not dense and hasattr(self.tracker, "max_speed"):
+            dense = self.tracker.max_speed() * self.detect_every > self.tracker.dist_thresh * 0.5
+        if dense:
+            self._dense_needed.set()
+        else:
+            self._dense_needed.clear()
+
+    def _run_sequential(self, cap, screen_w, screen_h):
+        """Đọc và xử lý lần lượt từng frame trên luồng hiện tại."""
+        while self._running:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            t_decoded = time.perf_counter()
+            light_left, light_right = self.process_frame(frame)
+            self._record_latency(t_decoded)
+
+            if self.headless:
+                continue
+
+            # Cập nhật status
+            self._emit_frame_status(light_left, light_right)
+
+            # Hiển thị khung OpenCV
+            if not self._show_frame(frame, screen_w, screen_h):
+                self._running = False
+                break
+
+    def _record_latency(self, t_decoded):
+        latency_ms = (time.perf_counter() - t_decoded) * 1000.0
+        self.latency_ms_total += latency_ms
+        if latency_ms > self.latency_ms_max:
+            self.latency_ms_max = latency_ms
+        self.frames_processed += 1
+
+    def throughput_stats(self):
+        """Thống kê hiện tại (đọc được từ luồng khác trong lúc đang chạy)."""
+        frames = self.frames_processed
+        if self._running and self._t_start is not None:
+            elapsed = time.perf_counter() - self._t_start
+        else:
+            elapsed = self.elapsed_sec
+        return {
+            "frames": frames,
+            "fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+            "avg_latency_ms": round(self.latency_ms_total / frames, 2) if frames else 0.0,
+            "max_latency_ms": round(self.latency_ms_max, 2),
+        }
 
+    # ---------- Chế độ pipeline ----------
+    def _emit_frame_status(self, light_left, light_right):
+        status_text = (
+            f"Đèn Trái: {light_left} | Đèn Phải: {light_right} | "
+            f"Số lần lưu vi phạm: {self.violation_counter}"
+        )
+        self.status_signal.emit(status_text)
+
+    def _run_pipelined(self, cap, screen_w, screen_h):
+        """
+        Chạy theo pipeline 4 stage với hàng đợi giới hạn:
+        decode/resize -> YOLO (+ đèn) -> tracker/vi phạm -> sink (hiển thị, ghi đĩa).
+        """
+        drop_policy = self.drop_policy
+        if drop_policy is None:
+            is_file = isinstance(self.source, str) and os.path.exists(self.source)
+            drop_policy = DROP_BLOCK if is_file else DROP_OLDEST
+
+        def decode():
+            if not self._running:
+                return None
+            ret, frame = cap.read()
+            if not ret:
+                return None
+            return {"frame": frame, "t_decoded": time.perf_counter()}
+
+        def infer(item):
+            frame = item["frame"]
+            item["lights"] = self._read_lights(frame)
+            if not self._gate_allows(item["lights"][1]):
+                item["detections"] = []
+            elif not self._should_detect():
+                item["detections"] = None
+            elif self.inference_service is not None:
+                # Chỉ gửi frame, không chờ: nhiều frame cùng lúc trong hàng đợi -> gom được lô
+                item["future"] = self._submit_inference(frame)
+            else:
+                item["detections"] = self._detect_vehicles(frame)
+            return item
+
+        def track(item):
+            frame = item["frame"]
+            if "future" in item:
+                item["detections"] = self._detect_vehicles(frame, future=item.pop("future"))
+            light_left, light_right, roi_l_coords, roi_r_coords = item["lights"]
+            if not self.headless:
+                self._draw_scene(frame, light_left, light_right, roi_l_coords, roi_r_coords)
+            if item["detections"] is None:
+                tracks = self.tracker.predict()
+            else:
+                tracks = self.tracker.update(item["detections"])
+            self._update_motion_hint(tracks, light_right)
+            item["violations"] = []
+            self._handle_tracks(frame, tracks, light_left, light_right,
+                                pending=item["violations"])
+            return item
+
+        def sink(item):
+            for v in item["violations"]:
+                try:
+                    self._write_violation(**v)
+                    self.status_signal.emit(
+                        f"Phát hiện vi phạm mới: violation_id {self.violation_counter} (track_id {v['track_id']})"
+                    )
+                except Exception as e:
+                    self.status_signal.emit(f"Lỗi lưu vi phạm: {e}")
+            self._record_latency(item["t_decoded"])
+
+            if self.headless:
+                return self._running
+            light_left, light_right = item["lights"][:2]
+            self._emit_frame_status(light_left, light_right)
+            if not self._show_frame(item["frame"], screen_w, screen_h):
+                self._running = False
+            return self._running
+
+        pipeline = FramePipeline(
+            source=decode,
+            stages=[("infer", infer), ("track", track)],
+            sink=sink,
+            queue_size=self.queue_size,
+            drop_policy=drop_policy,
+            on_error=lambda stage, e: self.status_signal.emit(f"Lỗi stage {stage}: {e}"),
+        )
+        pipeline.run()
+        self.pipeline_stats = pipeline.summary()
+
+    def _show_frame(self, frame, screen_w, screen_h):
+        """Hiển thị frame bằng OpenCV. Trả về False nếu người dùng nhấn 'q'."""
+        cv2.imshow("Red Light Detection", frame)
+        win_w, win_h = frame.shape[1], frame.shape[0]
+        if win_w > screen_w or win_h > screen_h:
+            scale = min(screen_w / win_w, screen_h / win_h) * 0.7
+            try:
+                cv2.resizeWindow(
+                    "Red Light Detection",
+                    int(win_w * scale), int(win_h * scale)
+                )
+            except Exception:
+                pass
+
+        # Nhấn 'q' để dừng
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+    # ---------- Luồng chính ----------
+    def run(self):
+        self.last_error = None
+        # Tải model YOLO
+        if not self._load_model():
+            self.last_error = "Không tải được model YOLO"
+            self.finished_signal.emit()
+            return
+
+        # Mở nguồn video/camera
+        cap = self._open_capture()
+        if cap is None:
+            self.last_error = f"Không mở được nguồn video: {self.source}"
+            self.finished_signal.emit()
+            return
+
+        if self.async_writes:
+            self.writer = AsyncViolationWriter(
+                self.store,
+                on_error=self.status_signal.emit,
+            ).start()
+
+        self._running = True
+        screen_w = screen_h = None
+        if not self.headless:
+            screen_w, screen_h = get_screen_size()
+
+        self.frames_processed = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self._t_start = t_start = time.perf_counter()
+        try:
+            if self.pipelined:
+                self._run_pipelined(cap, screen_w, screen_h)
+            else:
+                self._run_sequential(cap, screen_w, screen_h)
         except Exception as e:
-            self.status_signal.emit(f"Lỗi xử lý video: {e}")
+            self.last_error = f"Lỗi xử lý video: {e}"
+            self.status_signal.emit(self.last_error)
         finally:
+            self._running = False
+            self.elapsed_sec = time.perf_counter() - t_start
             try:
                 cap.release()
             except Exception:
                 pass
-            cv2.destroyAllWindows()
+            if not self.headless:
+                cv2.destroyAllWindows()
+            if self.writer is not None:
+                self.writer.close()
+                self.writer_stats = self.writer.summary()
+                self.writer = None
+            if self.model is not None:
+                registry.release(yolo_key(self.model_path))
+                self.model = None
             self.finished_signal.emit()
 
 
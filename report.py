@@ -1,34 +1,330 @@
 # report_dialog.py
 import os
-import csv
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QLabel, QPushButton, QMessageBox,
-    QTableWidget, QTableWidgetItem, QFileDialog, QHBoxLayout,
-    QScrollArea, QWidget, QDialogButtonBox, QLineEdit
+    QTableView, QAbstractItemView, QFileDialog, QHBoxLayout,
+    QScrollArea, QWidget, QDialogButtonBox, QLineEdit, QComboBox, QProgressDialog
 )
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QThread, QSize, pyqtSignal
+from PyQt6.QtGui import QPixmap, QImage
 import cv2
 
+from violation_store import open_store, to_iso_date, PAGE_SIZE, STATUS_HEADER
+from thumbnail_cache import ensure_thumbnail, clear_thumbnails, LRUCache
+from report_export import (
+    export_violations, available_formats, ExportCancelled,
+    FORMAT_CSV, FORMAT_CSV_GZ, FORMAT_PARQUET,
+)
+
 # ---------------- Config ----------------
 #by Truong Viet Tran , do not reup ,sdt:0877973723
 VIOLATIONS_DIR = Path("violations")
 VIOLATIONS_DIR.mkdir(parents=True, exist_ok=True)
 
-# 2 file CSV giống với code YOLO mới
-# status.csv: track_id, ngay_vi_pham, loai_vi_pham, tinh_trang
-# report.csv: id, timestamp, image_path, ..., light_left, track_id
-STATUS_CSV = VIOLATIONS_DIR / "status.csv"
-REPORT_CSV = VIOLATIONS_DIR / "report.csv"
+# Dữ liệu đọc/ghi qua kho vi phạm (violation_store): SQLite mặc định, hoặc 2 file CSV cũ
+# status: track_id, ngay_vi_pham, loai_vi_pham, tinh_trang
+# report: id, timestamp, image_path, ..., light_left, track_id
+
+
+STATUS_COLUMNS = ["Tracking ID", "Ngày vi phạm", "Loại vi phạm", "Tình trạng"]
+THUMB_COLUMN = len(STATUS_COLUMNS)  # cột ảnh thu nhỏ (sau các cột status)
+ALL_VALUES = "Tất cả"
+
+# Tầng thumbnail (xem thumbnail_cache.THUMB_SIZES) dùng cho bảng / màn hình chi tiết
+TABLE_THUMB = 64
+DETAIL_THUMB = 512
+# Số ảnh giữ trong bộ nhớ, số yêu cầu nạp ảnh tối đa đang chờ
+THUMB_CACHE_ITEMS = 500
+THUMB_MAX_JOBS = 200
+
+
+# ---------------- Nạp ảnh thu nhỏ ở luồng nền ----------------
+class ThumbnailLoader(QThread):
+    """
+    Tra image_path + đọc / tạo thumbnail ngoài luồng GUI.
+    Yêu cầu mới nhất được làm trước (ô vừa cuộn tới hiện ảnh trước),
+    quá THUMB_MAX_JOBS yêu cầu thì bỏ các yêu cầu cũ nhất.
+    """
+    loaded = pyqtSignal(str, int, str, QImage)  # (track_id, tầng, image_path, ảnh; rỗng nếu không có)
+
+    def __init__(self, store, max_jobs=THUMB_MAX_JOBS):
+        super().__init__()
+        self.store = store
+        self.max_jobs = max_jobs
+        self._jobs = deque()
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._running = True
+
+    def request(self, track_id, size, image_path=None):
+        key = (track_id, size)
+        with self._cond:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            self._jobs.append((track_id, size, image_path))
+            while len(self._jobs) > self.max_jobs:
+                old_id, old_size, _ = self._jobs.popleft()
+                self._pending.discard((old_id, old_size))
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def run(self):
+        try:
+            while True:
+                with self._cond:
+                    while self._running and not self._jobs:
+                        self._cond.wait()
+                    if not self._running:
+                        return
+                    track_id, size, image_path = self._jobs.pop()
+                image = QImage()
+                try:
+                    if image_path is None:
+                        image_path = self.store.find_image_path(track_id) if track_id else ""
+                    thumb = ensure_thumbnail(image_path, size) if image_path else None
+                    if thumb:
+                        image = QImage(thumb)
+                except Exception:
+                    image = QImage()
+                finally:
+                    with self._cond:
+                        self._pending.discard((track_id, size))
+                self.loaded.emit(track_id, size, image_path or "", image)
+        finally:
+            if hasattr(self.store, "close"):
+                # Đóng kết nối DB riêng của luồng này
+                self.store.close()
+
+
+# ---------------- Xuất báo cáo ở luồng nền ----------------
+EXPORT_FILE_FILTERS = {
+    FORMAT_CSV: "CSV - mở bằng Excel (*.csv)",
+    FORMAT_CSV_GZ: "CSV nén gzip (*.csv.gz)",
+    FORMAT_PARQUET: "Parquet (*.parquet)",
+}
+
+
+class ExportWorker(QThread):
+    """Xuất báo cáo chi tiết (report_export.export_violations) ngoài luồng GUI, có thể hủy."""
+    progress_signal = pyqtSignal(int, int)   # (số dòng đã ghi, tổng số dòng)
+    finished_signal = pyqtSignal(int, str)   # (số dòng đã ghi, lỗi; "" nếu xong, "cancelled" nếu hủy)
+
+    def __init__(self, store, path, fmt, filters=None):
+        super().__init__()
+        self.store = store
+        self.path = path
+        self.fmt = fmt
+        self.filters = dict(filters or {})
+        self._running = True
+
+    def stop(self):
+        self._running = False
+
+    def run(self):
+        try:
+            n = export_violations(
+                self.store, self.path, fmt=self.fmt, filters=self.filters,
+                progress=self.progress_signal.emit,
+                should_stop=lambda: not self._running,
+            )
+            self.finished_signal.emit(n, "")
+        except ExportCancelled:
+            self.finished_signal.emit(0, "cancelled")
+        except Exception as e:
+            self.finished_signal.emit(0, str(e))
+        finally:
+            if hasattr(self.store, "close"):
+                # Đóng kết nối DB riêng của luồng này
+                self.store.close()
+
+
+# ---------------- Table Model (đọc dần theo trang) ----------------
+class StatusTableModel(QAbstractTableModel):
+    """
+    Model cho bảng status, chỉ giữ các dòng đã đọc:
+    - mở màn hình chỉ đọc trang đầu (page_size dòng), cuộn tới cuối bảng thì
+      QTableView gọi fetchMore() để đọc tiếp trang sau từ kho vi phạm;
+    - thêm / sửa / xóa cập nhật đúng dòng đó trên model, không đọc lại cả bảng;
+    - lọc (filters) và sắp xếp (bấm tiêu đề cột) do kho vi phạm thực hiện,
+      model chỉ nhận về trang dòng khớp.
+    """
+    def __init__(self, store, page_size=PAGE_SIZE, parent=None, thumbnail_provider=None):
+        super().__init__(parent)
+        self.store = store
+        self.page_size = page_size
+        # thumbnail_provider(track_id) -> QPixmap, hoặc None (chưa có: tự yêu cầu nạp ở luồng nền)
+        self.thumbnail_provider = thumbnail_provider
+        self.filters = {}
+        self.order_by = None   # tên cột trong STATUS_HEADER, None = theo thứ tự ghi
+        self.desc = False
+        self._keys = []        # key (trong kho) của từng dòng đã đọc
+        self._rows = []        # [track_id, ngay_vi_pham, loai_vi_pham, tinh_trang]
+        self._pos = {}         # key -> vị trí dòng
+        self._track_keys = {}  # track_id -> {key} (ảnh nạp xong -> tìm dòng không phải duyệt cả bảng)
+        self.total = 0         # tổng số dòng khớp bộ lọc
+        self._cursor = None    # con trỏ phân trang (trang sau)
+        self._exhausted = False
+
+    # ---------- Đọc dữ liệu ----------
+    def reload(self):
+        """Bỏ các dòng đã đọc, đếm lại tổng số dòng và đọc trang đầu (các trang sau đọc khi cuộn tới)."""
+        self.beginResetModel()
+        self._keys, self._rows, self._pos, self._track_keys = [], [], {}, {}
+        self._cursor = None
+        self._exhausted = False
+        self.total = self.store.count_status(self.filters)
+        self.endResetModel()
+        self.fetchMore()
+
+    def set_filters(self, filters):
+        self.filters = dict(filters or {})
+        self.reload()
+
+    @property
+    def is_default_view(self):
+        """Không lọc, không sắp xếp: dòng mới luôn nằm cuối bảng."""
+        return not any(self.filters.values()) and self.order_by is None and not self.desc
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Bấm tiêu đề cột: sắp xếp ở kho vi phạm rồi đọc lại từ trang đầu."""
+        if column == THUMB_COLUMN:
+            return
+        order_by = STATUS_HEADER[column] if 0 <= column < len(STATUS_HEADER) else None
+        desc = order == Qt.SortOrder.DescendingOrder
+        if (order_by, desc) == (self.order_by, self.desc):
+            # vd. setSortingEnabled(True) lúc tạo bảng gọi sort() với thứ tự hiện tại
+            return
+        self.order_by, self.desc = order_by, desc
+        self.reload()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        page, self._cursor = self.store.status_page(
+            cursor=self._cursor, limit=self.page_size,
+            filters=self.filters, order_by=self.order_by, desc=self.desc,
+        )
+        if self._cursor is None:
+            self._exhausted = True
+        if not page:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        for key, row in page:
+            self._pos[key] = len(self._keys)
+            self._keys.append(key)
+            self._rows.append(list(row))
+            self._track_keys.setdefault(row[0], set()).add(key)
+        self.endInsertRows()
+
+    # ---------- QAbstractTableModel ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(STATUS_COLUMNS) + (1 if self.thumbnail_provider is not None else 0)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if index.column() == THUMB_COLUMN:
+            if role == Qt.ItemDataRole.DecorationRole:
+                return self.thumbnail_provider(self._rows[index.row()][0])
+            return None
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self._rows[index.row()][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return STATUS_COLUMNS[section] if section < len(STATUS_COLUMNS) else "Ảnh"
+        return section + 1
+
+    def thumbnail_ready(self, track_id):
+        """Ảnh của track_id đã nạp xong: vẽ lại ô ảnh của các dòng tương ứng."""
+        for key in self._track_keys.get(track_id, ()):
+            idx = self.index(self._pos[key], THUMB_COLUMN)
+            self.dataChanged.emit(idx, idx, [Qt.ItemDataRole.DecorationRole])
+
+    def _unindex_track(self, key, track_id):
+        keys = self._track_keys.get(track_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._track_keys[track_id]
+
+    # ---------- Truy cập / cập nhật từng dòng ----------
+    def row_at(self, row_idx):
+        """(key, [track_id, ngay_vi_pham, loai_vi_pham, tinh_trang]) của dòng row_idx."""
+        if not (0 <= row_idx < len(self._rows)):
+            return None, None
+        return self._keys[row_idx], list(self._rows[row_idx])
+
+    def add_row(self, key, row):
+        """Dòng mới đã ghi vào kho: hiện ngay nếu đã đọc tới cuối, nếu chưa thì để trang sau đọc."""
+        if key is None or not self.is_default_view:
+            # Không biết key / dòng mới có thể không khớp bộ lọc hoặc nằm giữa -> đọc lại
+            self.reload()
+            return
+        self.total += 1
+        if not self._exhausted:
+            return
+        pos = len(self._rows)
+        self.beginInsertRows(QModelIndex(), pos, pos)
+        self._pos[key] = pos
+        self._keys.append(key)
+        self._rows.append(list(row))
+        self._track_keys.setdefault(row[0], set()).add(key)
+        self._cursor = key
+        self.endInsertRows()
+
+    def update_row(self, key, row):
+        pos = self._pos.get(key)
+        if pos is None:
+            return
+        self._unindex_track(key, self._rows[pos][0])
+        self._rows[pos] = list(row)
+        self._track_keys.setdefault(row[0], set()).add(key)
+        self.dataChanged.emit(self.index(pos, 0), self.index(pos, len(STATUS_COLUMNS) - 1))
+
+    def remove_row(self, key):
+        pos = self._pos.get(key)
+        if pos is None:
+            return
+        if not self.store.stable_keys:
+            # key là chỉ số dòng (CSV) -> các dòng sau đổi key, đọc lại
+            self.reload()
+            return
+        self.beginRemoveRows(QModelIndex(), pos, pos)
+        self._unindex_track(key, self._rows[pos][0])
+        del self._keys[pos]
+        del self._rows[pos]
+        self._pos = {k: i for i, k in enumerate(self._keys)}
+        self.total -= 1
+        self.endRemoveRows()
 
 
 # ---------------- Edit Dialog (Thêm/Sửa) ----------------
 class ViolationEditDialog(QDialog):
     """
-    Dialog dùng chung cho THÊM / SỬA 1 dòng trong status.csv
+    Dialog dùng chung cho THÊM / SỬA 1 dòng trong bảng status
     data: dict {"track_id", "ngay_vi_pham", "loai_vi_pham", "tinh_trang"}
     """
     def __init__(self, data: dict, parent=None):
@@ -79,8 +375,12 @@ class ViolationEditDialog(QDialog):
 
 # ---------------- Detail Dialog ----------------
 class ViolationDetailDialog(QDialog):
-    """Hiển thị chi tiết vi phạm + ảnh"""
-    def __init__(self, info: dict, parent=None):
+    """
+    Hiển thị chi tiết vi phạm + ảnh.
+    Có loader (ThumbnailLoader): ảnh (tầng DETAIL_THUMB) lấy từ cache hoặc nạp ở luồng nền,
+    dialog mở ngay không chờ đọc ảnh. Không có loader: đọc ảnh gốc trực tiếp như cũ.
+    """
+    def __init__(self, info: dict, parent=None, loader=None, cache=None):
         super().__init__(parent)
         self.setWindowTitle("Chi tiết vi phạm")
         self.setMinimumSize(600, 500)
@@ -111,8 +411,20 @@ class ViolationDetailDialog(QDialog):
         img_path = info.get('image_path', '')
         img_label = QLabel()
         img_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        if img_path and Path(img_path).exists():
+        self.img_label = img_label
+        self._track_id = str(info.get('track_id', ''))
+        self._loader = loader
+        self._cache = cache
+
+        if loader is not None and img_path:
+            cached = cache.get((self._track_id, DETAIL_THUMB)) if cache is not None else None
+            if cached:
+                self._set_image(cached)
+            else:
+                img_label.setText("Đang tải ảnh...")
+                loader.loaded.connect(self._on_loaded)
+                loader.request(self._track_id, DETAIL_THUMB, img_path)
+        elif img_path and Path(img_path).exists():
             pixmap = QPixmap()
             if pixmap.load(str(img_path)):
                 img_label.setPixmap(
@@ -134,16 +446,51 @@ class ViolationDetailDialog(QDialog):
         buttons.rejected.connect(self.reject)
         container_layout.addWidget(buttons)
 
+    def _set_image(self, pixmap):
+        self.img_label.setPixmap(
+            pixmap.scaled(
+                500,
+                400,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation,
+            )
+        )
+
+    def _on_loaded(self, track_id, size, image_path, image):
+        if track_id != self._track_id or size != DETAIL_THUMB:
+            return
+        if image.isNull():
+            self.img_label.setText("Không thể mở ảnh.")
+            return
+        self._set_image(QPixmap.fromImage(image))
+
+    def done(self, result):
+        if self._loader is not None:
+            try:
+                self._loader.loaded.disconnect(self._on_loaded)
+            except TypeError:
+                pass  # chưa kết nối (ảnh đã có trong cache)
+        super().done(result)
+
 
 # ---------------- Main Report Dialog ----------------
 class ReportDialog(QDialog):
-    """Dialog quản lý báo cáo vi phạm vượt đèn đỏ (đọc từ status.csv + report.csv)"""
-    def __init__(self):
+    """Dialog quản lý báo cáo vi phạm vượt đèn đỏ (đọc từ kho vi phạm: status + report)"""
+    def __init__(self, store=None):
         super().__init__()
         self.setWindowTitle("📊 Báo cáo vi phạm - Vượt đèn đỏ")
         self.setMinimumSize(600, 400)
+        self.store = store
+        self._ensure_store()
+        # Ảnh thu nhỏ: LRU trong bộ nhớ (QPixmap; False = không có ảnh) + nạp ở luồng nền
+        self._thumbs = LRUCache(THUMB_CACHE_ITEMS)
+        self.thumb_loader = ThumbnailLoader(self.store)
+        self.thumb_loader.loaded.connect(self._on_thumbnail_loaded)
+        self.thumb_loader.start()
+        self.export_worker = None
+        self.export_progress = None
+        self.model = StatusTableModel(self.store, parent=self, thumbnail_provider=self._table_thumbnail)
         self._init_ui()
-        self._ensure_csv_files()
         self._load_status_into_table()
 
     # ---------- UI ----------
@@ -157,7 +504,7 @@ class ReportDialog(QDialog):
         # Controls (trên cùng)
         controls = QHBoxLayout()
         self.btn_refresh = QPushButton("🔄 Cập nhật")
-        self.btn_export = QPushButton("💾 Xuất CSV (tóm tắt)")
+        self.btn_export = QPushButton("💾 Xuất báo cáo")
         self.btn_clear_all = QPushButton("🗑️ Xóa toàn bộ")
         controls.addWidget(self.btn_refresh)
         controls.addWidget(self.btn_export)
@@ -176,12 +523,38 @@ class ReportDialog(QDialog):
         row_controls.addStretch(1)
         layout.addLayout(row_controls)
 
-        # Table: lấy dữ liệu từ status.csv
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(
-            ["Tracking ID", "Ngày vi phạm", "Loại vi phạm", "Tình trạng"]
-        )
+        # Bộ lọc (thực hiện ở kho vi phạm, chỉ đọc về các dòng khớp)
+        filters = QHBoxLayout()
+        self.ed_date_from = QLineEdit()
+        self.ed_date_from.setPlaceholderText("Từ ngày (dd/mm/YYYY)")
+        self.ed_date_to = QLineEdit()
+        self.ed_date_to.setPlaceholderText("Đến ngày")
+        self.cb_status = QComboBox()
+        self.cb_type = QComboBox()
+        self.ed_track = QLineEdit()
+        self.ed_track.setPlaceholderText("Track ID bắt đầu bằng...")
+        self.btn_filter = QPushButton("🔍 Lọc")
+        self.btn_today = QPushButton("Hôm nay")
+        self.btn_clear_filter = QPushButton("Bỏ lọc")
+        for w in (self.ed_date_from, self.ed_date_to, self.cb_status, self.cb_type, self.ed_track,
+                  self.btn_filter, self.btn_today, self.btn_clear_filter):
+            filters.addWidget(w)
+        layout.addLayout(filters)
+
+        self.lbl_count = QLabel()
+        layout.addWidget(self.lbl_count)
+
+        # Table: lấy dữ liệu từ bảng status (đọc dần theo trang qua StatusTableModel)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        # Bấm tiêu đề cột để sắp xếp (StatusTableModel.sort); ban đầu theo thứ tự ghi
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.setIconSize(QSize(TABLE_THUMB, TABLE_THUMB))
+        self.table.verticalHeader().setDefaultSectionSize(TABLE_THUMB + 4)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.horizontalHeader().setStretchLastSection(True)
         layout.addWidget(self.table)
 
@@ -189,117 +562,212 @@ class ReportDialog(QDialog):
         self.btn_refresh.clicked.connect(self.refresh_data)
         self.btn_export.clicked.connect(self.export_report)
         self.btn_clear_all.clicked.connect(self.clear_all_data)
-        self.table.cellDoubleClicked.connect(self.show_detail)
+        self.table.doubleClicked.connect(lambda index: self.show_detail(index.row(), index.column()))
+
+        self.btn_filter.clicked.connect(self.apply_filters)
+        self.btn_today.clicked.connect(self.filter_today)
+        self.btn_clear_filter.clicked.connect(self.clear_filters)
+        for ed in (self.ed_date_from, self.ed_date_to, self.ed_track):
+            ed.returnPressed.connect(self.apply_filters)
+        self.model.modelReset.connect(self._update_count)
+        self.model.rowsInserted.connect(self._update_count)
+        self.model.rowsRemoved.connect(self._update_count)
 
         self.btn_add.clicked.connect(self.add_row)
         self.btn_edit.clicked.connect(self.edit_row)
         self.btn_delete.clicked.connect(self.delete_row)
 
-    # ---------- CSV setup ----------
-    def _ensure_csv_files(self):
-        """Đảm bảo tồn tại status.csv và report.csv với header chuẩn (giống code YOLO)."""
-        # status.csv: bảng tóm tắt
-        if not STATUS_CSV.exists():
-            with open(STATUS_CSV, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["track_id", "ngay_vi_pham", "loai_vi_pham", "tinh_trang"])
-
-        # report.csv: chi tiết YOLO (phiên bản có cột track_id ở cuối)
-        if not REPORT_CSV.exists():
-            with open(REPORT_CSV, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    [
-                        "id",
-                        "timestamp",
-                        "image_path",
-                        "x1",
-                        "y1",
-                        "x2",
-                        "y2",
-                        "cx",
-                        "bottom_y",
-                        "lane",
-                        "light_right",
-                        "light_left",
-                        "track_id",
-                    ]
-                )
+    # ---------- Kho vi phạm ----------
+    def _ensure_store(self):
+        """Mở kho vi phạm (tạo bảng / file với header chuẩn nếu chưa có)."""
+        if self.store is None:
+            self.store = open_store(violation_dir=str(VIOLATIONS_DIR))
+
+    def _row_data(self, row_idx):
+        """(key, [track_id, ngay_vi_pham, loai_vi_pham, tinh_trang]) của dòng đang hiển thị."""
+        return self.model.row_at(row_idx)
+
+    def _current_row(self):
+        return self.table.currentIndex().row()
+
+    # ---------- Ảnh thu nhỏ ----------
+    def _table_thumbnail(self, track_id):
+        pixmap = self._thumbs.get((track_id, TABLE_THUMB))
+        if pixmap is None:
+            self.thumb_loader.request(track_id, TABLE_THUMB)
+            return None
+        return pixmap or None
+
+    def _on_thumbnail_loaded(self, track_id, size, image_path, image):
+        self._thumbs.put((track_id, size), QPixmap.fromImage(image) if not image.isNull() else False)
+        if size == TABLE_THUMB:
+            self.model.thumbnail_ready(track_id)
+
+    def done(self, result):
+        """Đóng dialog: dừng luồng nạp ảnh (và hủy xuất báo cáo nếu đang chạy)."""
+        if self.export_worker is not None:
+            self.export_worker.finished_signal.disconnect()
+            self.export_worker.stop()
+            self.export_worker.wait()
+            self.export_worker = None
+        self.thumb_loader.stop()
+        self.thumb_loader.wait()
+        super().done(result)
+
+    # ---------- Bộ lọc ----------
+    def _load_filter_choices(self):
+        """Nạp lại danh sách tình trạng / loại vi phạm cho 2 ô chọn (giữ lựa chọn hiện tại)."""
+        for combo, column in ((self.cb_status, "tinh_trang"), (self.cb_type, "loai_vi_pham")):
+            current = combo.currentText()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(ALL_VALUES)
+            combo.addItems(self.store.status_values(column))
+            idx = combo.findText(current)
+            combo.setCurrentIndex(idx if idx >= 0 else 0)
+            combo.blockSignals(False)
+
+    @staticmethod
+    def _parse_date(text):
+        """Ngày nhập tay -> 'YYYY-mm-dd' ('' nếu bỏ trống), ValueError nếu sai định dạng."""
+        text = text.strip()
+        if not text:
+            return ""
+        iso = to_iso_date(text)[:10]
+        try:
+            datetime.strptime(iso, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"Ngày không hợp lệ: {text}")
+        return iso
+
+    def _current_filters(self):
+        status = self.cb_status.currentText()
+        vtype = self.cb_type.currentText()
+        return {
+            "date_from": self._parse_date(self.ed_date_from.text()),
+            "date_to": self._parse_date(self.ed_date_to.text()),
+            "tinh_trang": "" if status == ALL_VALUES else status,
+            "loai_vi_pham": "" if vtype == ALL_VALUES else vtype,
+            "track_prefix": self.ed_track.text().strip(),
+        }
 
-    # ---------- Helpers đọc/ghi status.csv ----------
-    def _read_status_rows(self):
-        """
-        Trả về list các row dữ liệu (bỏ header).
-        Mỗi row là list [track_id, ngay_vi_pham, loai_vi_pham, tinh_trang]
-        """
-        if not STATUS_CSV.exists():
-            return []
-        with open(STATUS_CSV, "r", encoding="utf-8") as f:
-            rows = list(csv.reader(f))
-        if len(rows) <= 1:
-            return []
-        return rows[1:]
-
-    def _write_status_rows(self, data_rows):
-        """
-        Ghi lại header + data_rows vào status.csv
-        data_rows: list[list[str]]
-        """
-        with open(STATUS_CSV, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["track_id", "ngay_vi_pham", "loai_vi_pham", "tinh_trang"])
-            writer.writerows(data_rows)
+    def apply_filters(self):
+        try:
+            filters = self._current_filters()
+        except ValueError as e:
+            QMessageBox.warning(self, "Lỗi", str(e))
+            return
+        try:
+            self.model.set_filters(filters)
+        except Exception as e:
+            QMessageBox.warning(self, "Lỗi", f"Không thể lọc dữ liệu: {e}")
+
+    def filter_today(self):
+        today = datetime.now().strftime("%d/%m/%Y")
+        self.ed_date_from.setText(today)
+        self.ed_date_to.setText(today)
+        self.apply_filters()
+
+    def clear_filters(self):
+        for ed in (self.ed_date_from, self.ed_date_to, self.ed_track):
+            ed.clear()
+        self.cb_status.setCurrentIndex(0)
+        self.cb_type.setCurrentIndex(0)
+        self.apply_filters()
+
+    def _update_count(self, *args):
+        text = f"{self.model.total} vi phạm"
+        if any(self.model.filters.values()):
+            text += " (đã lọc)"
+        self.lbl_count.setText(text)
 
     # ---------- Load data ----------
     def _load_status_into_table(self):
-        """Đọc status.csv và hiển thị lên bảng."""
-        self.table.setRowCount(0)
-        if not STATUS_CSV.exists():
-            return
+        """Đọc lại bảng status (chỉ trang đầu, các trang sau đọc khi cuộn tới)."""
         try:
-            data_rows = self._read_status_rows()
-            for r_idx, row in enumerate(data_rows):
-                if len(row) < 4:
-                    continue
-                self.table.insertRow(r_idx)
-                for c_idx in range(4):
-                    self.table.setItem(r_idx, c_idx, QTableWidgetItem(row[c_idx]))
+            self._load_filter_choices()
+            self.model.reload()
         except Exception as e:
-            QMessageBox.warning(self, "Lỗi", f"Không thể đọc status.csv: {e}")
+            QMessageBox.warning(self, "Lỗi", f"Không thể đọc dữ liệu vi phạm: {e}")
 
     # ---------- UI actions ----------
     def refresh_data(self):
         self._load_status_into_table()
 
     def export_report(self):
-        """Xuất bảng tóm tắt (status.csv) ra file CSV do người dùng chọn."""
-        if not STATUS_CSV.exists():
+        """
+        Xuất báo cáo chi tiết (status + report) của các dòng đang lọc ra CSV / CSV gzip / Parquet.
+        Ghi ở luồng nền theo từng khối, có thanh tiến trình và nút hủy.
+        """
+        if self.model.total == 0:
             QMessageBox.information(self, "Thông báo", "Không có dữ liệu để xuất.")
             return
-        save_path, _ = QFileDialog.getSaveFileName(
+        if self.export_worker is not None:
+            QMessageBox.information(self, "Thông báo", "Đang xuất báo cáo, vui lòng chờ.")
+            return
+        formats = available_formats()
+        save_path, chosen = QFileDialog.getSaveFileName(
             self,
-            "Lưu báo cáo tóm tắt CSV",
-            "violations_status.csv",
-            "CSV Files (*.csv)",
+            "Lưu báo cáo vi phạm",
+            "violations_report.csv",
+            ";;".join(EXPORT_FILE_FILTERS[f] for f in formats),
         )
-        if save_path:
-            try:
-                with open(STATUS_CSV, "r", encoding="utf-8") as src, open(
-                    save_path, "w", encoding="utf-8", newline=""
-                ) as dst:
-                    dst.write(src.read())
-                QMessageBox.information(
-                    self, "Xuất báo cáo", f"Đã xuất báo cáo tới:\n{save_path}"
-                )
-            except Exception as e:
-                QMessageBox.critical(self, "Lỗi xuất báo cáo", f"Lỗi: {e}")
+        if not save_path:
+            return
+        fmt = next((f for f in formats if EXPORT_FILE_FILTERS[f] == chosen), FORMAT_CSV)
+        suffix = "." + fmt
+        if not save_path.lower().endswith(suffix):
+            save_path += suffix
+
+        self.export_progress = QProgressDialog("Đang xuất báo cáo...", "Hủy", 0, self.model.total, self)
+        self.export_progress.setWindowTitle("Xuất báo cáo")
+        self.export_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.export_progress.setMinimumDuration(300)
+        self.export_progress.setAutoClose(False)
+        self.export_progress.setAutoReset(False)
+
+        self.export_worker = ExportWorker(self.store, save_path, fmt, self.model.filters)
+        self.export_worker.progress_signal.connect(self._on_export_progress)
+        self.export_worker.finished_signal.connect(self._on_export_finished)
+        self.export_progress.canceled.connect(self.export_worker.stop)
+        self.btn_export.setEnabled(False)
+        self.export_worker.start()
+
+    def _on_export_progress(self, done, total):
+        dlg = self.export_progress
+        if dlg is None:
+            return
+        if dlg.wasCanceled():
+            self.export_worker.stop()
+            return
+        # setValue() của dialog modal tự xử lý sự kiện -> có thể đóng dialog ngay trong lúc gọi
+        dlg.setLabelText(f"Đang xuất báo cáo... {done}/{total} dòng")
+        dlg.setMaximum(max(total, 1))
+        dlg.setValue(min(done, max(total, 1)))
+
+    def _on_export_finished(self, rows, error):
+        path = self.export_worker.path
+        self.export_worker.wait()
+        self.export_worker = None
+        if self.export_progress is not None:
+            self.export_progress.close()
+            self.export_progress = None
+        self.btn_export.setEnabled(True)
+        if error == "cancelled":
+            QMessageBox.information(self, "Xuất báo cáo", "Đã hủy xuất báo cáo.")
+        elif error:
+            QMessageBox.critical(self, "Lỗi xuất báo cáo", f"Lỗi: {error}")
+        else:
+            QMessageBox.information(
+                self, "Xuất báo cáo", f"Đã xuất {rows} dòng tới:\n{path}"
+            )
 
     def clear_all_data(self):
-        """Xóa toàn bộ ảnh + reset status.csv và report.csv về header."""
+        """Xóa toàn bộ ảnh + xóa toàn bộ dữ liệu status và report."""
         reply = QMessageBox.question(
             self,
             "Xác nhận xóa",
-            "Xóa toàn bộ dữ liệu CSV và ảnh?",
+            "Xóa toàn bộ dữ liệu vi phạm và ảnh?",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No,
         )
@@ -312,48 +780,18 @@ class ReportDialog(QDialog):
                     except Exception:
                         pass
 
-            # reset status.csv
-            with open(STATUS_CSV, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["track_id", "ngay_vi_pham", "loai_vi_pham", "tinh_trang"])
-
-            # reset report.csv
-            with open(REPORT_CSV, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    [
-                        "id",
-                        "timestamp",
-                        "image_path",
-                        "x1",
-                        "y1",
-                        "x2",
-                        "y2",
-                        "cx",
-                        "bottom_y",
-                        "lane",
-                        "light_right",
-                        "light_left",
-                        "track_id",
-                    ]
-                )
+            clear_thumbnails(str(VIOLATIONS_DIR))
+            self._thumbs.clear()
 
-            self.table.setRowCount(0)
+            # reset status + report
+            self.store.clear_all()
+            self._load_status_into_table()
 
     # ---------- Thêm / Sửa / Xóa 1 dòng ----------
     def add_row(self):
-        """Thêm 1 dòng mới vào status.csv (track_id tự tăng, chỉ dùng cho nhập tay)."""
-        data_rows = self._read_status_rows()
-
+        """Thêm 1 dòng mới vào bảng status (track_id tự tăng, chỉ dùng cho nhập tay)."""
         # Tự động sinh track_id mới (max + 1)
-        next_id = 1
-        for r in data_rows:
-            try:
-                v = int(r[0])
-                if v >= next_id:
-                    next_id = v + 1
-            except Exception:
-                pass
+        next_id = self.store.next_track_id()
 
         init_data = {
             "track_id": str(next_id),
@@ -364,40 +802,40 @@ class ReportDialog(QDialog):
 
         dlg = ViolationEditDialog(init_data, parent=self)
         if dlg.exec() == QDialog.DialogCode.Accepted:
-            new_row = dlg.get_row()
-            data_rows.append(new_row)
-            self._write_status_rows(data_rows)
-            self.refresh_data()
+            row = dlg.get_row()
+            key = self.store.add_status(row)
+            self.model.add_row(key, row)
+            self._load_filter_choices()
+            self._update_count()
 
     def edit_row(self):
-        """Sửa dòng đang chọn trong bảng và lưu lại vào status.csv"""
-        row_idx = self.table.currentRow()
+        """Sửa dòng đang chọn trong bảng và lưu lại vào kho vi phạm"""
+        row_idx = self._current_row()
         if row_idx < 0:
             QMessageBox.information(self, "Thông báo", "Hãy chọn một dòng để sửa.")
             return
 
-        data_rows = self._read_status_rows()
-        if row_idx >= len(data_rows):
+        key, row = self._row_data(row_idx)
+        if key is None:
             return
 
-        row = data_rows[row_idx]
         init_data = {
-            "track_id": row[0] if len(row) > 0 else "",
-            "ngay_vi_pham": row[1] if len(row) > 1 else "",
-            "loai_vi_pham": row[2] if len(row) > 2 else "Vượt đèn đỏ",
-            "tinh_trang": row[3] if len(row) > 3 else "Chờ xử lý",
+            "track_id": row[0],
+            "ngay_vi_pham": row[1],
+            "loai_vi_pham": row[2] or "Vượt đèn đỏ",
+            "tinh_trang": row[3] or "Chờ xử lý",
         }
 
         dlg = ViolationEditDialog(init_data, parent=self)
         if dlg.exec() == QDialog.DialogCode.Accepted:
-            updated_row = dlg.get_row()
-            data_rows[row_idx] = updated_row
-            self._write_status_rows(data_rows)
-            self.refresh_data()
+            new_row = dlg.get_row()
+            self.store.update_status(key, new_row)
+            self.model.update_row(key, new_row)
+            self._load_filter_choices()
 
     def delete_row(self):
-        """Xóa 1 dòng đang chọn trong bảng (và xóa chi tiết tương ứng trong report.csv theo track_id)"""
-        row_idx = self.table.currentRow()
+        """Xóa 1 dòng đang chọn trong bảng (và xóa chi tiết tương ứng trong report theo track_id)"""
+        row_idx = self._current_row()
         if row_idx < 0:
             QMessageBox.information(self, "Thông báo", "Hãy chọn một dòng để xóa.")
             return
@@ -412,103 +850,38 @@ class ReportDialog(QDialog):
         if reply != QMessageBox.StandardButton.Yes:
             return
 
-        data_rows = self._read_status_rows()
-        if row_idx >= len(data_rows):
+        key, _ = self._row_data(row_idx)
+        if key is None:
             return
 
-        removed_row = data_rows.pop(row_idx)
-        removed_track_id = removed_row[0] if removed_row else ""
-
-        # Ghi lại status.csv
-        self._write_status_rows(data_rows)
-
-        # Xóa các dòng trong report.csv có track_id trùng
-        if REPORT_CSV.exists() and removed_track_id:
-            try:
-                with open(REPORT_CSV, "r", encoding="utf-8") as f:
-                    rows = list(csv.reader(f))
-                if not rows:
-                    self.refresh_data()
-                    return
-
-                header = rows[0]
-                body = rows[1:]
+        try:
+            self.store.delete_status(key)
+        except Exception as e:
+            QMessageBox.warning(self, "Lỗi", f"Không thể xóa: {e}")
+            self.refresh_data()
+            return
 
-                # Tìm index của cột track_id (nếu có)
-                track_idx = None
-                try:
-                    track_idx = header.index("track_id")
-                except ValueError:
-                    # Nếu không có cột track_id thì thôi, giữ nguyên ^_^
-                    track_idx = None
-
-                if track_idx is not None:
-                    new_rows = [
-                        r for r in body
-                        if not (len(r) > track_idx and r[track_idx] == removed_track_id)
-                    ]
-                else:
-                    # Không có cột track_id, không đụng đến report.csv
-                    new_rows = body
-
-                with open(REPORT_CSV, "w", newline="", encoding="utf-8") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(header)
-                    writer.writerows(new_rows)
-            except Exception:
-                pass
-
-        self.refresh_data()
+        self.model.remove_row(key)
 
     # ---------- Show detail ----------
     def show_detail(self, row, col):
         """
         Khi double-click 1 dòng:
-        - Lấy track_id/ngày/loại/tình_trạng từ status.csv
-        - Tra trong report.csv theo track_id để lấy image_path
+        - Lấy track_id/ngày/loại/tình_trạng từ dòng đang hiển thị
+        - Tra trong report theo track_id để lấy image_path
         - Mở dialog chi tiết
         """
-        if not STATUS_CSV.exists():
+        key, data_row = self._row_data(row)
+        if key is None:
             return
         try:
-            # Đọc toàn bộ status.csv
-            with open(STATUS_CSV, "r", encoding="utf-8") as f:
-                status_rows = list(csv.reader(f))
-                if row + 1 >= len(status_rows):
-                    return
-                data_row = status_rows[row + 1]  # row 0 là header
-
-            track_id = data_row[0] if len(data_row) > 0 else ""
-            ngay_vi_pham = data_row[1] if len(data_row) > 1 else ""
-            loai_vi_pham = data_row[2] if len(data_row) > 2 else "Vượt đèn đỏ"
-            tinh_trang = data_row[3] if len(data_row) > 3 else "Chờ xử lý"
-
-            # Tìm image_path trong report.csv theo track_id
-            image_path = ""
-            if REPORT_CSV.exists() and track_id:
-                with open(REPORT_CSV, "r", encoding="utf-8") as f:
-                    report_rows = list(csv.reader(f))
-                    if len(report_rows) > 1:
-                        header = report_rows[0]
-                        body = report_rows[1:]
-                        # tìm index cột image_path và track_id
-                        try:
-                            img_idx = header.index("image_path")
-                        except ValueError:
-                            img_idx = 2  # fallback: cột 2 như bản cũ
-
-                        track_idx = None
-                        try:
-                            track_idx = header.index("track_id")
-                        except ValueError:
-                            track_idx = None
-
-                        if track_idx is not None:
-                            for r in body:
-                                if len(r) > track_idx and r[track_idx] == track_id:
-                                    if len(r) > img_idx:
-                                        image_path = r[img_idx]
-                                    break
+            track_id = data_row[0]
+            ngay_vi_pham = data_row[1]
+            loai_vi_pham = data_row[2] or "Vượt đèn đỏ"
+            tinh_trang = data_row[3] or "Chờ xử lý"
+
+            # Tìm image_path trong report theo track_id
+            image_path = self.store.find_image_path(track_id) if track_id else ""
 
             info = {
                 "track_id": track_id,
@@ -518,7 +891,7 @@ class ReportDialog(QDialog):
                 "image_path": image_path,
             }
 
-            dlg = ViolationDetailDialog(info, parent=self)
+            dlg = ViolationDetailDialog(info, parent=self, loader=self.thumb_loader, cache=self._thumbs)
             dlg.exec()
 
         except Exception as e:
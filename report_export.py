@@ -0,0 +1,148 @@
+"""
+Xuất báo cáo vi phạm chi tiết (status + report nối theo track_id) theo kiểu đọc tới đâu ghi tới đó.
+
+- Dữ liệu lấy từ kho vi phạm theo từng khối (iter_export_rows), không nạp cả bảng vào bộ nhớ.
+  Kho CSV không có index: cần thêm chỉ mục track_id -> vị trí dòng report (O(số track)).
+- Định dạng: "csv" (UTF-8 có BOM, mở thẳng bằng Excel), "csv.gz" (CSV nén gzip),
+  "parquet" (cần pyarrow, không bắt buộc).
+- Ghi ra file tạm rồi mới đổi tên: hủy giữa chừng / lỗi không để lại file dở.
+
+Dùng trong ReportDialog (ExportWorker) hoặc chạy tay, vd. xuất cả tháng 3:
+    python report_export.py violations_2025_03.csv.gz --from 2025-03-01 --to 2025-03-31
+"""
+import os
+import csv
+import gzip
+import argparse
+
+try:
+    import pyarrow as pa  # Parquet không bắt buộc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from violation_store import open_store, EXPORT_HEADER, FILTER_KEYS
+
+FORMAT_CSV = "csv"
+FORMAT_CSV_GZ = "csv.gz"
+FORMAT_PARQUET = "parquet"
+
+EXPORT_CHUNK_SIZE = 5000
+
+
+def available_formats():
+    return [FORMAT_CSV, FORMAT_CSV_GZ] + ([FORMAT_PARQUET] if pq is not None else [])
+
+
+def format_from_path(path):
+    """Đoán định dạng theo đuôi file (.csv / .csv.gz / .parquet)."""
+    lower = path.lower()
+    if lower.endswith(".gz"):
+        return FORMAT_CSV_GZ
+    if lower.endswith(".parquet"):
+        return FORMAT_PARQUET
+    return FORMAT_CSV
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class _CsvSink:
+    def __init__(self, path, header, compress):
+        if compress:
+            self._f = gzip.open(path, "wt", encoding="utf-8-sig", newline="")
+        else:
+            self._f = open(path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(header)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._f.close()
+
+
+class _ParquetSink:
+    def __init__(self, path, header):
+        if pq is None:
+            raise ImportError("Chưa cài pyarrow (pip install pyarrow) để xuất Parquet")
+        self._header = header
+        self._schema = pa.schema([(name, pa.string()) for name in header])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(self._header)
+        table = pa.Table.from_arrays([pa.array(col, type=pa.string()) for col in columns],
+                                     schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+def _open_sink(path, fmt, header):
+    if fmt == FORMAT_PARQUET:
+        return _ParquetSink(path, header)
+    if fmt in (FORMAT_CSV, FORMAT_CSV_GZ):
+        return _CsvSink(path, header, compress=(fmt == FORMAT_CSV_GZ))
+    raise ValueError(f"Định dạng xuất không hỗ trợ: {fmt}")
+
+
+def export_violations(store, path, fmt=None, filters=None, chunk_size=EXPORT_CHUNK_SIZE,
+                      progress=None, should_stop=None):
+    """
+    Xuất các vi phạm thỏa filters ra path. Trả về số dòng đã ghi.
+    progress(done, total): gọi sau mỗi khối; should_stop(): True -> hủy (ExportCancelled).
+    """
+    fmt = fmt or format_from_path(path)
+    total = store.count_status(filters)
+    tmp = f"{path}.part"
+    sink = _open_sink(tmp, fmt, EXPORT_HEADER)
+    done = 0
+    try:
+        for rows in store.iter_export_rows(filters, chunk_size=chunk_size):
+            if should_stop is not None and should_stop():
+                raise ExportCancelled()
+            sink.write(rows)
+            done += len(rows)
+            if progress is not None:
+                progress(done, total)
+        sink.close()
+        sink = None
+        os.replace(tmp, path)
+    finally:
+        if sink is not None:
+            sink.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xuất báo cáo vi phạm chi tiết (CSV / gzip / Parquet).")
+    parser.add_argument("out", help="File đích: .csv, .csv.gz hoặc .parquet")
+    parser.add_argument("--dir", default="violations", help="Thư mục violations")
+    parser.add_argument("--store", choices=("sqlite", "csv"), default=None, help="Backend kho vi phạm")
+    parser.add_argument("--format", choices=(FORMAT_CSV, FORMAT_CSV_GZ, FORMAT_PARQUET), default=None)
+    parser.add_argument("--from", dest="date_from", default="", help="Từ ngày YYYY-mm-dd")
+    parser.add_argument("--to", dest="date_to", default="", help="Đến ngày YYYY-mm-dd")
+    parser.add_argument("--status", dest="tinh_trang", default="", help="Tình trạng")
+    parser.add_argument("--type", dest="loai_vi_pham", default="", help="Loại vi phạm")
+    parser.add_argument("--track-prefix", dest="track_prefix", default="")
+    args = parser.parse_args(argv)
+
+    filters = {k: getattr(args, k) for k in FILTER_KEYS}
+    store = open_store(args.store, violation_dir=args.dir)
+
+    def show(done, total):
+        print(f"\r{done}/{total} dòng", end="", flush=True)
+
+    n = export_violations(store, args.out, fmt=args.format, filters=filters, progress=show)
+    print(f"\n✅ Đã xuất {n} dòng tới {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+"""
+Đo thời gian khởi động ứng dụng và chi phí import của từng module.
+
+Mỗi phép đo chạy trong 1 tiến trình Python mới (không bị cache import của lần trước):
+- import <module>: thời gian import riêng module đó (gồm cả thư viện nó kéo theo),
+- main.py --startup-time: thời gian tới khi cửa sổ chính hiện lên.
+Kết quả (trung vị của --repeat lần) được in ra và ghi thêm vào file CSV.
+
+Ví dụ:
+    python startup_benchmark.py
+    python startup_benchmark.py --repeat 5 --modules detect report ultralytics
+"""
+import os
+import sys
+import csv
+import argparse
+import datetime
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULT_CSV = os.path.join("violations", "startup_benchmark.csv")
+
+DEFAULT_MODULES = [
+    "main",
+    "detect", "redlight", "license_plate", "redlight_violation", "report",
+    "cv2", "PyQt6.QtWidgets", "ultralytics", "torch", "easyocr",
+]
+
+_IMPORT_SNIPPET = (
+    "import time, importlib; t = time.perf_counter(); importlib.import_module({name!r}); "
+    "print(f'import_sec={{time.perf_counter() - t:.4f}}')"
+)
+
+
+def _run(args, env):
+    """Chạy 1 tiến trình con, trả về (giá trị đo, lỗi)."""
+    try:
+        proc = subprocess.run(args, cwd=HERE, env=env, capture_output=True, text=True, timeout=300)
+    except subprocess.TimeoutExpired:
+        return None, "timeout"
+    for line in proc.stdout.splitlines():
+        key, _, value = line.partition("=")
+        if key in ("import_sec", "startup_sec"):
+            return float(value), None
+    err = (proc.stderr.strip().splitlines() or ["không có kết quả"])[-1]
+    return None, err
+
+
+def measure_import(name, repeat, env):
+    values, error = [], None
+    for _ in range(repeat):
+        value, error = _run([sys.executable, "-c", _IMPORT_SNIPPET.format(name=name)], env)
+        if value is None:
+            break
+        values.append(value)
+    return values, error
+
+
+def measure_startup(repeat, env, extra_args=()):
+    values, error = [], None
+    for _ in range(repeat):
+        value, error = _run([sys.executable, "main.py", "--startup-time", *extra_args], env)
+        if value is None:
+            break
+        values.append(value)
+    return values, error
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động / import từng module.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Các module cần đo")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần đo mỗi mục (lấy trung vị)")
+    parser.add_argument("--out", default=RESULT_CSV, help="File CSV ghi kết quả")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    rows = []
+    items = [("main.py (tới khi hiện cửa sổ)", None)] + [(f"import {m}", m) for m in args.modules]
+    for label, module in items:
+        if module is None:
+            values, error = measure_startup(args.repeat, env)
+        else:
+            values, error = measure_import(module, args.repeat, env)
+        median = statistics.median(values) if values else None
+        rows.append((label, median, error))
+        shown = f"{median:8.3f} s" if median is not None else f"  lỗi: {error}"
+        print(f"{label:<40} {shown}", flush=True)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    new_file = not os.path.exists(args.out)
+    run_at = datetime.datetime.now().isoformat(timespec="seconds")
+    with open(args.out, mode="a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["run_at", "item", "median_sec", "error"])
+        for label, median, error in rows:
+            writer.writerow([run_at, label, "" if median is None else round(median, 4), error or ""])
+    print(f"✅ Đã ghi kết quả vào {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,382 @@
+"""
+Chạy nhiều camera / video song song, mỗi nguồn 1 tiến trình DetectWorker riêng
+(không dùng chung GIL -> camera thứ 2 không làm chậm camera thứ 1).
+
+Supervisor:
+- đọc danh sách camera từ file cấu hình JSON,
+- ghim mỗi tiến trình vào các core CPU được chỉ định,
+- tất cả dùng chung 1 kho vi phạm SQLite (WAL, cấp id theo khối -> an toàn giữa các tiến trình),
+- tự khởi động lại tiến trình bị lỗi / mất luồng camera (chờ tăng dần, đếm lại từ đầu
+  khi tiến trình đã chạy ổn định healthy_uptime_sec giây),
+- gom FPS và độ trễ của từng camera vào 1 bảng trạng thái.
+
+Ví dụ cameras.json:
+    {
+        "model": "yolov8m.pt",
+        "restart_delay_sec": 2,
+        "max_restarts": null,
+        "healthy_uptime_sec": 60,
+        "defaults": {"tracker_backend": "kalman", "roi_inference": true},
+        "cameras": [
+            {"name": "nga_tu_1", "source": "rtsp://10.0.0.11/stream", "cpus": [0, 1]},
+            {"name": "nga_tu_2", "source": "videos/cam2.mp4", "cpus": [2, 3],
+             "replay_dedup": true, "options": {"detect_every": 2}}
+        ]
+    }
+
+Mỗi lần chạy, tracker của camera tiếp sau track_id lớn nhất đã lưu trong dải của camera.
+"replay_dedup": true (chỉ nguồn file): chạy lại file từ đầu với ID bắt đầu từ track_id_base
+và tra kho cho mọi track_id, để khi tiến trình bị lỗi giữa chừng rồi chạy lại, các xe đã
+lưu ở lần trước không bị lưu lần nữa. Chỉ đúng khi tracker cấp lại đúng các ID cũ
+(cùng file, cùng tùy chọn).
+
+Chạy:
+    python supervisor.py cameras.json
+    python supervisor.py cameras.json --status-json violations/supervisor_status.json
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+import multiprocessing as mp
+
+# Mỗi camera có 1 dải track_id riêng (rộng TRACK_ID_STRIDE) để không trùng khi dùng chung kho vi phạm
+from violation_store import TRACK_ID_STRIDE
+
+# Thời gian chờ tối đa giữa 2 lần khởi động lại (giây)
+MAX_RESTART_DELAY = 60.0
+# Tiến trình chạy được ít nhất chừng này giây thì coi là ổn định: đếm số lần restart lại từ 0
+HEALTHY_UPTIME = 60.0
+
+# Mã thoát của tiến trình camera
+EXIT_OK = 0        # video đã chạy hết / được yêu cầu dừng
+EXIT_ERROR = 1     # lỗi (không tải được model, không mở được nguồn, lỗi xử lý)
+EXIT_STREAM = 2    # luồng camera trực tiếp bị ngắt
+
+
+def load_config(path):
+    """Đọc file cấu hình JSON, điền giá trị mặc định cho từng camera."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    cameras = config.get("cameras") or []
+    if not cameras:
+        raise ValueError("Cấu hình không có camera nào")
+    if config.get("storage_backend", "sqlite") != "sqlite":
+        raise ValueError("Supervisor chỉ hỗ trợ kho SQLite (CSV không an toàn khi nhiều tiến trình cùng ghi)")
+
+    defaults = config.get("defaults") or {}
+    names = set()
+    for i, cam in enumerate(cameras):
+        if "source" not in cam:
+            raise ValueError(f"Camera #{i} thiếu 'source'")
+        cam.setdefault("name", f"cam{i + 1}")
+        if cam["name"] in names:
+            raise ValueError(f"Trùng tên camera: {cam['name']}")
+        names.add(cam["name"])
+        cam.setdefault("model", config.get("model", "yolov8m.pt"))
+        cam.setdefault("track_id_base", (i + 1) * TRACK_ID_STRIDE)
+        cam.setdefault("replay_dedup", False)
+        cam["options"] = {**defaults, **(cam.get("options") or {})}
+    return config
+
+
+def pin_to_cpus(cpus):
+    """Ghim tiến trình hiện tại vào các core; trả về False nếu hệ điều hành không hỗ trợ."""
+    cpus = set(int(c) for c in cpus)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+        return True
+    try:
+        import psutil  # không bắt buộc (Windows / macOS)
+    except ImportError:
+        return False
+    psutil.Process().cpu_affinity(sorted(cpus))
+    return True
+
+
+def _is_file_source(source):
+    return isinstance(source, str) and os.path.exists(source)
+
+
+# ================== Tiến trình camera ==================
+def camera_process(cam, status_queue, stop_event, report_interval=1.0):
+    """Hàm chạy trong tiến trình con: 1 DetectWorker headless cho 1 camera."""
+    name = cam["name"]
+    # Ctrl+C gửi tới cả nhóm tiến trình: để supervisor tự dừng các camera một cách có trật tự
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cpus = cam.get("cpus")
+    if cpus:
+        # Giới hạn số luồng của OpenCV / BLAS / torch theo số core được ghim
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[var] = str(len(cpus))
+        try:
+            pin_to_cpus(cpus)
+        except OSError as e:
+            status_queue.put(("log", name, f"Không ghim được CPU {cpus}: {e}"))
+
+    # Import sau khi đặt biến môi trường để thư viện đọc đúng số luồng
+    import cv2
+    from redlight_violation import DetectWorker, VIOLATION_DIR
+    from violation_store import open_store
+    if cpus:
+        cv2.setNumThreads(len(cpus))
+
+    store = open_store("sqlite", VIOLATION_DIR)
+    base = int(cam["track_id_base"])
+    replay = bool(cam.get("replay_dedup")) and _is_file_source(cam["source"])
+    if replay:
+        # Chạy lại file từ đầu: tracker cấp lại các ID của lần chạy trước
+        track_id_start = base
+    else:
+        # Tiếp tục sau track_id lớn nhất đã lưu của camera này,
+        # nếu không sau khi khởi động lại mọi xe có ID cũ sẽ bị coi là đã vi phạm
+        track_id_start = store.next_track_id(base, base + TRACK_ID_STRIDE)
+
+    source = cam["source"]
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    worker = DetectWorker(source=source, model_path=cam["model"], headless=True,
+                          store=store, track_id_start=track_id_start, **cam["options"])
+    if replay:
+        # ID trùng lần chạy trước -> tra kho cho mọi track_id (loại trùng theo lịch sử)
+        worker.violated_track_ids.new_from = None
+    worker.status_signal.connect(lambda text: status_queue.put(("log", name, text)))
+    violations = []
+    worker.new_violation_signal.connect(violations.append)
+
+    def stats():
+        return {**worker.throughput_stats(), "violations": len(violations)}
+
+    done = threading.Event()
+
+    def report():
+        # Chỉ kiểm tra stop_event bằng is_set(): chờ (wait) trên Event của multiprocessing
+        # rồi thoát tiến trình có thể làm set() ở tiến trình cha bị treo
+        while not done.wait(report_interval):
+            status_queue.put(("stats", name, stats()))
+            if stop_event.is_set():
+                worker.stop()
+
+    threading.Thread(target=report, daemon=True).start()
+
+    worker.run()
+    done.set()
+    status_queue.put(("stats", name, stats()))
+
+    if stop_event.is_set():
+        sys.exit(EXIT_OK)
+    if worker.last_error:
+        status_queue.put(("log", name, worker.last_error))
+        sys.exit(EXIT_ERROR)
+    if not _is_file_source(cam["source"]):
+        sys.exit(EXIT_STREAM)
+    sys.exit(EXIT_OK)
+
+
+# ================== Supervisor ==================
+class CameraSupervisor:
+    def __init__(self, config, report_interval=1.0):
+        self.config = config
+        self.report_interval = report_interval
+        self.restart_delay = float(config.get("restart_delay_sec", 2.0))
+        self.max_restarts = config.get("max_restarts")
+        self.healthy_uptime = float(config.get("healthy_uptime_sec", HEALTHY_UPTIME))
+
+        # spawn: tiến trình con không kế thừa trạng thái Qt / CUDA của tiến trình cha
+        self._ctx = mp.get_context("spawn")
+        self._queue = self._ctx.Queue()
+        self._stop = self._ctx.Event()
+
+        self.cameras = {}
+        for cam in config["cameras"]:
+            self.cameras[cam["name"]] = {
+                "config": cam,
+                "process": None,
+                "state": "chờ",
+                "restarts": 0,
+                "started_at": 0.0,
+                "next_start": 0.0,
+                "stats": {},
+                "message": "",
+            }
+
+    # ---------- Vòng đời ----------
+    def _spawn(self, entry):
+        proc = self._ctx.Process(
+            target=camera_process,
+            args=(entry["config"], self._queue, self._stop, self.report_interval),
+            name=f"camera-{entry['config']['name']}",
+            daemon=False,
+        )
+        proc.start()
+        entry["started_at"] = time.monotonic()
+        entry["process"] = proc
+        entry["state"] = "đang chạy"
+
+    def start(self):
+        for entry in self.cameras.values():
+            self._spawn(entry)
+        return self
+
+    def stop(self, timeout=10.0):
+        """Yêu cầu tất cả camera dừng (ghi nốt vi phạm), quá timeout thì kết thúc cưỡng bức."""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for entry in self.cameras.values():
+            proc = entry["process"]
+            if proc is None:
+                continue
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.terminate()
+                proc.join(1.0)
+            entry["state"] = "đã dừng"
+        self._drain()
+
+    def _drain(self):
+        while True:
+            try:
+                kind, name, payload = self._queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                break
+            entry = self.cameras.get(name)
+            if entry is None:
+                continue
+            if kind == "stats":
+                entry["stats"] = payload
+            else:
+                entry["message"] = payload
+
+    def poll(self):
+        """Cập nhật trạng thái, khởi động lại camera bị lỗi. Trả về True nếu còn camera đang chạy."""
+        self._drain()
+        now = time.monotonic()
+        running = False
+        for entry in self.cameras.values():
+            proc = entry["process"]
+            if entry["state"] == "chờ khởi động lại":
+                if now >= entry["next_start"]:
+                    self._spawn(entry)
+                running = True
+                continue
+            if proc is None or entry["state"] != "đang chạy":
+                continue
+            if proc.is_alive():
+                running = True
+                continue
+
+            code = proc.exitcode
+            if code == EXIT_OK or self._stop.is_set():
+                entry["state"] = "xong"
+                continue
+            # Đã chạy ổn định 1 thời gian: lỗi lần này không nối tiếp chuỗi lỗi trước
+            if now - entry["started_at"] >= self.healthy_uptime:
+                entry["restarts"] = 0
+            if self.max_restarts is not None and entry["restarts"] >= self.max_restarts:
+                entry["state"] = f"lỗi (mã {code})"
+                continue
+            # Chờ tăng dần: 2s, 4s, 8s ... tối đa MAX_RESTART_DELAY
+            delay = min(MAX_RESTART_DELAY, self.restart_delay * (2 ** entry["restarts"]))
+            entry["restarts"] += 1
+            entry["next_start"] = now + delay
+            entry["state"] = "chờ khởi động lại"
+            entry["message"] = f"Tiến trình thoát (mã {code}), chạy lại sau {delay:.0f}s"
+            running = True
+        return running
+
+    # ---------- Bảng trạng thái ----------
+    def status_rows(self):
+        rows = []
+        for name, entry in self.cameras.items():
+            proc = entry["process"]
+            stats = entry["stats"]
+            rows.append({
+                "camera": name,
+                "pid": proc.pid if proc is not None else None,
+                "state": entry["state"],
+                "restarts": entry["restarts"],
+                "frames": stats.get("frames", 0),
+                "fps": stats.get("fps", 0.0),
+                "avg_latency_ms": stats.get("avg_latency_ms", 0.0),
+                "max_latency_ms": stats.get("max_latency_ms", 0.0),
+                "violations": stats.get("violations", 0),
+                "message": entry["message"],
+            })
+        return rows
+
+    def format_status(self):
+        rows = self.status_rows()
+        lines = [
+            f"{'camera':<14} {'pid':>7} {'trạng thái':<18} {'restart':>7} {'frame':>8} "
+            f"{'fps':>7} {'trễ TB ms':>9} {'trễ max':>8} {'vi phạm':>7}  thông báo"
+        ]
+        for r in rows:
+            lines.append(
+                f"{r['camera']:<14} {str(r['pid'] or '-'):>7} {r['state']:<18} {r['restarts']:>7} "
+                f"{r['frames']:>8} {r['fps']:>7} {r['avg_latency_ms']:>9} {r['max_latency_ms']:>8} "
+                f"{r['violations']:>7}  {r['message'][:60]}"
+            )
+        total_fps = sum(r["fps"] for r in rows if r["state"] == "đang chạy")
+        lines.append(f"Tổng FPS các camera đang chạy: {total_fps:.2f}")
+        return "\n".join(lines)
+
+    def write_status_json(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": time.time(), "cameras": self.status_rows()},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def run(self, status_interval=2.0, status_json=None):
+        """Chạy đến khi mọi camera xong (hoặc Ctrl+C), in bảng trạng thái định kỳ."""
+        self.start()
+        interactive = sys.stdout.isatty()
+        last_print = 0.0
+        try:
+            while True:
+                running = self.poll()
+                now = time.monotonic()
+                if now - last_print >= status_interval or not running:
+                    last_print = now
+                    if interactive:
+                        print("\033[2J\033[H", end="")
+                    print(self.format_status(), flush=True)
+                    if status_json:
+                        self.write_status_json(status_json)
+                if not running:
+                    break
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            print("Đang dừng các camera...")
+        finally:
+            self.stop()
+            if status_json:
+                self.write_status_json(status_json)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chạy nhiều camera, mỗi camera 1 tiến trình.")
+    parser.add_argument("config", help="File cấu hình JSON (danh sách camera)")
+    parser.add_argument("--status-interval", type=float, default=2.0,
+                        help="Chu kỳ in bảng trạng thái (giây)")
+    parser.add_argument("--status-json", default=None,
+                        help="Ghi bảng trạng thái ra file JSON (cho công cụ khác đọc)")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"❌ Lỗi cấu hình: {e}")
+        return 1
+
+    CameraSupervisor(config).run(status_interval=args.status_interval,
+                                 status_json=args.status_json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
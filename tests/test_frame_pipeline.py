@@ -0,0 +1,102 @@
+import queue
+import random
+import time
+
+import pytest
+
+from frame_pipeline import (DROP_BLOCK, DROP_NEWEST, DROP_OLDEST, FramePipeline)
+
+
+def _counter_source(n):
+    items = iter(range(n))
+    return lambda: next(items, None)
+
+
+def _jitter(fn):
+    rng = random.Random(0)
+
+    def stage(item):
+        time.sleep(rng.uniform(0, 0.002))
+        return fn(item)
+    return stage
+
+
+def test_order_preserved_across_stages():
+    out = []
+    pipeline = FramePipeline(
+        _counter_source(200),
+        [("a", _jitter(lambda x: x * 2)), ("b", _jitter(lambda x: x + 1))],
+        lambda item: out.append(item),
+        queue_size=2,
+    )
+    pipeline.run()
+    assert out == [i * 2 + 1 for i in range(200)]
+    summary = pipeline.summary()
+    assert summary["dropped"] == 0
+    assert summary["a"]["items"] == summary["b"]["items"] == 200
+
+
+def test_stage_none_and_errors_skip_item():
+    out, errors = [], []
+
+    def stage(x):
+        if x == 3:
+            raise ValueError("hỏng")
+        return None if x % 2 else x
+
+    pipeline = FramePipeline(_counter_source(10), [("even", stage)], out.append,
+                             on_error=lambda name, exc: errors.append(name))
+    pipeline.run()
+    assert out == [0, 2, 4, 6, 8]
+    assert errors == ["even"]
+
+
+def test_sink_false_stops_pipeline():
+    out = []
+    pipeline = FramePipeline(lambda: 1, [("id", lambda x: x)],
+                             lambda item: out.append(item) or len(out) < 5)
+    pipeline.run()
+    assert len(out) == 5
+    assert all(not t.is_alive() for t in pipeline._threads)
+
+
+def test_invalid_drop_policy():
+    with pytest.raises(ValueError):
+        FramePipeline(lambda: None, [], lambda item: True, drop_policy="bogus")
+
+
+@pytest.mark.parametrize("policy, expected", [
+    (DROP_OLDEST, [2, 3]),
+    (DROP_NEWEST, [1, 2]),
+])
+def test_put_source_drop_policy(policy, expected):
+    pipeline = FramePipeline(lambda: None, [], lambda item: True, drop_policy=policy)
+    q = queue.Queue(maxsize=2)
+    for item in (1, 2, 3):
+        assert pipeline._put_source(q, item)
+    assert list(q.queue) == expected
+    assert pipeline.dropped == 1
+
+
+@pytest.mark.parametrize("policy", [DROP_BLOCK, DROP_OLDEST, DROP_NEWEST])
+def test_slow_sink_drop_policy(policy):
+    n = 100
+    out = []
+
+    def slow_sink(item):
+        time.sleep(0.002)
+        out.append(item)
+
+    pipeline = FramePipeline(_counter_source(n), [], slow_sink, queue_size=1, drop_policy=policy)
+    pipeline.run()
+    # Thứ tự luôn giữ nguyên, mỗi frame hoặc tới sink hoặc bị đếm là bỏ
+    assert out == sorted(set(out))
+    assert len(out) + pipeline.dropped == n
+    if policy == DROP_BLOCK:
+        assert out == list(range(n))
+    else:
+        assert pipeline.dropped > 0
+    if policy == DROP_OLDEST:
+        assert out[-1] == n - 1   # frame mới nhất không bao giờ bị bỏ
+    if policy == DROP_NEWEST:
+        assert out[0] == 0        # frame đã vào hàng đợi không bị bỏ
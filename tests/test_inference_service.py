@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from inference_service import BatchInferenceService
+
+
+class _SlowModel:
+    """Model giả: trả về frame * 10, mỗi lô mất delay giây."""
+
+    def __init__(self, delay=0.005):
+        self.delay = delay
+        self.batch_sizes = []
+
+    def __call__(self, frames, **kwargs):
+        self.batch_sizes.append(len(frames))
+        time.sleep(self.delay)
+        return [f * 10 for f in frames]
+
+
+def test_results_reach_their_own_future():
+    model = _SlowModel()
+    with BatchInferenceService(model, batch_size=4, max_wait_ms=5) as service:
+        futures = [service.submit(i) for i in range(20)]
+        assert [f.result(timeout=5) for f in futures] == [i * 10 for i in range(20)]
+    assert max(model.batch_sizes) <= 4
+    assert service.summary()["frames"] == 20
+
+
+def test_model_error_fails_the_batch():
+    def broken(frames, **kwargs):
+        raise RuntimeError("model hỏng")
+
+    with BatchInferenceService(broken, batch_size=2) as service:
+        with pytest.raises(RuntimeError, match="model hỏng"):
+            service.infer(1, timeout=5)
+
+
+def test_no_future_left_pending_after_stop():
+    service = BatchInferenceService(_SlowModel(delay=0.01), batch_size=4, max_wait_ms=2).start()
+    futures = []
+    lock = threading.Lock()
+    go = threading.Event()
+
+    def producer():
+        go.wait()
+        for i in range(200):
+            fut = service.submit(i)
+            with lock:
+                futures.append(fut)
+
+    threads = [threading.Thread(target=producer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    go.set()
+    time.sleep(0.05)
+    service.stop()
+    for t in threads:
+        t.join()
+
+    assert len(futures) == 800
+    assert all(f.done() for f in futures)
+    done_ok = sum(1 for f in futures if f.exception() is None)
+    assert done_ok == service.frames
+    for f in futures:
+        if f.exception() is not None:
+            assert isinstance(f.exception(), RuntimeError)
+
+
+def test_submit_after_stop_fails_immediately():
+    service = BatchInferenceService(_SlowModel()).start()
+    service.stop()
+    fut = service.submit(1)
+    assert fut.done()
+    with pytest.raises(RuntimeError):
+        fut.result()
@@ -0,0 +1,49 @@
+from light_gate import LightGate
+
+
+def _feed(gate, state, n):
+    return [gate.observe(state) for _ in range(n)]
+
+
+def test_debounce_ignores_short_flicker():
+    gate = LightGate(debounce=3)
+    _feed(gate, "RED", 3)
+    assert gate.phase == "RED"
+    # 1-2 frame nhiễu không đổi pha
+    _feed(gate, "GREEN", 2)
+    _feed(gate, "RED", 1)
+    assert gate.phase == "RED"
+    _feed(gate, "GREEN", 3)
+    assert gate.phase == "GREEN"
+
+
+def test_active_until_green_is_confirmed():
+    gate = LightGate(warmup_frames=30, debounce=3)
+    _feed(gate, "RED", 5)
+    # Đang chờ xác nhận pha xanh -> vẫn chạy nhận diện
+    assert _feed(gate, "GREEN", 2) == [True, True]
+    assert gate.observe("GREEN") is False
+    # Không phải GREEN (kể cả UNKNOWN) -> chạy ngay ở frame đó
+    assert gate.observe("UNKNOWN") is True
+    assert gate.observe("YELLOW") is True
+
+
+def test_warmup_before_expected_end_of_green():
+    gate = LightGate(warmup_frames=30, debounce=3)
+    _feed(gate, "GREEN", 100)
+    _feed(gate, "RED", 20)
+    assert gate.last_green_frames == 100
+
+    flags = _feed(gate, "GREEN", 100)
+    assert all(flags[:2])            # chờ debounce
+    assert not any(flags[2:69])      # pha xanh: tạm dừng YOLO
+    assert all(flags[69:])           # còn <= 30 frame là hết xanh: chạy lại
+
+
+def test_green_stride_runs_sparse_frames():
+    gate = LightGate(warmup_frames=0, green_stride=5, debounce=1)
+    flags = _feed(gate, "GREEN", 20)
+    assert [i + 1 for i, active in enumerate(flags) if active] == [5, 10, 15, 20]
+    summary = gate.summary()
+    assert summary["frames"] == 20
+    assert summary["active_frames"] == 4
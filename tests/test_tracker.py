@@ -0,0 +1,122 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from tracker import KalmanTracker, _hungarian, solve_assignment
+
+
+def _brute_force_cost(cost):
+    """Tổng chi phí nhỏ nhất khi ghép min(n, m) cặp, thử mọi cách ghép."""
+    n, m = cost.shape
+    if n <= m:
+        return min(sum(cost[i, c] for i, c in enumerate(cols))
+                   for cols in itertools.permutations(range(m), n))
+    return min(sum(cost[r, j] for j, r in enumerate(rows))
+               for rows in itertools.permutations(range(n), m))
+
+
+def _check_assignment(cost, rows, cols):
+    assert len(rows) == len(cols) == min(cost.shape)
+    assert len(set(rows.tolist())) == len(rows)
+    assert len(set(cols.tolist())) == len(cols)
+    assert list(rows) == sorted(rows)
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (1, 4), (4, 1), (3, 3), (3, 5), (5, 3), (6, 6)])
+def test_hungarian_matches_brute_force(shape):
+    rng = np.random.default_rng(sum(shape))
+    for _ in range(20):
+        cost = rng.uniform(0, 100, size=shape)
+        rows, cols = _hungarian(cost)
+        _check_assignment(cost, rows, cols)
+        assert cost[rows, cols].sum() == pytest.approx(_brute_force_cost(cost))
+
+
+def test_hungarian_ties_and_invalid_pairs():
+    # Chi phí bằng nhau và cặp "không hợp lệ" (1e6) như ma trận của tracker
+    cost = np.array([[1e6, 5.0, 5.0],
+                     [5.0, 1e6, 5.0],
+                     [5.0, 5.0, 1e6]])
+    rows, cols = _hungarian(cost)
+    _check_assignment(cost, rows, cols)
+    assert cost[rows, cols].sum() == pytest.approx(15.0)
+
+
+def test_hungarian_matches_scipy():
+    scipy_optimize = pytest.importorskip("scipy.optimize")
+    rng = np.random.default_rng(7)
+    for n, m in [(10, 10), (8, 15), (15, 8), (30, 30)]:
+        cost = rng.uniform(0, 1, size=(n, m))
+        rows, cols = _hungarian(cost)
+        ref_rows, ref_cols = scipy_optimize.linear_sum_assignment(cost)
+        assert cost[rows, cols].sum() == pytest.approx(cost[ref_rows, ref_cols].sum())
+
+
+def test_solve_assignment_empty():
+    rows, cols = solve_assignment(np.empty((0, 3)))
+    assert len(rows) == len(cols) == 0
+
+
+# ---------- KalmanTracker ----------
+def _car(cx, bottom_y, w=60, h=40):
+    return {"cx": int(cx), "bottom_y": int(bottom_y),
+            "bbox": (int(cx - w / 2), int(bottom_y - h), int(cx + w / 2), int(bottom_y))}
+
+
+def test_kalman_keeps_ids_for_moving_cars():
+    tracker = KalmanTracker(dist_thresh=80, max_lost=10)
+    ids = None
+    for t in range(30):
+        # 2 làn song song, thứ tự detection đảo mỗi frame
+        dets = [_car(100 + 12 * t, 300), _car(100 + 12 * t, 500)]
+        if t % 2:
+            dets.reverse()
+        results = tracker.update(dets)
+        by_lane = {r["bottom_y"]: r["id"] for r in results}
+        if ids is None:
+            ids = by_lane
+        assert by_lane == ids
+    assert tracker.next_id == 3
+
+
+def test_kalman_keeps_id_across_predicted_frames():
+    # YOLO mỗi 3 frame, các frame giữa chỉ predict()
+    tracker = KalmanTracker(dist_thresh=80, max_lost=30)
+    track_id = None
+    for t in range(30):
+        if t % 3 == 0:
+            results = tracker.update([_car(100 + 15 * t, 400)])
+        else:
+            results = tracker.predict()
+            assert all(r["predicted"] for r in results)
+        assert len(results) == 1
+        if track_id is None:
+            track_id = results[0]["id"]
+        assert results[0]["id"] == track_id
+    # Sau vài lần ghép, vị trí dự đoán bám theo vận tốc thật (15 px/frame)
+    tracker.update([_car(100 + 15 * 30, 400)])
+    predicted = tracker.predict()[0]
+    assert abs(predicted["cx"] - (100 + 15 * 31)) <= 5
+
+
+def test_kalman_missed_track_is_not_coasted_and_ages_out():
+    tracker = KalmanTracker(dist_thresh=80, max_lost=3)
+    track_id = tracker.update([_car(200, 400)])[0]["id"]
+    tracker.update([])                      # lost = 1, YOLO không thấy track
+    assert tracker.objects[track_id]["missed"]
+    assert tracker.predict() == []          # lost = 2: không dự đoán track đã mất
+    assert tracker.predict() == []          # lost = 3
+    assert track_id in tracker.objects
+    tracker.predict()                       # lost = 4 > max_lost -> xóa
+    assert track_id not in tracker.objects
+
+
+def test_kalman_stops_coasting_after_max_coast():
+    tracker = KalmanTracker(dist_thresh=80, max_lost=10, max_coast=2)
+    track_id = tracker.update([_car(200, 400)])[0]["id"]
+    assert [r["id"] for r in tracker.predict()] == [track_id]
+    assert [r["id"] for r in tracker.predict()] == [track_id]
+    assert tracker.predict() == []          # coast = 3 > max_coast
+    # Track vẫn còn (lost <= max_lost): detection mới ở gần được ghép lại đúng ID
+    assert tracker.update([_car(205, 400)])[0]["id"] == track_id
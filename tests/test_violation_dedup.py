@@ -0,0 +1,55 @@
+from violation_dedup import RecentViolationIndex, bbox_iou
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _box(cx, bottom_y, w=40, h=30):
+    return (cx - w // 2, bottom_y - h, cx + w // 2, bottom_y)
+
+
+def test_bbox_iou():
+    assert bbox_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert bbox_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+    assert abs(bbox_iou((0, 0, 10, 10), (5, 0, 15, 10)) - 1 / 3) < 1e-9
+
+
+def test_violation_expires_after_window():
+    clock = _Clock()
+    index = RecentViolationIndex(window_sec=5.0, clock=clock)
+    index.add(1, 100, 200, _box(100, 200))
+    clock.now = 4.9
+    assert index.near(105, 200, _box(105, 200))
+    clock.now = 5.0
+    assert not index.near(105, 200, _box(105, 200))
+    assert len(index) == 0
+    assert index._cells == {}
+
+
+def test_expiry_keeps_newer_entries_in_same_cell():
+    clock = _Clock()
+    index = RecentViolationIndex(window_sec=5.0, cell_size=80, clock=clock)
+    index.add(1, 10, 30, _box(10, 30, w=16, h=16))
+    clock.now = 3.0
+    index.add(2, 60, 70, _box(60, 70, w=16, h=16))
+    clock.now = 5.5
+    assert not index.near(10, 30, _box(10, 30, w=16, h=16))
+    assert index.near(60, 70, _box(60, 70, w=16, h=16))
+    assert len(index) == 1
+    clock.now = 8.0
+    index.expire()
+    assert len(index) == 0
+
+
+def test_match_across_neighbouring_cells():
+    clock = _Clock()
+    index = RecentViolationIndex(window_sec=5.0, cell_size=80, clock=clock)
+    index.add(1, 79, 79, _box(79, 79))
+    assert index.near(85, 85, _box(85, 85))
+    # Cùng vị trí nhưng bbox không chồng nhau đủ -> không trùng
+    assert not index.near(85, 85, (200, 200, 240, 230))
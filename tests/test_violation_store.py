@@ -0,0 +1,243 @@
+"""
+Kiểm tra CsvViolationStore và SqliteViolationStore cho cùng kết quả trên cùng bộ CSV mẫu.
+"""
+import csv
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from violation_store import (CsvViolationStore, EXPORT_HEADER, REPORT_HEADER, SORT_COLUMNS,
+                             STATUS_HEADER, SqliteViolationStore)
+
+LOAI = ["Vượt đèn đỏ", "Lấn làn", "Đi ngược chiều"]
+TINH_TRANG = ["Chưa xử lý", "Đã xử lý", "Đã gửi thông báo"]
+
+
+def _make_fixture(n=80, seed=3):
+    """(report_rows, status_rows) mẫu: ngày 2 định dạng, track_id số + vài id chữ, trùng giá trị."""
+    rng = random.Random(seed)
+    start = datetime(2025, 2, 25, 6, 0, 0)
+    status, report = [], []
+    track_ids = rng.sample(range(1, 2500), n - 3) + ["x12", "x7", "y1"]
+    violation_id = 0
+    for i, track_id in enumerate(track_ids):
+        when = start + timedelta(hours=rng.randrange(0, 24 * 10))
+        if i % 3 == 0:
+            ngay = when.strftime("%d/%m/%Y")
+        else:
+            ngay = when.strftime("%Y-%m-%d %H:%M:%S")
+        if i == 5:
+            ngay = ""
+        status.append([str(track_id), ngay, rng.choice(LOAI), rng.choice(TINH_TRANG)])
+        # Vài track không có ảnh trong report, vài track có nhiều dòng (lấy dòng đầu)
+        for k in range(0 if i % 7 == 0 else 1 + (i % 4 == 0)):
+            violation_id += 1
+            report.append([
+                str(violation_id), when.strftime("%Y-%m-%d %H:%M:%S"), f"img/{track_id}_{k}.jpg",
+                str(rng.randrange(0, 600)), str(rng.randrange(0, 400)),
+                str(rng.randrange(600, 1200)), str(rng.randrange(400, 700)),
+                str(rng.randrange(0, 1200)), str(rng.randrange(0, 700)),
+                rng.choice(["trai", "giua", "phai"]), "RED", rng.choice(["RED", "GREEN"]),
+                str(track_id),
+            ])
+    return report, status
+
+
+def _write(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def fixture_data(tmp_path):
+    report, status = _make_fixture()
+    _write(tmp_path / "report.csv", REPORT_HEADER, report)
+    _write(tmp_path / "status.csv", STATUS_HEADER, status)
+    return tmp_path, report, status
+
+
+def _open(backend, folder):
+    report_csv, status_csv = str(folder / "report.csv"), str(folder / "status.csv")
+    if backend == "csv":
+        return CsvViolationStore(report_csv, status_csv).ensure()
+    return SqliteViolationStore(str(folder / "violations.db"), report_csv, status_csv).ensure()
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def store(request, fixture_data):
+    folder, report, status = fixture_data
+    s = _open(request.param, folder)
+    yield s, report, status
+    if hasattr(s, "close"):
+        s.close()
+
+
+# ---------- Kết quả mong đợi tính thẳng từ dữ liệu mẫu ----------
+def _iso(ngay):
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(ngay, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    return ngay
+
+
+def _expected(status, filters=None, order_by=None, desc=False):
+    f = {k: v for k, v in (filters or {}).items() if v}
+    rows = []
+    for i, row in enumerate(status):
+        track_id, ngay, loai, tinh_trang = row
+        iso = _iso(ngay)
+        if "tinh_trang" in f and tinh_trang != f["tinh_trang"]:
+            continue
+        if "loai_vi_pham" in f and loai != f["loai_vi_pham"]:
+            continue
+        if "track_prefix" in f and not track_id.startswith(f["track_prefix"]):
+            continue
+        if "date_from" in f and iso < f["date_from"]:
+            continue
+        if "date_to" in f and iso[:10] > f["date_to"]:
+            continue
+        rows.append((i, row, iso))
+
+    def key(item):
+        i, row, iso = item
+        if order_by is None:
+            return i
+        if order_by == "ngay_vi_pham":
+            return iso, i
+        value = row[STATUS_HEADER.index(order_by)]
+        if order_by == "track_id":
+            value = (0, int(value), "") if value.isdigit() else (1, 0, value)
+        return value, i
+
+    return [row for _, row, _ in sorted(rows, key=key, reverse=desc)]
+
+
+FILTER_CASES = [
+    None,
+    {"tinh_trang": "Đã xử lý"},
+    {"loai_vi_pham": "Lấn làn", "tinh_trang": "Chưa xử lý"},
+    {"date_from": "2025-02-28", "date_to": "2025-03-02"},
+    {"date_to": "2025-02-27"},
+    {"track_prefix": "1"},
+    {"track_prefix": "12"},
+    {"track_prefix": "x"},
+    {"track_prefix": "1", "date_from": "2025-03-01", "loai_vi_pham": "Vượt đèn đỏ"},
+    {"tinh_trang": "không có"},
+]
+
+
+def _all_pages(s, limit, **kwargs):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = s.status_page(cursor=cursor, limit=limit, **kwargs)
+        rows.extend(row for _, row in page)
+        pages += 1
+        assert pages < 1000
+        if cursor is None:
+            return rows
+
+
+# ---------- Màn hình báo cáo ----------
+@pytest.mark.parametrize("order_by, desc",
+                         [(None, False), (None, True)]
+                         + list(itertools.product(SORT_COLUMNS, (False, True))))
+@pytest.mark.parametrize("limit", [1, 7, 500])
+def test_status_page_keyset_paging(store, order_by, desc, limit):
+    s, _, status = store
+    for filters in (None, {"tinh_trang": "Chưa xử lý"}, {"track_prefix": "1"}):
+        got = _all_pages(s, limit, filters=filters, order_by=order_by, desc=desc)
+        assert got == _expected(status, filters, order_by, desc)
+
+
+@pytest.mark.parametrize("filters", FILTER_CASES)
+def test_count_status_filters(store, filters):
+    s, _, status = store
+    expected = _expected(status, filters)
+    assert s.count_status(filters) == len(expected)
+    assert _all_pages(s, 9, filters=filters) == expected
+
+
+def test_status_values(store):
+    s, _, status = store
+    assert s.status_values("tinh_trang") == sorted({r[3] for r in status})
+    assert s.status_values("loai_vi_pham") == sorted({r[2] for r in status})
+
+
+# ---------- Xuất báo cáo ----------
+def _expected_export(report, status, filters=None):
+    first = {}
+    for row in report:
+        first.setdefault(row[-1], row[:-1])
+    empty = [""] * (len(REPORT_HEADER) - 1)
+    order = {tuple(r): i for i, r in enumerate(status)}
+    rows = sorted(_expected(status, filters), key=lambda r: order[tuple(r)])
+    return [row + first.get(row[0], empty) for row in rows]
+
+
+@pytest.mark.parametrize("filters", [None, {"tinh_trang": "Đã xử lý"}, {"track_prefix": "x"}])
+@pytest.mark.parametrize("chunk_size", [4, 1000])
+def test_iter_export_rows(store, filters, chunk_size):
+    s, report, status = store
+    chunks = list(s.iter_export_rows(filters, chunk_size=chunk_size))
+    assert all(0 < len(c) <= chunk_size for c in chunks)
+    rows = [row for chunk in chunks for row in chunk]
+    assert all(len(row) == len(EXPORT_HEADER) for row in rows)
+    assert rows == _expected_export(report, status, filters)
+
+
+# ---------- Nhập CSV cũ vào SQLite ----------
+def test_import_csv_once(fixture_data):
+    folder, report, status = fixture_data
+    s = _open("sqlite", folder)       # DB mới: ensure() tự nhập 1 lần
+    assert s.count_status() == len(status)
+    # Mở lại / gọi lại với once=True: không nhập lần 2
+    again = _open("sqlite", folder)
+    assert again.import_csv(once=True) == (0, 0)
+    assert again.count_status() == len(status)
+    assert again.last_violation_id() == len(report)
+    s.close()
+    again.close()
+
+
+def test_import_csv_force_skips_existing(fixture_data):
+    folder, report, status = fixture_data
+    s = _open("sqlite", folder)
+    assert s.import_csv(skip_existing=True) == (0, 0)
+    assert s.count_status() == len(status)
+
+    # CSV có thêm dòng mới sau lần nhập trước: nhập lại chỉ lấy dòng mới
+    new_report = [[str(len(report) + 1), "2025-03-09 10:00:00", "img/9999.jpg",
+                   "1", "2", "3", "4", "5", "6", "giua", "RED", "RED", "9999"]]
+    new_status = [["9999", "09/03/2025", LOAI[0], TINH_TRANG[0]]]
+    _write(folder / "report.csv", REPORT_HEADER, report + new_report)
+    _write(folder / "status.csv", STATUS_HEADER, status + new_status)
+    assert s.import_csv(skip_existing=True) == (1, 1)
+    assert s.count_status() == len(status) + 1
+    assert s.find_image_path(9999) == "img/9999.jpg"
+    s.close()
+
+
+# ---------- Worker ----------
+def test_clear_all_keeps_violation_id(store):
+    s, report, _ = store
+    first = s.allocate_violation_ids(s.id_block_size)
+    assert first == len(report) + 1
+    s.clear_all()
+    assert s.count_status() == 0
+    assert s.allocate_violation_ids(1) == first + s.id_block_size
+
+
+def test_next_track_id_ranges(store):
+    s, _, status = store
+    numeric = [int(r[0]) for r in status if r[0].isdigit()]
+    assert s.next_track_id(1, 1000) == max(t for t in numeric if t < 1000) + 1
+    assert s.next_track_id(5000, 6000) == 5000
+    s.add_violations([], [["5100", "01/03/2025", LOAI[0], TINH_TRANG[0]]])
+    assert s.next_track_id(5000, 6000) == 5101
+    assert s.next_track_id(1, 1000) == max(t for t in numeric if t < 1000) + 1
@@ -0,0 +1,120 @@
+"""
+Ảnh thu nhỏ (thumbnail) của ảnh vi phạm, dùng cho màn hình báo cáo.
+
+- Trên đĩa: mỗi ảnh có 1 "kim tự tháp" ảnh thu nhỏ theo cạnh dài THUMB_SIZES,
+  nằm cạnh ảnh gốc: <thư mục ảnh>/thumbs/<cạnh>/<tên ảnh>.jpg
+  AsyncViolationWriter ghi sẵn lúc lưu vi phạm (write_thumbnails); ảnh cũ chưa có
+  thumbnail thì được tạo lười ở lần xem đầu tiên (ensure_thumbnail).
+- Trong bộ nhớ: LRUCache giữ các ảnh vừa xem (màn hình báo cáo giữ QPixmap).
+
+Module này không dùng Qt: việc đọc ảnh ở luồng nền do ThumbnailLoader (report.py) đảm nhận.
+"""
+import os
+import shutil
+from collections import OrderedDict
+
+import cv2
+
+THUMB_DIRNAME = "thumbs"
+# Cạnh dài (px) của từng tầng: 64 cho cột ảnh trong bảng, 512 cho màn hình chi tiết
+THUMB_SIZES = (64, 512)
+THUMB_JPEG_QUALITY = 85
+
+
+def thumb_path(image_path, size):
+    folder, name = os.path.split(image_path)
+    stem, _ = os.path.splitext(name)
+    return os.path.join(folder, THUMB_DIRNAME, str(size), f"{stem}.jpg")
+
+
+def _fit(img, size):
+    """Thu nhỏ để cạnh dài = size (không phóng to ảnh nhỏ hơn)."""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    if scale >= 1.0:
+        return img
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _write(path, img):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.jpg"
+    if not cv2.imwrite(tmp, img, [cv2.IMWRITE_JPEG_QUALITY, THUMB_JPEG_QUALITY]):
+        raise IOError(f"không ghi được {path}")
+    os.replace(tmp, path)
+
+
+def write_thumbnails(img, image_path, sizes=THUMB_SIZES):
+    """Ghi các tầng thumbnail từ ảnh đã có trong bộ nhớ (tầng nhỏ thu từ tầng lớn hơn kế tiếp)."""
+    current = img
+    for size in sorted(sizes, reverse=True):
+        current = _fit(current, size)
+        _write(thumb_path(image_path, size), current)
+
+
+def _is_fresh(path, src_mtime):
+    try:
+        return os.stat(path).st_mtime_ns >= src_mtime
+    except OSError:
+        return False
+
+
+def ensure_thumbnail(image_path, size, sizes=THUMB_SIZES):
+    """
+    Đường dẫn thumbnail cạnh size của image_path (tạo nếu chưa có / cũ hơn ảnh gốc),
+    None nếu không có ảnh gốc. Tầng nhỏ được thu từ tầng lớn hơn nếu tầng đó đã có.
+    """
+    try:
+        src_mtime = os.stat(image_path).st_mtime_ns
+    except OSError:
+        return None
+    dst = thumb_path(image_path, size)
+    if _is_fresh(dst, src_mtime):
+        return dst
+
+    source = image_path
+    for bigger in sorted(s for s in sizes if s > size):
+        candidate = thumb_path(image_path, bigger)
+        if _is_fresh(candidate, src_mtime):
+            source = candidate
+            break
+    img = cv2.imread(source)
+    if img is None:
+        return None
+    _write(dst, _fit(img, size))
+    return dst
+
+
+def clear_thumbnails(image_dir):
+    """Xóa toàn bộ thumbnail của thư mục ảnh."""
+    shutil.rmtree(os.path.join(image_dir, THUMB_DIRNAME), ignore_errors=True)
+
+
+class LRUCache:
+    """Bộ nhớ đệm giữ tối đa max_items mục dùng gần nhất."""
+
+    def __init__(self, max_items=500):
+        self.max_items = max(1, int(max_items))
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,319 @@
+"""
+Tracker gán ID xe bằng ghép cặp tối ưu (Hungarian) trên ma trận chi phí NumPy.
+
+Cùng giao diện với SimpleTracker trong redlight_violation.py:
+    update(detections) với detections = list[{'cx', 'bottom_y', 'bbox'}]
+    -> list[{'id', 'cx', 'bottom_y', 'bbox'}] (theo thứ tự detections)
+Khác SimpleTracker: mỗi track chỉ được ghép với tối đa 1 detection, nên
+không còn 2 xe tranh cùng 1 ID ở vạch dừng đông xe.
+"""
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy không bắt buộc
+    linear_sum_assignment = None
+
+# Chi phí cho cặp không hợp lệ (ngoài ngưỡng)
+_INVALID = 1e6
+
+
+def _hungarian(cost):
+    """
+    Giải bài toán ghép cặp chi phí nhỏ nhất (ma trận chữ nhật) bằng thuật toán
+    Hungarian với thế vị, O(n^2 * m). Dùng khi không có scipy.
+    return: (rows, cols) giống scipy.optimize.linear_sum_assignment
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape  # n <= m
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j]: hàng được gán cho cột j (1-based, 0 = trống)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            cand = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(cand)) + 1
+            delta = cand[j1 - 1]
+            used_idx = np.nonzero(used)[0]
+            u[p[used_idx]] += delta
+            v[used_idx] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def solve_assignment(cost):
+    """Ghép cặp tối ưu, dùng scipy nếu có."""
+    if cost.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+    return _hungarian(cost)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU từng cặp giữa 2 mảng bbox (N,4) và (M,4) dạng (x1,y1,x2,y2)."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+    return inter / union
+
+
+class HungarianTracker:
+    """
+    metric:
+      - "distance": chi phí = khoảng cách tâm (cx, bottom_y), hợp lệ nếu <= dist_thresh
+      - "iou":      chi phí = 1 - IoU bbox, hợp lệ nếu IoU >= iou_thresh
+      - "combined": hợp lệ nếu thỏa ngưỡng khoảng cách, chi phí = khoảng cách chuẩn hóa + (1 - IoU)
+    """
+    def __init__(self, dist_thresh=80, max_lost=10, metric="distance", iou_thresh=0.1):
+        if metric not in ("distance", "iou", "combined"):
+            raise ValueError(f"metric không hợp lệ: {metric}")
+        self.next_id = 1
+        self.objects = {}  # id -> {'cx','bottom_y','bbox','lost'}
+        self.dist_thresh = dist_thresh
+        self.max_lost = max_lost
+        self.metric = metric
+        self.iou_thresh = iou_thresh
+
+    def _track_positions(self, ids):
+        """Vị trí (cx, bottom_y) và bbox của các track dùng để ghép cặp."""
+        pos = np.array([[self.objects[i]["cx"], self.objects[i]["bottom_y"]] for i in ids],
+                       dtype=np.float64).reshape(-1, 2)
+        boxes = np.array([self.objects[i]["bbox"] for i in ids], dtype=np.float64).reshape(-1, 4)
+        return pos, boxes
+
+    def _cost_matrix(self, det_pos, det_boxes, trk_pos, trk_boxes):
+        """Ma trận chi phí (số detection x số track), cặp ngoài ngưỡng = _INVALID."""
+        diff = det_pos[:, None, :] - trk_pos[None, :, :]
+        dist = np.sqrt((diff ** 2).sum(axis=2))
+
+        if self.metric == "distance":
+            cost = dist
+            valid = dist <= self.dist_thresh
+        else:
+            iou = iou_matrix(det_boxes, trk_boxes)
+            if self.metric == "iou":
+                cost = 1.0 - iou
+                valid = iou >= self.iou_thresh
+            else:
+                cost = dist / max(self.dist_thresh, 1e-6) + (1.0 - iou)
+                valid = dist <= self.dist_thresh
+        return np.where(valid, cost, _INVALID)
+
+    def _match(self, detections):
+        """Trả về dict: chỉ số detection -> track id được ghép."""
+        if not detections or not self.objects:
+            return {}
+        ids = list(self.objects.keys())
+        det_pos = np.array([[d["cx"], d["bottom_y"]] for d in detections], dtype=np.float64)
+        det_boxes = np.array([d["bbox"] for d in detections], dtype=np.float64).reshape(-1, 4)
+        trk_pos, trk_boxes = self._track_positions(ids)
+
+        cost = self._cost_matrix(det_pos, det_boxes, trk_pos, trk_boxes)
+        rows, cols = solve_assignment(cost)
+        return {
+            int(r): ids[int(c)]
+            for r, c in zip(rows, cols)
+            if cost[r, c] < _INVALID
+        }
+
+    def _update_object(self, obj_id, det):
+        obj = self.objects[obj_id]
+        obj["cx"] = det["cx"]
+        obj["bottom_y"] = det["bottom_y"]
+        obj["bbox"] = det["bbox"]
+        obj["lost"] = 0
+
+    def _new_object(self, det):
+        new_id = self.next_id
+        self.next_id += 1
+        self.objects[new_id] = {
+            "cx": det["cx"],
+            "bottom_y": det["bottom_y"],
+            "bbox": det["bbox"],
+            "lost": 0,
+        }
+        return new_id
+
+    def update(self, detections):
+        """
+        detections: list[{'cx', 'bottom_y', 'bbox'}]
+        return: list[{'id', 'cx', 'bottom_y', 'bbox'}]
+        """
+        matches = self._match(detections)
+        matched_ids = set(matches.values())
+
+        results = []
+        for i, det in enumerate(detections):
+            obj_id = matches.get(i)
+            if obj_id is not None:
+                self._update_object(obj_id, det)
+            else:
+                obj_id = self._new_object(det)
+            det_with_id = det.copy()
+            det_with_id["id"] = obj_id
+            results.append(det_with_id)
+            matched_ids.add(obj_id)
+
+        to_delete = []
+        for obj_id, obj in self.objects.items():
+            if obj_id not in matched_ids:
+                obj["lost"] += 1
+                if obj["lost"] > self.max_lost:
+                    to_delete.append(obj_id)
+
+        for obj_id in to_delete:
+            del self.objects[obj_id]
+
+        return results
+
+
+class KalmanTracker(HungarianTracker):
+    """
+    HungarianTracker + bộ lọc Kalman vận tốc không đổi cho mỗi track.
+    Trạng thái [cx, bottom_y, vx, vy] (đơn vị: pixel, pixel/frame).
+
+    - update(detections): dự đoán 1 frame rồi ghép detection với vị trí dự đoán.
+    - predict(): frame không chạy YOLO -> đẩy các track đi theo vận tốc ("coast"),
+      trả về vị trí dự đoán để vẫn kiểm tra được vượt vạch.
+
+    "lost" đếm số frame (kể cả frame chỉ predict()) kể từ lần cuối track được ghép với
+    detection; quá max_lost thì track bị xóa. Khi chạy YOLO mỗi N frame, max_lost phải
+    lớn hơn N, nếu không track bị xóa trước lần YOLO kế tiếp.
+    """
+    _F = np.array([[1, 0, 1, 0],
+                   [0, 1, 0, 1],
+                   [0, 0, 1, 0],
+                   [0, 0, 0, 1]], dtype=np.float64)
+    _H = np.array([[1, 0, 0, 0],
+                   [0, 1, 0, 0]], dtype=np.float64)
+
+    def __init__(self, dist_thresh=80, max_lost=10, metric="combined", iou_thresh=0.1,
+                 process_noise=1.0, measurement_noise=10.0, max_coast=30):
+        super().__init__(dist_thresh=dist_thresh, max_lost=max_lost,
+                         metric=metric, iou_thresh=iou_thresh)
+        self._Q = np.diag([process_noise, process_noise,
+                           process_noise * 0.5, process_noise * 0.5])
+        self._R = np.eye(2) * measurement_noise
+        # Số frame tối đa được dự đoán liên tiếp mà không có detection
+        self.max_coast = max_coast
+
+    # ---------- Kalman ----------
+    def _set_from_state(self, obj):
+        cx, by = obj["x"][0], obj["x"][1]
+        w, h = obj["wh"]
+        obj["cx"] = int(round(cx))
+        obj["bottom_y"] = int(round(by))
+        obj["bbox"] = (int(round(cx - w / 2)), int(round(by - h)),
+                       int(round(cx + w / 2)), int(round(by)))
+
+    def _step(self):
+        """Dự đoán trạng thái mọi track thêm 1 frame."""
+        for obj in self.objects.values():
+            obj["x"] = self._F @ obj["x"]
+            obj["P"] = self._F @ obj["P"] @ self._F.T + self._Q
+            obj["coast"] += 1
+            self._set_from_state(obj)
+
+    def _update_object(self, obj_id, det):
+        obj = self.objects[obj_id]
+        z = np.array([det["cx"], det["bottom_y"]], dtype=np.float64)
+        P = obj["P"]
+        y = z - self._H @ obj["x"]
+        S = self._H @ P @ self._H.T + self._R
+        K = P @ self._H.T @ np.linalg.inv(S)
+        obj["x"] = obj["x"] + K @ y
+        obj["P"] = (np.eye(4) - K @ self._H) @ P
+        x1, y1, x2, y2 = det["bbox"]
+        obj["wh"] = (x2 - x1, y2 - y1)
+        obj["lost"] = 0
+        obj["coast"] = 0
+        self._set_from_state(obj)
+
+    def _new_object(self, det):
+        new_id = super()._new_object(det)
+        obj = self.objects[new_id]
+        x1, y1, x2, y2 = det["bbox"]
+        obj["x"] = np.array([det["cx"], det["bottom_y"], 0.0, 0.0], dtype=np.float64)
+        obj["P"] = np.diag([10.0, 10.0, 100.0, 100.0])
+        obj["wh"] = (x2 - x1, y2 - y1)
+        obj["coast"] = 0
+        return new_id
+
+    # ---------- API ----------
+    def update(self, detections):
+        self._step()
+        results = super().update(detections)
+        seen = {r["id"] for r in results}
+        for obj_id, obj in self.objects.items():
+            # Lần YOLO gần nhất không thấy track -> không dự đoán tiếp cho tới khi thấy lại
+            obj["missed"] = obj_id not in seen
+        return results
+
+    def predict(self):
+        """
+        Frame không có detection: dự đoán vị trí các track đang theo dõi.
+        return: list[{'id', 'cx', 'bottom_y', 'bbox', 'predicted': True}]
+        """
+        self._step()
+        results = []
+        for obj_id, obj in list(self.objects.items()):
+            obj["lost"] += 1
+            if obj["lost"] > self.max_lost:
+                del self.objects[obj_id]
+                continue
+            if obj.get("missed") or obj["coast"] > self.max_coast:
+                continue
+            results.append({
+                "id": obj_id,
+                "cx": obj["cx"],
+                "bottom_y": obj["bottom_y"],
+                "bbox": obj["bbox"],
+                "predicted": True,
+            })
+        return results
+
+    def max_speed(self):
+        """Tốc độ lớn nhất (pixel/frame) trong các track đang theo dõi."""
+        speeds = [float(np.hypot(obj["x"][2], obj["x"][3]))
+                  for obj in self.objects.values() if not obj.get("missed")]
+        return max(speeds) if speeds else 0.0
@@ -0,0 +1,236 @@
+"""
+Lớp đọc video dùng chung (thay cho cv2.VideoCapture(...).read() + cv2.resize).
+
+Mọi nguồn có cùng giao diện với cv2.VideoCapture: isOpened(), read() -> (ret, frame), release().
+Frame trả về đã ở kích thước đích (size), không cần resize lại sau khi đọc.
+
+Backend:
+- "pyav": PyAV (không bắt buộc), giải mã đa luồng (thread_type AUTO), đổi kích thước
+  ngay trong bước chuyển màu YUV -> BGR (swscale) thay vì chuyển màu ở độ phân giải gốc
+  rồi mới resize; skip_nonref=True cho phép bộ giải mã bỏ hẳn các frame không làm tham chiếu.
+- "opencv": cv2.VideoCapture, bật giải mã phần cứng nếu bản OpenCV hỗ trợ; các frame bị
+  bỏ qua (frame_stride) chỉ grab() chứ không retrieve() (không chuyển màu / copy).
+
+frame_stride > 1 không giảm công giải mã: frame bị bỏ qua vẫn được giải mã (các frame sau
+cần nó làm tham chiếu), chỉ bỏ bước chuyển màu / đổi kích thước / copy sang numpy.
+- "auto": PyAV cho file / URL nếu đã cài, camera (số thứ tự) luôn dùng OpenCV.
+
+prefetch > 0: đọc trước trên 1 luồng nền (giải mã chồng lên thời gian xử lý frame trước).
+"""
+import queue
+import threading
+
+import cv2
+
+try:
+    import av  # PyAV không bắt buộc
+except ImportError:
+    av = None
+
+BACKEND_AUTO = "auto"
+BACKEND_OPENCV = "opencv"
+BACKEND_PYAV = "pyav"
+
+
+def _fit_size(src_w, src_h, size, keep_aspect):
+    """Kích thước đầu ra: đúng size, hoặc vừa khung size nhưng giữ tỉ lệ (keep_aspect)."""
+    if size is None:
+        return None
+    w, h = int(size[0]), int(size[1])
+    if keep_aspect and src_w and src_h:
+        scale = min(w / src_w, h / src_h)
+        w, h = max(1, int(round(src_w * scale))), max(1, int(round(src_h * scale)))
+    return w, h
+
+
+# ================== OpenCV ==================
+class OpenCVVideoSource:
+    backend = BACKEND_OPENCV
+
+    def __init__(self, source, size=None, keep_aspect=False, frame_stride=1, hw_accel=True):
+        self.cap = self._open(source, hw_accel)
+        self.frame_stride = max(1, int(frame_stride))
+        src_w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+        src_h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+        self.out_size = _fit_size(src_w, src_h, size, keep_aspect)
+        self.fps = float(self.cap.get(cv2.CAP_PROP_FPS) or 0.0)
+
+    @staticmethod
+    def _open(source, hw_accel):
+        if hw_accel and isinstance(source, str) and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            cap = cv2.VideoCapture(
+                source, cv2.CAP_FFMPEG,
+                [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY],
+            )
+            if cap.isOpened():
+                return cap
+            cap.release()
+        return cv2.VideoCapture(source)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        # Frame bị bỏ qua: chỉ grab(), không retrieve()
+        for _ in range(self.frame_stride - 1):
+            if not self.cap.grab():
+                return False, None
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+        if self.out_size is not None and (frame.shape[1], frame.shape[0]) != self.out_size:
+            frame = cv2.resize(frame, self.out_size)
+        return True, frame
+
+    def release(self):
+        self.cap.release()
+
+
+# ================== PyAV ==================
+class PyAVVideoSource:
+    backend = BACKEND_PYAV
+
+    def __init__(self, source, size=None, keep_aspect=False, frame_stride=1,
+                 skip_nonref=False, threads=0):
+        if av is None:
+            raise ImportError("Chưa cài PyAV (pip install av)")
+        self.container = av.open(source)
+        self.stream = self.container.streams.video[0]
+        # Giải mã đa luồng (frame + slice)
+        self.stream.thread_type = "AUTO"
+        ctx = self.stream.codec_context
+        if threads:
+            ctx.thread_count = int(threads)
+        if skip_nonref:
+            # Bộ giải mã bỏ qua frame không làm tham chiếu (thường là B-frame)
+            ctx.skip_frame = "NONREF"
+        self.frame_stride = max(1, int(frame_stride))
+        self.out_size = _fit_size(ctx.width, ctx.height, size, keep_aspect)
+        self.fps = float(self.stream.average_rate or 0.0)
+        self._frames = self.container.decode(self.stream)
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        try:
+            # Frame bị bỏ qua vẫn phải giải mã (làm tham chiếu) nhưng không chuyển màu / đổi kích thước
+            for _ in range(self.frame_stride - 1):
+                next(self._frames)
+            frame = next(self._frames)
+            if self.out_size is not None:
+                frame = frame.reformat(width=self.out_size[0], height=self.out_size[1], format="bgr24")
+            else:
+                frame = frame.reformat(format="bgr24")
+            return True, frame.to_ndarray()
+        except StopIteration:
+            self._opened = False
+            return False, None
+        except Exception:
+            # Lỗi giải mã / mất luồng: coi như hết video, giống cv2.VideoCapture
+            self._opened = False
+            return False, None
+
+    def release(self):
+        self._opened = False
+        try:
+            self.container.close()
+        except Exception:
+            pass
+
+
+# ================== Đọc trước trên luồng nền ==================
+_END = object()
+
+
+class PrefetchVideoSource:
+    """Bọc 1 nguồn video, giải mã trước tối đa queue_size frame trên luồng nền."""
+
+    def __init__(self, inner, queue_size=2):
+        self.inner = inner
+        self.backend = inner.backend
+        self.fps = getattr(inner, "fps", 0.0)
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._stop = threading.Event()
+        self._done = False
+        self._thread = threading.Thread(target=self._loop, name="video-prefetch", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        # finally: kể cả khi inner.read() ném lỗi, read() vẫn nhận được _END thay vì chờ mãi
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.inner.read()
+                if not ret:
+                    break
+                self._put(frame)
+        finally:
+            self._put(_END)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        if item is _END:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                pass
+
+    def isOpened(self):
+        # inner đã hết (vd. PyAV gặp EOF) nhưng còn frame trong hàng đợi -> vẫn "mở"
+        return not self._done
+
+    def read(self):
+        if self._done:
+            return False, None
+        item = self._queue.get()
+        if item is _END:
+            self._done = True
+            return False, None
+        return True, item
+
+    def release(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        self.inner.release()
+
+
+def open_video_source(source, size=None, keep_aspect=False, backend=BACKEND_AUTO,
+                      frame_stride=1, prefetch=0, **kwargs):
+    """
+    Mở nguồn video (file, URL hoặc số thứ tự camera).
+    size: (w, h) kích thước frame trả về; None = giữ nguyên
+    frame_stride: chỉ trả về 1/N frame (các frame còn lại vẫn được giải mã, chỉ không
+                  chuyển màu / đổi kích thước)
+    prefetch: số frame đọc trước trên luồng nền (0 = đọc trực tiếp)
+    kwargs: tham số riêng của backend (hw_accel / skip_nonref, threads)
+    Luôn trả về 1 đối tượng, kiểm tra isOpened() như cv2.VideoCapture.
+    """
+    is_camera = not isinstance(source, str)
+    if backend == BACKEND_AUTO:
+        backend = BACKEND_PYAV if (av is not None and not is_camera) else BACKEND_OPENCV
+
+    src = None
+    if backend == BACKEND_PYAV and not is_camera:
+        pyav_kwargs = {k: v for k, v in kwargs.items() if k in ("skip_nonref", "threads")}
+        try:
+            src = PyAVVideoSource(source, size=size, keep_aspect=keep_aspect,
+                                  frame_stride=frame_stride, **pyav_kwargs)
+        except Exception:
+            # PyAV không mở được (chưa cài, định dạng lạ...) -> dùng OpenCV
+            src = None
+    if src is None:
+        cv_kwargs = {k: v for k, v in kwargs.items() if k == "hw_accel"}
+        src = OpenCVVideoSource(source, size=size, keep_aspect=keep_aspect,
+                                frame_stride=frame_stride, **cv_kwargs)
+
+    if prefetch and src.isOpened():
+        src = PrefetchVideoSource(src, queue_size=prefetch)
+    return src
@@ -0,0 +1,93 @@
+"""
+Khử trùng vi phạm theo không gian + thời gian ("gần đây đã chụp xe ở chỗ này chưa?").
+
+Lưới băm không gian: mỗi ô cell_size x cell_size px (theo cx, bottom_y) giữ các
+vi phạm còn hiệu lực trong ô đó -> mỗi lần tra chỉ xét 3x3 ô lân cận thay vì
+toàn bộ danh sách.
+Hết hạn: các vi phạm nằm trong 1 hàng đợi vòng theo thứ tự thời gian
+(time.monotonic), chỉ cần bỏ dần phần tử ở đầu -> không dựng lại danh sách
+mỗi frame, cửa sổ khử trùng có thể kéo dài vài phút mà chi phí tra gần như không đổi.
+"""
+import time
+from collections import deque
+
+
+def bbox_iou(b1, b2):
+    """Tính IoU giữa 2 bbox (x1,y1,x2,y2)."""
+    x1 = max(b1[0], b2[0])
+    y1 = max(b1[1], b2[1])
+    x2 = min(b1[2], b2[2])
+    y2 = min(b1[3], b2[3])
+
+    inter_w = max(0, x2 - x1)
+    inter_h = max(0, y2 - y1)
+    inter = inter_w * inter_h
+    if inter == 0:
+        return 0.0
+
+    area1 = (b1[2] - b1[0]) * (b1[3] - b1[1])
+    area2 = (b2[2] - b2[0]) * (b2[3] - b2[1])
+    union = max(1e-6, area1 + area2 - inter)
+    return inter / union
+
+
+class RecentViolationIndex:
+    def __init__(self, window_sec=5.0, cell_size=80, clock=time.monotonic):
+        """
+        window_sec: thời gian 1 vi phạm còn được dùng để khử trùng
+        cell_size: kích thước ô lưới (px), nên >= ngưỡng khoảng cách khi tra
+        """
+        self.window_sec = float(window_sec)
+        self.cell_size = max(1, int(cell_size))
+        self.clock = clock
+
+        self._cells = {}      # (gx, gy) -> deque các entry, cũ nhất ở đầu
+        self._ring = deque()  # (thời điểm, ô) theo thứ tự thêm vào
+
+    def _cell(self, cx, bottom_y):
+        return int(cx) // self.cell_size, int(bottom_y) // self.cell_size
+
+    def __len__(self):
+        return len(self._ring)
+
+    def expire(self, now=None):
+        """Bỏ các vi phạm đã quá window_sec (chỉ xét đầu hàng đợi)."""
+        now = self.clock() if now is None else now
+        ring = self._ring
+        while ring and now - ring[0][0] >= self.window_sec:
+            _, key = ring.popleft()
+            # Trong mỗi ô các entry cũng theo thứ tự thời gian -> entry cũ nhất nằm ở đầu
+            cell = self._cells[key]
+            cell.popleft()
+            if not cell:
+                del self._cells[key]
+
+    def add(self, track_id, cx, bottom_y, bbox):
+        now = self.clock()
+        key = self._cell(cx, bottom_y)
+        self._cells.setdefault(key, deque()).append({
+            "track_id": track_id,
+            "cx": cx,
+            "bottom_y": bottom_y,
+            "bbox": bbox,
+            "time": now,
+        })
+        self._ring.append((now, key))
+
+    def near(self, cx, bottom_y, bbox, pos_threshold=80, iou_threshold=0.3):
+        """
+        True nếu đã có vi phạm gần đây trùng với vi phạm này:
+        - gần về tâm (cx, bottom_y) (< pos_threshold px theo mỗi trục)
+        - IoU bbox > iou_threshold
+        """
+        self.expire()
+        gx, gy = self._cell(cx, bottom_y)
+        reach = -(-int(pos_threshold) // self.cell_size)  # số ô cần xét mỗi phía
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                for v in self._cells.get((gx + dx, gy + dy), ()):
+                    if (abs(cx - v["cx"]) < pos_threshold
+                            and abs(bottom_y - v["bottom_y"]) < pos_threshold
+                            and bbox_iou(bbox, v["bbox"]) > iou_threshold):
+                        return True
+        return False
@@ -0,0 +1,1090 @@
+"""
+Kho lưu vi phạm dùng chung cho DetectWorker (ghi) và ReportDialog (đọc/sửa).
+
+- SqliteViolationStore (mặc định): violations/violations.db, chế độ WAL,
+  index theo track_id, thời gian và tình trạng -> thao tác trên màn hình báo cáo
+  không còn tốn O(kích thước file).
+- CsvViolationStore: giữ nguyên cách lưu cũ bằng report.csv / status.csv,
+  kèm file phụ store_meta.json (id cuối, track_id lớn nhất theo dải, kích thước 2 file
+  CSV) để worker khởi động không phải đọc lại toàn bộ lịch sử.
+
+Chuyển dữ liệu CSV cũ sang SQLite (tự chạy 1 lần khi tạo DB mới, hoặc chạy tay):
+    python violation_store.py import
+"""
+import os
+import io
+import csv
+import json
+import sqlite3
+import bisect
+import itertools
+import threading
+import argparse
+from datetime import datetime, timedelta
+
+VIOLATION_DIR = "violations"
+REPORT_CSV = os.path.join(VIOLATION_DIR, "report.csv")
+STATUS_CSV = os.path.join(VIOLATION_DIR, "status.csv")
+META_JSON = os.path.join(VIOLATION_DIR, "store_meta.json")
+DB_PATH = os.path.join(VIOLATION_DIR, "violations.db")
+
+# Backend mặc định: "sqlite" hoặc "csv"
+STORE_BACKEND = "sqlite"
+
+# Độ rộng 1 dải track_id: dải [1, TRACK_ID_STRIDE) cho worker đơn lẻ (GUI, batch),
+# supervisor cấp các dải sau cho từng camera
+TRACK_ID_STRIDE = 10_000_000
+
+# Số dòng mỗi trang khi màn hình báo cáo đọc dần (status_page)
+PAGE_SIZE = 500
+
+# Bộ lọc màn hình báo cáo (dict, key nào rỗng / không có thì bỏ qua):
+#   date_from, date_to: ngày "YYYY-mm-dd" (tính cả 2 đầu)
+#   tinh_trang, loai_vi_pham: so khớp đúng
+#   track_prefix: track_id bắt đầu bằng chuỗi này
+FILTER_KEYS = ("date_from", "date_to", "tinh_trang", "loai_vi_pham", "track_prefix")
+
+# Cột có thể sắp xếp -> cột trong bảng status (ngày sắp theo dạng ISO)
+SORT_COLUMNS = {
+    "track_id": "track_id",
+    "ngay_vi_pham": "ngay_iso",
+    "loai_vi_pham": "loai_vi_pham",
+    "tinh_trang": "tinh_trang",
+}
+
+REPORT_HEADER = [
+    "id", "timestamp", "image_path",
+    "x1", "y1", "x2", "y2", "cx", "bottom_y",
+    "lane", "light_right", "light_left", "track_id"
+]
+STATUS_HEADER = ["track_id", "ngay_vi_pham", "loai_vi_pham", "tinh_trang"]
+# Dòng xuất báo cáo chi tiết: status + dòng report đầu tiên cùng track_id
+EXPORT_HEADER = STATUS_HEADER + [c for c in REPORT_HEADER if c != "track_id"]
+_EXPORT_REPORT_COLS = [c for c in REPORT_HEADER if c != "track_id"]
+
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+
+
+def to_iso_date(text):
+    """Chuyển ngày vi phạm (dd/mm/YYYY, YYYY-mm-dd HH:MM:SS, ...) sang chuỗi ISO để sắp xếp/lọc."""
+    text = (text or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    return text
+
+
+def _next_day(date_text):
+    """'YYYY-mm-dd' -> ngày hôm sau (cùng định dạng)."""
+    return (datetime.strptime(date_text[:10], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def _active_filters(filters):
+    return {k: str(v).strip() for k, v in (filters or {}).items()
+            if k in FILTER_KEYS and v is not None and str(v).strip()}
+
+
+def _status_matcher(filters):
+    """Hàm kiểm tra 1 dòng status [track_id, ngay, loai, tinh_trang] có thỏa bộ lọc (dùng cho CSV)."""
+    f = _active_filters(filters)
+    date_to = _next_day(f["date_to"]) if "date_to" in f else None
+
+    def match(row, iso=None):
+        track_id, ngay, loai, tinh_trang = row
+        if "tinh_trang" in f and tinh_trang != f["tinh_trang"]:
+            return False
+        if "loai_vi_pham" in f and loai != f["loai_vi_pham"]:
+            return False
+        if "track_prefix" in f and not track_id.startswith(f["track_prefix"]):
+            return False
+        if "date_from" in f or date_to:
+            iso = iso if iso is not None else to_iso_date(ngay)
+            if "date_from" in f and iso < f["date_from"]:
+                return False
+            if date_to and iso >= date_to:
+                return False
+        return True
+    return match
+
+
+def _pad(row, n):
+    row = list(row)[:n]
+    return row + [""] * (n - len(row))
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def file_signature(path):
+    """(mtime, kích thước) của file, None nếu chưa có: đổi là file đã bị ghi."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def tail_last_row(path, chunk_size=4096):
+    """Đọc dòng CSV cuối cùng bằng cách seek từ cuối file (không đọc cả file)."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        size = min(chunk_size, end)
+        while True:
+            f.seek(end - size)
+            data = f.read(size)
+            lines = data.splitlines()
+            # Dòng đầu của đoạn đọc có thể bị cắt giữa chừng (trừ khi đã đọc tới đầu file)
+            complete = lines if size == end else lines[1:]
+            for line in reversed(complete):
+                if line.strip():
+                    rows = list(csv.reader(io.StringIO(line.decode("utf-8", errors="replace"))))
+                    return rows[0] if rows else None
+            if size == end:
+                return None
+            size = min(size * 4, end)
+
+
+# ================== CSV (cách lưu cũ) ==================
+class CsvViolationStore:
+    """
+    report.csv + status.csv; mọi thao tác sửa/xóa ghi lại cả file như trước.
+
+    store_meta.json chỉ lưu id cuối, track_id lớn nhất của từng dải đã hỏi qua
+    next_track_id và kích thước 2 file CSV lúc cập nhật (số dải = số camera / luồng, không
+    tăng theo lịch sử). Nếu kích thước không khớp (CSV bị sửa ngoài chương trình) thì dựng
+    lại id cuối bằng tail-seek, các dải được tính lại khi hỏi tới.
+
+    Tập track_id đã vi phạm (has_violated) chỉ được dựng khi cần, bằng 1 lần quét
+    status.csv, rồi giữ trong bộ nhớ. Worker không cần tới tập này: ID tracker cấp luôn
+    lớn hơn track_id đã lưu trong dải của nó (xem ViolatedTrackIds).
+
+    Màn hình báo cáo: status.csv (kèm ngày ISO) và chỉ mục track_id -> image_path của
+    report.csv được giữ trong bộ nhớ, chỉ đọc lại khi (mtime, kích thước) file đổi;
+    các dòng do chính store này ghi thêm được cập nhật thẳng vào cache.
+    """
+    backend = "csv"
+    id_block_size = 1
+    # key = chỉ số dòng -> xóa 1 dòng làm đổi key các dòng sau
+    stable_keys = False
+
+    def __init__(self, report_csv=REPORT_CSV, status_csv=STATUS_CSV, meta_json=None):
+        self.report_csv = report_csv
+        self.status_csv = status_csv
+        self.meta_json = meta_json or os.path.join(os.path.dirname(status_csv), "store_meta.json")
+        self._lock = threading.Lock()
+        self._last_id = None
+        self._meta = None
+        self._status_cache = None   # (chữ ký file, [(key, row, ngày ISO)])
+        self._track_cache = None    # (chữ ký file, {track_id (int) đã vi phạm})
+        self._image_index = None    # (chữ ký file, {track_id: image_path}, (vị trí track_id, vị trí image_path))
+
+    def ensure(self):
+        """Tạo thư mục và 2 file CSV (report, status) nếu chưa có."""
+        for path, header in ((self.report_csv, REPORT_HEADER), (self.status_csv, STATUS_HEADER)):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if not os.path.exists(path):
+                self._write_csv(path, header, [])
+        return self
+
+    @staticmethod
+    def _read_body(path):
+        if not os.path.exists(path):
+            return [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            return [], []
+        return rows[0], rows[1:]
+
+    @staticmethod
+    def _write_csv(path, header, rows):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    @staticmethod
+    def _append_csv(path, rows):
+        with open(path, mode="a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+
+    # ---------- File phụ store_meta.json ----------
+    def _csv_sizes(self):
+        return [os.path.getsize(p) if os.path.exists(p) else 0
+                for p in (self.report_csv, self.status_csv)]
+
+    def _load_meta(self):
+        """Đọc store_meta.json; dựng lại nếu thiếu hoặc không khớp với 2 file CSV."""
+        if self._meta is not None:
+            return self._meta
+        meta = None
+        floor = 0
+        try:
+            with open(self.meta_json, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("sizes") != self._csv_sizes():
+                floor = int(meta.get("last_violation_id", 0))
+                meta = None
+            else:
+                # File cũ còn danh sách track_ids: không dùng nữa
+                meta.pop("track_ids", None)
+        except (OSError, ValueError, AttributeError, TypeError):
+            meta = None
+        if meta is None:
+            meta = self._rebuild_meta(floor)
+        self._meta = meta
+        return meta
+
+    def _rebuild_meta(self, floor=0):
+        # floor: id cuối trong meta cũ -> không lùi id đã cấp (vd. report.csv rỗng sau clear_all)
+        last = max(floor, _to_int((tail_last_row(self.report_csv) or [None])[0]) or 0)
+        meta = {"last_violation_id": last}
+        self._save_meta(meta)
+        return meta
+
+    def _save_meta(self, meta):
+        meta["sizes"] = self._csv_sizes()
+        tmp = self.meta_json + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self.meta_json)
+        except OSError:
+            pass
+        self._meta = meta
+
+    # ---------- Worker ----------
+    def last_violation_id(self):
+        """id cuối cùng đã ghi (đọc từ store_meta.json, không đọc report.csv)."""
+        return int(self._load_meta().get("last_violation_id", 0))
+
+    def allocate_violation_ids(self, n=1):
+        """Cấp n id liên tiếp cho report, trả về id đầu tiên."""
+        with self._lock:
+            if self._last_id is None:
+                self._last_id = self.last_violation_id()
+            first = self._last_id + 1
+            self._last_id += n
+            return first
+
+    def violated_track_ids(self):
+        """Tập track_id (int) đã có trong status.csv."""
+        with self._lock:
+            return set(self._load_track_ids())
+
+    def has_violated(self, track_id):
+        with self._lock:
+            return track_id in self._load_track_ids()
+
+    def _load_track_ids(self):
+        """Tập track_id của status.csv (quét file 1 lần, đọc lại chỉ khi file đổi ngoài store)."""
+        sig = file_signature(self.status_csv)
+        cache = self._track_cache
+        if cache is not None and cache[0] == sig:
+            return cache[1]
+        track_ids = set()
+        if sig is not None:
+            with open(self.status_csv, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                for row in reader:
+                    tid = _to_int(row[0]) if row else None
+                    if tid is not None:
+                        track_ids.add(tid)
+        self._track_cache = (sig, track_ids)
+        return track_ids
+
+    def add_violations(self, report_rows, status_rows):
+        """Ghi thêm (append) các dòng vi phạm và cập nhật store_meta.json."""
+        with self._lock:
+            meta = self._load_meta()
+            sigs = (file_signature(self.report_csv), file_signature(self.status_csv))
+            if report_rows:
+                self._append_csv(self.report_csv, report_rows)
+            if status_rows:
+                self._append_csv(self.status_csv, status_rows)
+            self._append_to_caches(sigs, report_rows, status_rows)
+            ids = [i for i in (_to_int(r[0]) for r in report_rows if r) if i is not None]
+            if ids:
+                meta["last_violation_id"] = max([meta.get("last_violation_id", 0)] + ids)
+            self._raise_track_ranges(meta, status_rows)
+            self._save_meta(meta)
+
+    @staticmethod
+    def _raise_track_ranges(meta, status_rows):
+        """Nâng track_id lớn nhất của các dải trong meta theo các dòng status mới."""
+        ranges = meta.get("track_ranges")
+        if not ranges or not status_rows:
+            return
+        track_ids = [t for t in (_to_int(r[0]) for r in status_rows if r) if t is not None]
+        for entry in ranges:
+            lo, hi, top = entry
+            for t in track_ids:
+                if t > top and t >= lo and (hi is None or t < hi):
+                    top = t
+            entry[2] = top
+
+    # ---------- Màn hình báo cáo ----------
+    def status_rows(self):
+        """list[(key, [track_id, ngay_vi_pham, loai_vi_pham, tinh_trang])], key = chỉ số dòng."""
+        _, body = self._read_body(self.status_csv)
+        return [(i, _pad(r, 4)) for i, r in enumerate(body) if len(r) >= 4]
+
+    # ---------- Cache theo chữ ký file ----------
+    def _status_entries(self):
+        """[(key, row, ngày ISO)] của status.csv, đọc lại chỉ khi file đổi."""
+        with self._lock:
+            return self._load_status_entries()
+
+    def _load_status_entries(self):
+        sig = file_signature(self.status_csv)
+        cache = self._status_cache
+        if cache is not None and cache[0] == sig:
+            return cache[1]
+        entries = []
+        if sig is not None:
+            with open(self.status_csv, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                for i, r in enumerate(reader):
+                    if len(r) >= 4:
+                        row = _pad(r, 4)
+                        entries.append((i, row, to_iso_date(row[1])))
+        self._status_cache = (sig, entries)
+        return entries
+
+    def _image_lookup(self):
+        """Chỉ mục track_id -> image_path (dòng đầu tiên của track) của report.csv."""
+        with self._lock:
+            return self._load_image_index()
+
+    def _load_image_index(self):
+        sig = file_signature(self.report_csv)
+        cache = self._image_index
+        if cache is not None and cache[0] == sig:
+            return cache[1]
+        index, cols = {}, None
+        if sig is not None:
+            with open(self.report_csv, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                header = next(reader, None) or []
+                if "track_id" in header:
+                    cols = (header.index("track_id"),
+                            header.index("image_path") if "image_path" in header else 2)
+                    for r in reader:
+                        self._index_report_row(index, cols, r)
+        self._image_index = (sig, index, cols)
+        return index
+
+    @staticmethod
+    def _index_report_row(index, cols, row):
+        track_idx, img_idx = cols
+        if len(row) > track_idx and row[track_idx] not in index:
+            index[row[track_idx]] = row[img_idx] if len(row) > img_idx else ""
+
+    def _append_to_caches(self, sigs, report_rows, status_rows):
+        """Dòng vừa ghi thêm: cập nhật cache (nếu cache đang khớp file trước khi ghi)."""
+        report_sig, status_sig = sigs
+        cache = self._image_index
+        if report_rows and cache is not None and cache[0] == report_sig and cache[2] is not None:
+            for r in report_rows:
+                self._index_report_row(cache[1], cache[2], [str(v) for v in _pad(r, len(REPORT_HEADER))])
+            self._image_index = (file_signature(self.report_csv), cache[1], cache[2])
+        cache = self._status_cache
+        if status_rows and cache is not None and cache[0] == status_sig:
+            entries = cache[1]
+            # key = chỉ số dòng trong thân file (kể cả dòng lỗi) -> tiếp sau dòng cuối
+            next_key = entries[-1][0] + 1 if entries else self._count_body_rows()
+            for r in status_rows:
+                row = [str(v) for v in _pad(r, 4)]
+                entries.append((next_key, row, to_iso_date(row[1])))
+                next_key += 1
+            self._status_cache = (file_signature(self.status_csv), entries)
+        cache = self._track_cache
+        if status_rows and cache is not None and cache[0] == status_sig:
+            cache[1].update(t for t in (_to_int(r[0]) for r in status_rows if r) if t is not None)
+            self._track_cache = (file_signature(self.status_csv), cache[1])
+
+    def _count_body_rows(self):
+        _, body = self._read_body(self.status_csv)
+        return len(body)
+
+    def _iter_status(self):
+        """(key, row) của các dòng status hợp lệ."""
+        for key, row, _ in self._status_entries():
+            yield key, row
+
+    def count_status(self, filters=None):
+        match = _status_matcher(filters)
+        return sum(1 for _, row, iso in self._status_entries() if match(row, iso))
+
+    def status_page(self, cursor=None, limit=PAGE_SIZE, filters=None, order_by=None, desc=False):
+        """
+        1 trang dòng status thỏa bộ lọc, trả về (rows, cursor trang sau hoặc None nếu hết).
+        CSV không có index: mỗi trang lọc lại toàn bộ dòng (trong cache bộ nhớ).
+        """
+        match = _status_matcher(filters)
+        entries = [(k, r, iso) for k, r, iso in self._status_entries() if match(r, iso)]
+        rows = ((k, r) for k, r, _ in entries)
+        if order_by is None and not desc:
+            start = -1 if cursor is None else cursor
+            page = list(itertools.islice((kr for kr in rows if kr[0] > start), limit))
+            next_cursor = page[-1][0] if len(page) == limit else None
+            return page, next_cursor
+
+        col = STATUS_HEADER.index(order_by) if order_by else None
+        isos = {k: iso for k, _, iso in entries} if order_by == "ngay_vi_pham" else None
+
+        def sort_key(kr):
+            if col is None:
+                return kr[0]
+            value = kr[1][col]
+            if isos is not None:
+                value = isos[kr[0]]
+            elif order_by == "track_id":
+                # số trước, chuỗi sau (giống SQLite)
+                n = _to_int(value)
+                value = (0, n, "") if n is not None else (1, 0, value)
+            return value, kr[0]
+
+        ordered = sorted(rows, key=sort_key, reverse=desc)
+        start = 0
+        if cursor is not None:
+            keys = [sort_key(kr) for kr in ordered]
+            start = next((i for i, k in enumerate(keys)
+                          if (k < cursor if desc else k > cursor)), len(ordered))
+        page = ordered[start:start + limit]
+        next_cursor = sort_key(page[-1]) if len(page) == limit else None
+        return page, next_cursor
+
+    def status_values(self, column):
+        """Các giá trị khác nhau của 1 cột (tinh_trang / loai_vi_pham) cho ô lọc."""
+        col = STATUS_HEADER.index(column)
+        return sorted({row[col] for _, row in self._iter_status() if row[col]})
+
+    def status_row(self, key):
+        entries = self._status_entries()
+        i = bisect.bisect_left(entries, (key,))
+        if i < len(entries) and entries[i][0] == key:
+            return entries[i][1]
+        return None
+
+    def next_track_id(self, lo=1, hi=None):
+        """
+        track_id lớn nhất trong dải [lo, hi) + 1 (hoặc lo nếu dải còn trống).
+        Lần đầu hỏi 1 dải thì quét status.csv, sau đó đọc/cập nhật trong store_meta.json.
+        """
+        with self._lock:
+            meta = self._load_meta()
+            ranges = meta.setdefault("track_ranges", [])
+            for entry_lo, entry_hi, top in ranges:
+                if entry_lo == lo and entry_hi == hi:
+                    return top + 1
+            top = lo - 1
+            for v in self._load_track_ids():
+                if v > top and (hi is None or v < hi):
+                    top = v
+            ranges.append([lo, hi, top])
+            self._save_meta(meta)
+            return top + 1
+
+    def add_status(self, row):
+        """Thêm 1 dòng status. CSV không trả về key (phải đọc lại để biết chỉ số dòng)."""
+        self.add_violations([], [_pad(row, 4)])
+        return None
+
+    def update_status(self, key, row):
+        with self._lock:
+            _, body = self._read_body(self.status_csv)
+            if 0 <= key < len(body):
+                body[key] = _pad(row, 4)
+                self._write_csv(self.status_csv, STATUS_HEADER, body)
+                meta = self._load_meta()
+                self._raise_track_ranges(meta, [body[key]])
+                self._save_meta(meta)
+
+    def delete_status(self, key):
+        """Xóa 1 dòng status và các dòng report.csv có cùng track_id."""
+        with self._lock:
+            _, body = self._read_body(self.status_csv)
+            if not (0 <= key < len(body)):
+                return
+            removed = body.pop(key)
+            self._write_csv(self.status_csv, STATUS_HEADER, body)
+
+            track_id = removed[0] if removed else ""
+            header, report = self._read_body(self.report_csv)
+            if track_id and header and "track_id" in header:
+                track_idx = header.index("track_id")
+                kept = [r for r in report if not (len(r) > track_idx and r[track_idx] == track_id)]
+                self._write_csv(self.report_csv, header, kept)
+            # id cuối giữ nguyên để không cấp lại id đã dùng
+            self._save_meta(self._load_meta())
+
+    def find_image_path(self, track_id):
+        """image_path trong report.csv theo track_id (tra chỉ mục trong bộ nhớ)."""
+        return self._image_lookup().get(str(track_id), "")
+
+    def clear_all(self):
+        """Xóa mọi dòng; id cuối đã cấp giữ nguyên để worker đang chạy không cấp lại id cũ."""
+        with self._lock:
+            last = max(self._last_id or 0, self.last_violation_id())
+            self._write_csv(self.status_csv, STATUS_HEADER, [])
+            self._write_csv(self.report_csv, REPORT_HEADER, [])
+            self._save_meta({"last_violation_id": last})
+
+    def export_status_csv(self, path):
+        with open(self.status_csv, newline="", encoding="utf-8") as src, \
+                open(path, "w", newline="", encoding="utf-8") as dst:
+            for line in src:
+                dst.write(line)
+
+    def _report_offsets(self):
+        """
+        1 lần đọc tuần tự report.csv: (vị trí các cột _EXPORT_REPORT_COLS trong file,
+        {track_id: vị trí byte của dòng report đầu tiên của track}). Không giữ nội dung dòng.
+        """
+        offsets = {}
+        if not os.path.exists(self.report_csv):
+            return None, offsets
+        with open(self.report_csv, "rb") as f:
+            header = next(csv.reader([f.readline().decode("utf-8-sig")]), [])
+            if "track_id" not in header:
+                return None, offsets
+            track_idx = header.index("track_id")
+            cols = [header.index(c) if c in header else None for c in _EXPORT_REPORT_COLS]
+            pos = f.tell()
+            for line in f:
+                row = next(csv.reader([line.decode("utf-8", errors="replace")]), None)
+                if row and len(row) > track_idx and row[track_idx] not in offsets:
+                    offsets[row[track_idx]] = pos
+                pos += len(line)
+        return cols, offsets
+
+    def iter_export_rows(self, filters=None, chunk_size=PAGE_SIZE):
+        """
+        Các dòng EXPORT_HEADER (status thỏa bộ lọc + dòng report đầu tiên cùng track_id),
+        trả về theo từng khối chunk_size dòng, nối với report ngay trong lúc đọc.
+
+        CSV không có index nên bộ nhớ không phải O(1) như SQLite: status.csv vốn đã nằm trong
+        cache của màn hình báo cáo, còn report.csv cần chỉ mục track_id -> vị trí byte
+        (O(số track), dựng bằng 1 lần đọc tuần tự). Nội dung dòng report chỉ được đọc
+        (seek) cho từng khối đang xuất, không nạp cả file.
+        """
+        match = _status_matcher(filters)
+        cols, offsets = self._report_offsets()
+        empty = [""] * len(_EXPORT_REPORT_COLS)
+        report = open(self.report_csv, "rb") if offsets else None
+        try:
+            def detail(track_id):
+                pos = offsets.get(track_id)
+                if pos is None:
+                    return empty
+                report.seek(pos)
+                row = next(csv.reader([report.readline().decode("utf-8", errors="replace")]), [])
+                return [row[i] if i is not None and i < len(row) else "" for i in cols]
+
+            chunk = []
+            for _, row, iso in self._status_entries():
+                if not match(row, iso):
+                    continue
+                chunk.append(row + detail(row[0]))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            if report is not None:
+                report.close()
+
+
+# ================== SQLite ==================
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS report (
+    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER,
+    timestamp TEXT,
+    image_path TEXT,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    cx INTEGER, bottom_y INTEGER,
+    lane TEXT, light_right TEXT, light_left TEXT,
+    track_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_report_track_id ON report(track_id);
+CREATE INDEX IF NOT EXISTS idx_report_timestamp ON report(timestamp);
+CREATE INDEX IF NOT EXISTS idx_report_id ON report(id);
+
+CREATE TABLE IF NOT EXISTS status (
+    key INTEGER PRIMARY KEY AUTOINCREMENT,
+    track_id INTEGER,
+    ngay_vi_pham TEXT,
+    ngay_iso TEXT,
+    loai_vi_pham TEXT,
+    tinh_trang TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_status_track_id ON status(track_id);
+CREATE INDEX IF NOT EXISTS idx_status_ngay_iso ON status(ngay_iso);
+CREATE INDEX IF NOT EXISTS idx_status_tinh_trang ON status(tinh_trang);
+CREATE INDEX IF NOT EXISTS idx_status_tinh_trang_ngay ON status(tinh_trang, ngay_iso);
+CREATE INDEX IF NOT EXISTS idx_status_loai_ngay ON status(loai_vi_pham, ngay_iso);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_REPORT_COLS = ", ".join(REPORT_HEADER)
+
+
+class SqliteViolationStore:
+    """SQLite WAL; mỗi luồng dùng 1 kết nối riêng, nhiều tiến trình dùng chung 1 file an toàn."""
+    backend = "sqlite"
+    # Worker xin id theo khối để không phải ghi DB mỗi lần có vi phạm
+    id_block_size = 20
+    stable_keys = True
+
+    def __init__(self, db_path=DB_PATH, report_csv=REPORT_CSV, status_csv=STATUS_CSV):
+        self.db_path = db_path
+        self.report_csv = report_csv
+        self.status_csv = status_csv
+        self._local = threading.local()
+
+    # ---------- Kết nối ----------
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def ensure(self):
+        """
+        Tạo bảng/index; nếu DB mới và còn CSV cũ thì nhập 1 lần.
+        Nhiều tiến trình cùng mở 1 DB mới (supervisor): chỉ tiến trình giành được khóa
+        ghi đầu tiên nhập, các tiến trình sau thấy csv_imported và bỏ qua.
+        """
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        if self._get_meta("csv_imported") is None:
+            self.import_csv(once=True)
+        return self
+
+    def _get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    # ---------- Nhập CSV cũ ----------
+    def import_csv(self, report_csv=None, status_csv=None, skip_existing=False, once=False):
+        """
+        Nhập report.csv / status.csv vào DB (1 giao dịch). Trả về (số report, số status).
+        skip_existing=True (nhập lại): bỏ qua dòng đã có trong DB - report theo id,
+        status theo (track_id, ngày, loại vi phạm) -> nhập lại không nhân đôi lịch sử.
+        once=True: không nhập nếu DB đã ghi csv_imported (kiểm tra lại sau khi giữ khóa ghi).
+        """
+        report_csv = report_csv or self.report_csv
+        status_csv = status_csv or self.status_csv
+        n_report = n_status = 0
+        report_sql = f"INSERT INTO report ({_REPORT_COLS}) VALUES ({', '.join('?' * len(REPORT_HEADER))})"
+        status_sql = ("INSERT INTO status (track_id, ngay_vi_pham, ngay_iso, loai_vi_pham, tinh_trang) "
+                      "VALUES (?, ?, ?, ?, ?)")
+        if skip_existing:
+            report_sql = (f"INSERT INTO report ({_REPORT_COLS}) "
+                          f"SELECT {', '.join('?' * len(REPORT_HEADER))} "
+                          "WHERE NOT EXISTS (SELECT 1 FROM report WHERE id IS ?)")
+            status_sql = ("INSERT INTO status (track_id, ngay_vi_pham, ngay_iso, loai_vi_pham, tinh_trang) "
+                          "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM status "
+                          "WHERE track_id IS ? AND ngay_vi_pham IS ? AND loai_vi_pham IS ?)")
+        conn = self._conn()
+        # BEGIN IMMEDIATE: giữ khóa ghi ngay từ đầu -> kiểm tra + nhập là 1 thao tác nguyên tử
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if once and self._get_meta("csv_imported") is not None:
+                conn.execute("ROLLBACK")
+                return 0, 0
+            if os.path.exists(report_csv):
+                with open(report_csv, newline="", encoding="utf-8") as f:
+                    reader = csv.reader(f)
+                    header = next(reader, None) or []
+                    idx = [header.index(c) if c in header else None for c in REPORT_HEADER]
+                    id_pos = REPORT_HEADER.index("id")
+                    rows = (
+                        [r[i] if i is not None and i < len(r) else None for i in idx]
+                        for r in reader if r
+                    )
+                    if skip_existing:
+                        rows = (row + [row[id_pos]] for row in rows)
+                    cur = conn.executemany(report_sql, rows)
+                    n_report = cur.rowcount
+            if os.path.exists(status_csv):
+                with open(status_csv, newline="", encoding="utf-8") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)
+                    rows = (self._status_params(r) for r in reader if len(r) >= 4)
+                    if skip_existing:
+                        rows = (p + (p[0], p[1], p[3]) for p in rows)
+                    cur = conn.executemany(status_sql, rows)
+                    n_status = cur.rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_imported', ?)",
+                (datetime.now().isoformat(timespec="seconds"),),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return max(0, n_report), max(0, n_status)
+
+    @staticmethod
+    def _status_params(row):
+        track_id, ngay, loai, tinh_trang = _pad(row, 4)
+        return (track_id, ngay, to_iso_date(ngay), loai, tinh_trang)
+
+    # ---------- Worker ----------
+    def last_violation_id(self):
+        row = self._conn().execute("SELECT MAX(id) FROM report").fetchone()
+        last = int(row[0]) if row and row[0] is not None else 0
+        reserved = int(self._get_meta("last_violation_id", 0) or 0)
+        return max(last, reserved)
+
+    def allocate_violation_ids(self, n=1):
+        """Cấp n id liên tiếp (nguyên tử giữa các tiến trình), trả về id đầu tiên."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first = self.last_violation_id() + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_violation_id', ?)",
+                (str(first + n - 1),),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return first
+
+    def violated_track_ids(self):
+        cur = self._conn().execute("SELECT DISTINCT track_id FROM status")
+        ids = set()
+        for (tid,) in cur:
+            try:
+                ids.add(int(tid))
+            except Exception:
+                continue
+        return ids
+
+    def has_violated(self, track_id):
+        row = self._conn().execute(
+            "SELECT 1 FROM status WHERE track_id = ? LIMIT 1", (track_id,)
+        ).fetchone()
+        return row is not None
+
+    def add_violations(self, report_rows, status_rows):
+        conn = self._conn()
+        with conn:
+            if report_rows:
+                conn.executemany(
+                    f"INSERT INTO report ({_REPORT_COLS}) VALUES ({', '.join('?' * len(REPORT_HEADER))})",
+                    [_pad(r, len(REPORT_HEADER)) for r in report_rows],
+                )
+            if status_rows:
+                conn.executemany(
+                    "INSERT INTO status (track_id, ngay_vi_pham, ngay_iso, loai_vi_pham, tinh_trang) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [self._status_params(r) for r in status_rows],
+                )
+
+    # ---------- Màn hình báo cáo ----------
+    @staticmethod
+    def _status_out(row):
+        key, track_id, ngay, loai, tinh_trang = row
+        return key, ["" if track_id is None else str(track_id), ngay or "", loai or "", tinh_trang or ""]
+
+    def status_rows(self):
+        cur = self._conn().execute(
+            "SELECT key, track_id, ngay_vi_pham, loai_vi_pham, tinh_trang FROM status ORDER BY key"
+        )
+        return [self._status_out(r) for r in cur]
+
+    # Track id là số nguyên: "tiền tố" p = các dải [p*10^k, (p+1)*10^k) -> dùng được index
+    _TRACK_PREFIX_DIGITS = 12
+
+    @classmethod
+    def _where(cls, filters):
+        """Mệnh đề WHERE (mọi điều kiện đều dùng được index) + tham số."""
+        f = _active_filters(filters)
+        clauses, params = [], []
+        if "date_from" in f:
+            clauses.append("ngay_iso >= ?")
+            params.append(f["date_from"][:10])
+        if "date_to" in f:
+            clauses.append("ngay_iso < ?")
+            params.append(_next_day(f["date_to"]))
+        for col in ("tinh_trang", "loai_vi_pham"):
+            if col in f:
+                clauses.append(f"{col} = ?")
+                params.append(f[col])
+        prefix = f.get("track_prefix")
+        if prefix:
+            if prefix.isdigit() and not prefix.startswith("0"):
+                p = int(prefix)
+                ranges = []
+                for k in range(cls._TRACK_PREFIX_DIGITS - len(prefix) + 1):
+                    ranges.append("(track_id >= ? AND track_id < ?)")
+                    params.extend((p * 10 ** k, (p + 1) * 10 ** k))
+                clauses.append("(" + " OR ".join(ranges) + ")")
+            else:
+                clauses.append("CAST(track_id AS TEXT) LIKE ? ESCAPE '\\'")
+                escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                params.append(escaped + "%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count_status(self, filters=None):
+        where, params = self._where(filters)
+        return self._conn().execute(f"SELECT COUNT(*) FROM status{where}", params).fetchone()[0]
+
+    def status_page(self, cursor=None, limit=PAGE_SIZE, filters=None, order_by=None, desc=False):
+        """
+        1 trang dòng status thỏa bộ lọc, trả về (rows, cursor trang sau hoặc None nếu hết).
+        Phân trang theo khóa (sort value, key) > cursor thay vì OFFSET: trang nào cũng nhanh như trang đầu.
+        """
+        where, params = self._where(filters)
+        op = "<" if desc else ">"
+        direction = "DESC" if desc else "ASC"
+        sort_col = SORT_COLUMNS[order_by] if order_by else None
+        if cursor is not None:
+            where += " AND " if where else " WHERE "
+            if sort_col is None:
+                where += f"key {op} ?"
+                params.append(cursor)
+            else:
+                where += f"({sort_col}, key) {op} (?, ?)"
+                params.extend(cursor)
+        order = f"key {direction}" if sort_col is None else f"{sort_col} {direction}, key {direction}"
+        cur = self._conn().execute(
+            f"SELECT key, track_id, ngay_vi_pham, loai_vi_pham, tinh_trang, "
+            f"{sort_col or 'key'} FROM status{where} ORDER BY {order} LIMIT ?",
+            params + [limit],
+        )
+        raw = cur.fetchall()
+        rows = [self._status_out(r[:5]) for r in raw]
+        if len(raw) < limit:
+            return rows, None
+        last = raw[-1]
+        return rows, (last[0] if sort_col is None else (last[5], last[0]))
+
+    def status_values(self, column):
+        """Các giá trị khác nhau của 1 cột (tinh_trang / loai_vi_pham) cho ô lọc."""
+        if column not in ("tinh_trang", "loai_vi_pham"):
+            raise ValueError(f"Cột không hợp lệ: {column}")
+        cur = self._conn().execute(
+            f"SELECT DISTINCT {column} FROM status WHERE {column} <> '' ORDER BY {column}"
+        )
+        return [v for (v,) in cur if v]
+
+    def status_row(self, key):
+        row = self._conn().execute(
+            "SELECT key, track_id, ngay_vi_pham, loai_vi_pham, tinh_trang FROM status WHERE key = ?",
+            (key,),
+        ).fetchone()
+        return self._status_out(row)[1] if row else None
+
+    def next_track_id(self, lo=1, hi=None):
+        """track_id lớn nhất trong dải [lo, hi) + 1 (hoặc lo nếu dải còn trống)."""
+        sql = "SELECT MAX(track_id) FROM status WHERE typeof(track_id) = 'integer' AND track_id >= ?"
+        params = [lo]
+        if hi is not None:
+            sql += " AND track_id < ?"
+            params.append(hi)
+        row = self._conn().execute(sql, params).fetchone()
+        return (int(row[0]) + 1) if row and row[0] is not None else lo
+
+    def add_status(self, row):
+        """Thêm 1 dòng status, trả về key của dòng mới."""
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO status (track_id, ngay_vi_pham, ngay_iso, loai_vi_pham, tinh_trang) "
+                "VALUES (?, ?, ?, ?, ?)",
+                self._status_params(row),
+            )
+        return cur.lastrowid
+
+    def update_status(self, key, row):
+        track_id, ngay, ngay_iso, loai, tinh_trang = self._status_params(row)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE status SET track_id = ?, ngay_vi_pham = ?, ngay_iso = ?, "
+                "loai_vi_pham = ?, tinh_trang = ? WHERE key = ?",
+                (track_id, ngay, ngay_iso, loai, tinh_trang, key),
+            )
+
+    def delete_status(self, key):
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT track_id FROM status WHERE key = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM status WHERE key = ?", (key,))
+            if row and row[0] not in (None, ""):
+                conn.execute("DELETE FROM report WHERE track_id = ?", (row[0],))
+
+    def find_image_path(self, track_id):
+        row = self._conn().execute(
+            "SELECT image_path FROM report WHERE track_id = ? ORDER BY pk LIMIT 1",
+            (track_id,),
+        ).fetchone()
+        return (row[0] or "") if row else ""
+
+    def clear_all(self):
+        """Xóa mọi dòng; id cuối đã cấp (kể cả khối id worker đang giữ) giữ nguyên."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last = self.last_violation_id()
+            conn.execute("DELETE FROM status")
+            conn.execute("DELETE FROM report")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_violation_id', ?)",
+                (str(last),),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def export_status_csv(self, path):
+        cur = self._conn().execute(
+            "SELECT key, track_id, ngay_vi_pham, loai_vi_pham, tinh_trang FROM status ORDER BY key"
+        )
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(STATUS_HEADER)
+            while True:
+                rows = cur.fetchmany(1000)
+                if not rows:
+                    break
+                writer.writerows(self._status_out(r)[1] for r in rows)
+
+    def iter_export_rows(self, filters=None, chunk_size=PAGE_SIZE):
+        """
+        Các dòng EXPORT_HEADER (status thỏa bộ lọc + dòng report đầu tiên cùng track_id),
+        đọc bằng con trỏ theo từng khối chunk_size dòng (không nạp cả bảng).
+        """
+        where, params = self._where(filters)
+        report_cols = ", ".join(f"r.{c}" for c in _EXPORT_REPORT_COLS)
+        cur = self._conn().execute(
+            f"SELECT s.track_id, s.ngay_vi_pham, s.loai_vi_pham, s.tinh_trang, {report_cols} "
+            f"FROM (SELECT * FROM status{where}) s "
+            "LEFT JOIN report r ON r.pk = ("
+            "SELECT pk FROM report WHERE track_id = s.track_id ORDER BY pk LIMIT 1) "
+            "ORDER BY s.key",
+            params,
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [["" if v is None else str(v) for v in r] for r in rows]
+
+
+class ViolatedTrackIds:
+    """
+    Tập track_id đã vi phạm, tra kho theo từng track_id khi cần (có cache)
+    thay vì nạp toàn bộ lịch sử lúc worker khởi động. Dùng như set: `in`, add().
+
+    new_from: ID đầu tiên tracker của lần chạy này cấp (= store.next_track_id của dải).
+    Mọi track_id >= new_from do chính lần chạy này tạo ra nên chỉ cần tra trong bộ nhớ,
+    vòng lặp frame không bao giờ phải đọc lịch sử trong kho.
+    """
+
+    def __init__(self, store, on_error=None, new_from=None):
+        self.store = store
+        self.on_error = on_error
+        self.new_from = new_from
+        self._known = set()   # đã vi phạm
+        self._clean = set()   # đã tra kho, chưa vi phạm
+
+    def __contains__(self, track_id):
+        if track_id in self._known:
+            return True
+        if track_id in self._clean:
+            return False
+        if self.new_from is not None and track_id >= self.new_from:
+            return False
+        try:
+            hit = bool(self.store.has_violated(track_id))
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(f"Lỗi tra track_id đã vi phạm: {e}")
+            return False
+        (self._known if hit else self._clean).add(track_id)
+        return hit
+
+    def add(self, track_id):
+        self._known.add(track_id)
+        self._clean.discard(track_id)
+
+    def __len__(self):
+        return len(self._known)
+
+
+def open_store(backend=None, violation_dir=VIOLATION_DIR):
+    """Mở kho vi phạm (đã ensure) theo backend ("sqlite" / "csv", mặc định STORE_BACKEND)."""
+    backend = backend or STORE_BACKEND
+    report_csv = os.path.join(violation_dir, "report.csv")
+    status_csv = os.path.join(violation_dir, "status.csv")
+    if backend == "csv":
+        return CsvViolationStore(report_csv, status_csv).ensure()
+    if backend == "sqlite":
+        db_path = os.path.join(violation_dir, "violations.db")
+        return SqliteViolationStore(db_path, report_csv, status_csv).ensure()
+    raise ValueError(f"backend không hợp lệ: {backend}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quản lý kho vi phạm SQLite.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_import = sub.add_parser("import", help="Nhập report.csv / status.csv vào violations.db")
+    p_import.add_argument("--dir", default=VIOLATION_DIR, help="Thư mục violations")
+    p_import.add_argument("--force", action="store_true", help="Nhập lại dù đã nhập trước đó (bỏ qua các dòng đã có)")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "import":
+        store = SqliteViolationStore(
+            os.path.join(args.dir, "violations.db"),
+            os.path.join(args.dir, "report.csv"),
+            os.path.join(args.dir, "status.csv"),
+        )
+        store._conn().executescript(_SCHEMA)
+        imported_at = store._get_meta("csv_imported")
+        if imported_at and not args.force:
+            print(f"CSV đã được nhập lúc {imported_at}. Dùng --force để nhập lại.")
+            return 1
+        # Nhập lại (--force): chỉ thêm các dòng chưa có
+        n_report, n_status = store.import_csv(skip_existing=bool(imported_at), once=not args.force)
+        print(f"✅ Đã nhập {n_report} dòng report, {n_status} dòng status vào {store.db_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
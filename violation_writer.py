@@ -0,0 +1,228 @@
+"""
+Ghi vi phạm ở luồng nền: mã hóa JPEG ảnh crop + ghi dồn các dòng vào kho vi phạm.
+
+Luồng xử lý frame chỉ đưa bản ghi vào hàng đợi (không bao giờ chờ đĩa).
+Luồng ghi sẽ:
+- cv2.imwrite ảnh crop (kèm các tầng thumbnail cho màn hình báo cáo),
+- gom các dòng report / status và ghi vào kho vi phạm (violation_store) 1 lần
+  khi đủ max_batch dòng, hoặc sau flush_interval giây, hoặc khi close().
+
+Ghi kho lỗi (vd. SQLite bận quá busy_timeout): các dòng được giữ lại trong bộ đệm và
+thử lại ở lần flush sau (chờ tăng dần); lỗi liên tiếp max_retries lần thì ghi ra
+file dự phòng spill_path (JSON Lines: {"report": [...], "status": [...]}) để không mất
+vi phạm. `written` chỉ đếm các dòng đã thật sự vào kho.
+"""
+import os
+import json
+import queue
+import threading
+import time
+
+import cv2
+
+from thumbnail_cache import write_thumbnails
+from violation_store import REPORT_HEADER
+
+_STOP = object()
+
+# Vị trí cột trong dòng report
+_ID_COL = REPORT_HEADER.index("id")
+_IMAGE_PATH_COL = REPORT_HEADER.index("image_path")
+
+
+class AsyncViolationWriter:
+    def __init__(self, store, flush_interval=1.0, max_batch=50, on_error=None,
+                 max_retries=5, spill_path=None):
+        """
+        store: CsvViolationStore / SqliteViolationStore (có add_violations).
+        spill_path: file dự phòng khi ghi kho lỗi quá max_retries lần
+        (mặc định unsaved_violations.jsonl cạnh report.csv của kho).
+        """
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, int(max_batch))
+        self.on_error = on_error
+        self.max_retries = max(1, int(max_retries))
+        if spill_path is None:
+            folder = os.path.dirname(getattr(store, "report_csv", "") or "")
+            spill_path = os.path.join(folder, "unsaved_violations.jsonl")
+        self.spill_path = spill_path
+        self._failures = 0     # số lần ghi kho lỗi liên tiếp của bộ đệm hiện tại
+        self._retry_at = 0.0   # chưa thử lại trước thời điểm này
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._report_rows = []
+        self._status_rows = []
+        self._pending_t = []  # thời điểm submit của các dòng chưa flush
+
+        # Thống kê
+        self.written = 0          # dòng đã vào kho
+        self.spilled = 0          # dòng phải ghi ra spill_path
+        self.failed_flushes = 0
+        self.max_queue_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    # ---------- Vòng đời ----------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="violation-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout=None):
+        """
+        Ghi hết hàng đợi + bộ đệm rồi dừng luồng ghi (mặc định chờ tới khi xong).
+        Trả về số vi phạm chưa ghi xong (> 0 chỉ khi hết timeout; luồng ghi vẫn chạy tiếp).
+        """
+        if self._thread is None:
+            return 0
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            pending = self.pending()
+            self._report(f"Luồng ghi vi phạm chưa xong sau {timeout} s: còn {pending} vi phạm chưa ghi")
+            return pending
+        self._thread = None
+        return 0
+
+    # ---------- API ----------
+    def submit(self, crop_img, img_path, report_row, status_row):
+        """
+        Đưa 1 vi phạm vào hàng đợi.
+        img_path: đường dẫn ảnh (cột image_path trong report_row), "" nếu không có ảnh.
+        report_row / status_row: list giá trị cột (theo REPORT_HEADER / STATUS_HEADER);
+        ghi ảnh lỗi thì chỉ ô image_path của đúng vi phạm này (theo id) bị xóa.
+        """
+        self._queue.put((time.perf_counter(), crop_img, img_path, report_row, status_row))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def pending(self):
+        """Số vi phạm chưa vào kho (trong hàng đợi + bộ đệm chờ flush)."""
+        with self._queue.mutex:
+            queued = sum(1 for item in self._queue.queue if item is not _STOP)
+        return queued + len(self._pending_t)
+
+    def summary(self):
+        avg_ms = self.total_latency * 1000.0 / self.written if self.written else 0.0
+        return {
+            "written": self.written,
+            "spilled": self.spilled,
+            "failed_flushes": self.failed_flushes,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "avg_latency_ms": round(avg_ms, 2),
+            "max_latency_ms": round(self.max_latency * 1000.0, 2),
+        }
+
+    # ---------- Luồng ghi ----------
+    def _report(self, msg):
+        if self.on_error is not None:
+            self.on_error(msg)
+
+    def _encode(self, item):
+        t_submit, crop_img, img_path, report_row, status_row = item
+        if img_path:
+            try:
+                if crop_img is None or crop_img.size == 0 or not cv2.imwrite(img_path, crop_img):
+                    raise IOError(f"không ghi được {img_path}")
+            except Exception as e:
+                self._report(f"Lỗi ghi ảnh vi phạm id {report_row[_ID_COL]}: {e}")
+                report_row = list(report_row)
+                report_row[_IMAGE_PATH_COL] = ""
+            else:
+                try:
+                    write_thumbnails(crop_img, img_path)
+                except Exception as e:
+                    # Thiếu thumbnail không sao: màn hình báo cáo tự tạo lại khi xem
+                    self._report(f"Lỗi ghi thumbnail: {e}")
+        self._report_rows.append(report_row)
+        self._status_rows.append(status_row)
+        self._pending_t.append(t_submit)
+
+    def _flush(self):
+        """Ghi bộ đệm vào kho. Trả về False nếu lỗi và các dòng vẫn giữ lại để thử lại."""
+        if not self._report_rows:
+            return True
+        try:
+            self.store.add_violations(self._report_rows, self._status_rows)
+        except Exception as e:
+            self.failed_flushes += 1
+            self._failures += 1
+            if self._failures < self.max_retries:
+                delay = self.flush_interval * (2 ** self._failures)
+                self._retry_at = time.perf_counter() + delay
+                self._report(f"Lỗi ghi báo cáo (lần {self._failures}/{self.max_retries}), "
+                             f"thử lại sau {delay:.1f} s: {e}")
+                return False
+            self._spill(e)
+        else:
+            now = time.perf_counter()
+            for t in self._pending_t:
+                latency = now - t
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+            self.written += len(self._pending_t)
+        self._failures = 0
+        self._retry_at = 0.0
+        self._report_rows = []
+        self._status_rows = []
+        self._pending_t = []
+        return True
+
+    def _spill(self, error):
+        """Hết số lần thử: ghi bộ đệm ra file dự phòng (nhập lại bằng tay sau)."""
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for report_row, status_row in zip(self._report_rows, self._status_rows):
+                    f.write(json.dumps({"report": report_row, "status": status_row},
+                                       ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            self._report(f"MẤT {len(self._report_rows)} vi phạm: không ghi được kho ({error}) "
+                         f"lẫn file dự phòng {self.spill_path} ({e})")
+            return
+        self.spilled += len(self._report_rows)
+        self._report(f"Không ghi được kho sau {self.max_retries} lần ({error}): "
+                     f"đã lưu {len(self._report_rows)} vi phạm vào {self.spill_path}")
+
+    def _loop(self):
+        last_flush = time.perf_counter()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.perf_counter() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                break
+            if item is not None:
+                self._encode(item)
+
+            now = time.perf_counter()
+            if now >= self._retry_at and (len(self._report_rows) >= self.max_batch
+                                          or now - last_flush >= self.flush_interval):
+                self._flush()
+                last_flush = time.perf_counter()
+
+        # Dừng: xử lý nốt mọi thứ còn trong hàng đợi
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                self._encode(item)
+        # Thử lại tới khi vào kho hoặc đã ghi ra file dự phòng
+        while not self._flush():
+            time.sleep(max(0.0, self._retry_at - time.perf_counter()))
+        if hasattr(self.store, "close"):
+            # Đóng kết nối DB riêng của luồng ghi
+            self.store.close()